@@ -5,12 +5,10 @@ from datetime import datetime
 from difflib import SequenceMatcher
 
 from app.services.vademecum_retriever import retriever_singleton
-
-# Qdrant models (opcional, para filtros exactos)
-try:
-    from qdrant_client.http import models as qm
-except Exception:
-    qm = None
+from app.services.answer_cache import ANSWER_CACHE_ENABLED, answer_cache
+from app.services.answer_prompt import (
+    ANSWER_MAX_TOKENS, ANSWER_PROMPT as _LLM_PROMPT, ANSWER_TEMPERATURE, SECTION_LABEL, answer_key,
+)
 
 # Zona horaria (opcional)
 try:
@@ -22,11 +20,12 @@ except Exception:
 try:
     from langchain_openai import ChatOpenAI
     from app.config import settings
+    _LLM_MODEL = getattr(settings, "OPENAI_MODEL", "gpt-4o-mini")
     _LLM = ChatOpenAI(
-        model=getattr(settings, "OPENAI_MODEL", "gpt-4o-mini"),
+        model=_LLM_MODEL,
         api_key=settings.OPENAI_API_KEY,
-        temperature=0.2,
-        max_tokens=220,
+        temperature=ANSWER_TEMPERATURE,
+        max_tokens=ANSWER_MAX_TOKENS,
     )
 except Exception:
     _LLM = None
@@ -34,16 +33,7 @@ except Exception:
 DEFAULT_TZ = "America/Santiago"
 
 # ---------------------- Etiquetas y claves por sección ----------------------
-SECTION_LABEL = {
-    "indicaciones": "Para qué sirve",
-    "efectos_secundarios": "Efectos secundarios",
-    "contraindicaciones": "Contraindicaciones",
-    "interacciones": "Interacciones",
-    "advertencias": "Advertencias / Precauciones",
-    "posologia": "Posología (solo informativa)",
-    "mecanismo": "Mecanismo de acción",
-}
-
+# SECTION_LABEL viene de app/services/answer_prompt.py (la ingesta usa las mismas)
 SECTION_KEYS: Dict[str, List[str]] = {
     "indicaciones": ["indicaciones","indications_es","indications","para_que_sirve","para_qué_sirve","descripcion","descripción","resumen","text_es","text"],
     "efectos_secundarios": ["efectos_secundarios","efectos","reacciones_adversas","reacciones adversas","adverse_reactions","adverse_reactions_es","text_es","text"],
@@ -55,15 +45,9 @@ SECTION_KEYS: Dict[str, List[str]] = {
 }
 ANY_TEXT_KEYS = ["text_es", "text", "descripcion", "descripción", "resumen"]
 
-# Secciones en inglés (datasets bilingües)
-EN_SECTIONS: Dict[str, List[str]] = {
-    "indicaciones": ["indications"],
-    "efectos_secundarios": ["adverse_reactions", "side effects", "side_effects"],
-    "contraindicaciones": ["contraindications"],
-    "interacciones": ["interactions"],
-    "advertencias": ["warnings", "precautions"],
-    "posologia": ["dosage", "dosing", "dose"],
-    "mecanismo": ["mechanism", "mechanism_of_action"],
+# Si no hay la sección pedida, se ofrece la siguiente de la lista
+SECTION_FALLBACKS: Dict[str, List[str]] = {
+    "contraindicaciones": ["advertencias"],
 }
 
 # ---------------------- Intents ----------------------
@@ -243,26 +227,38 @@ def _greeting(tz_str: Optional[str], user_name: Optional[str]) -> str:
     return f"Hola{nombre}, {sal}. Espero que estés muy bien."
 
 # ---------------------- Humanización opcional ----------------------
-_LLM_PROMPT = """Reformula EN ESPAÑOL, tono cálido y claro, el contenido clínico exactamente como está,
-SIN agregar datos ni recomendaciones personalizadas. No inventes. No sugieras dosis.
-Devuelve 2–3 frases como máximo.
-
-Medicamento: {drug}
-Sección: {label}
-Texto fuente:
----
-{text}
----
-Responde en texto corrido, sin listas ni viñetas.
-"""
+# _LLM_PROMPT es ANSWER_PROMPT (app/services/answer_prompt.py), el mismo que precalcula la ingesta
+def _precomputed_answer(best: Dict[str, Any], drug: str, label: str, text: str) -> str:
+    """
+    Respuesta generada en la ingesta (answer_es), sólo si se hizo con este mismo
+    prompt, fármaco, sección y texto (answer_key); si no, "" y se humaniza en línea.
+    """
+    out = best.get("answer_es")
+    if not isinstance(out, str) or not out.strip():
+        return ""
+    key = answer_key(best.get("answer_model") or "", _LLM_PROMPT, drug, label, (text or "").strip())
+    if best.get("answer_key") != key:
+        answer_cache.stale_precomputed += 1
+        return ""
+    answer_cache.precomputed += 1
+    return out.strip()
+
+async def _llm_humanize(drug: str, label: str, text: str) -> str:
+    resp = await _LLM.ainvoke(_LLM_PROMPT.format(drug=drug, label=label, text=text))
+    return (getattr(resp, "content", None) or "").strip()
+
 async def _humanize(drug: str, label: str, text: str) -> str:
     text = (text or "").strip()
     if not text:
         return ""
     if _LLM is not None:
         try:
-            resp = await _LLM.ainvoke(_LLM_PROMPT.format(drug=drug, label=label, text=text))
-            out = (getattr(resp, "content", None) or "").strip()
+            if ANSWER_CACHE_ENABLED:
+                # mismo (modelo, prompt, fármaco, sección, texto) -> misma respuesta, sin ir al LLM
+                key = answer_key(_LLM_MODEL, _LLM_PROMPT, drug, label, text)
+                out = await answer_cache.get_or_compute(key, lambda: _llm_humanize(drug, label, text))
+            else:
+                out = await _llm_humanize(drug, label, text)
             if out:
                 return out
         except Exception:
@@ -278,28 +274,11 @@ async def _humanize(drug: str, label: str, text: str) -> str:
     return f"{drug}: {text}"
 
 # ---------------------- Guesser de nombre con typos ----------------------
-def _guess_drug_loose(user_q: str) -> str:
+async def _guess_drug_loose(user_q: str) -> str:
     try:
-        retriever_singleton.ensure_vocab()
-        vocab = list(getattr(retriever_singleton, "_norm_to_display", {}).keys())
-        display = getattr(retriever_singleton, "_norm_to_display", {})
+        return await retriever_singleton.aguess_name_loose(user_q) or ""
     except Exception:
         return ""
-    words = [_norm(w) for w in re.findall(r"[a-zA-ZáéíóúñÁÉÍÓÚÑ]+", user_q)]
-    words = [w for w in words if len(w) >= 5]
-    if not words:
-        return ""
-    best = ("", 0.0)
-    for w in words:
-        for cand in vocab[:8000]:
-            if w in cand or cand in w:
-                return display.get(cand, cand)
-            sim = SequenceMatcher(a=w, b=cand).ratio()
-            if sim > best[1]:
-                best = (cand, sim)
-    if best[1] >= 0.80:
-        return display.get(best[0], best[0])
-    return ""
 
 # ---------------------- NUEVO: seguimiento referencial ----------------------
 def _is_referential_followup(q: str) -> bool:
@@ -334,59 +313,6 @@ def _reply_smalltalk(intent: str, last_drug: str, tz: Optional[str], user_name:
         return _greeting(tz, user_name) + " ¿En qué medicamento te gustaría que te ayude?"
     return ""
 
-# ---------------------- Búsqueda exacta (nombre + sección) en Qdrant ----------------------
-def _by_name_and_section(name_hint: str, section: str) -> List[Dict[str, Any]]:
-    if not qm or not hasattr(retriever_singleton, "q"):
-        return []
-    outs: List[Dict[str, Any]] = []
-    try:
-        name_should = []
-        for key in ("name_es", "generic_name_es", "name", "generic_name"):
-            name_should.append(qm.FieldCondition(key=key, match=qm.MatchText(text=name_hint)))
-            name_should.append(qm.FieldCondition(key=key, match=qm.MatchValue(value=name_hint)))
-        # Español
-        es_filter = qm.Filter(
-            must=[qm.FieldCondition(key="section_es", match=qm.MatchValue(value=section))],
-            should=name_should
-        )
-        points, _ = retriever_singleton.q.scroll(
-            collection_name=retriever_singleton.coll,
-            scroll_filter=es_filter,
-            limit=256,
-            with_payload=True,
-        )
-        for p in points:
-            pl = dict(p.payload or {})
-            if _section_of(pl) == section:
-                outs.append(pl)
-        # Inglés
-        for en_sec in EN_SECTIONS.get(section, []):
-            en_filter = qm.Filter(
-                must=[qm.FieldCondition(key="section", match=qm.MatchValue(value=en_sec))],
-                should=name_should
-            )
-            points2, _ = retriever_singleton.q.scroll(
-                collection_name=retriever_singleton.coll,
-                scroll_filter=en_filter,
-                limit=256,
-                with_payload=True,
-            )
-            for p in points2:
-                pl = dict(p.payload or {})
-                if _section_of(pl) == section:
-                    outs.append(pl)
-    except Exception:
-        return outs
-    return outs
-
-def _pick_best_payload(payloads: List[Dict[str, Any]], section: str) -> Optional[Dict[str, Any]]:
-    if not payloads:
-        return None
-    with_text = [p for p in payloads if _pick_section_text_strict(p, section)]
-    if with_text:
-        return with_text[0]
-    return payloads[0]
-
 # ---------------------- Herramienta principal ----------------------
 async def search_vademecum(state: dict):
     """
@@ -453,11 +379,11 @@ async def search_vademecum(state: dict):
         # 2) Nombre del fármaco (exacto o guesser)
     # 2) Nombre del fármaco (exacto o guesser)
     try:
-        name_from_text = retriever_singleton.extract_name_from_text(user_q, strict_only=False) or ""
+        name_from_text = await retriever_singleton.aextract_name_from_text(user_q, strict_only=False) or ""
     except Exception:
         name_from_text = ""
     if not name_from_text:
-        name_from_text = _guess_drug_loose(user_q) or ""
+        name_from_text = await _guess_drug_loose(user_q) or ""
 
     # ¿El mensaje parece referencial? (explícito o implícito si hay palabras clínicas y last_drug)
     referential = _is_referential_followup(user_q) or (bool(last_drug_state) and has_clinical_kw)
@@ -485,34 +411,14 @@ async def search_vademecum(state: dict):
         state["data"] = {"match": None, "last_drug": last_drug_state}
         return state
 
-    # 4) Buscar payload correcto (ES/EN); prioridad sección exacta
-    best: Optional[Dict[str, Any]] = None
-    exacts = _by_name_and_section(name_hint, section)
-    if exacts:
-        best = _pick_best_payload(exacts, section)
-
-    def _best_for(prefer_section: str) -> Optional[Dict[str, Any]]:
-        try:
-            return retriever_singleton.best_metadata_first(name_hint=name_hint, prefer=[prefer_section])
-        except Exception:
-            return None
-
-    if not best:
-        maybe = _best_for(section)
-        if maybe and _section_of(maybe) == section:
-            best = maybe
-
-    # 4.1) Fallback específico: contraindicaciones -> advertencias
-    if (not best or _section_of(best) != section) and section == "contraindicaciones":
-        adv_exact = _by_name_and_section(name_hint, "advertencias")
-        if adv_exact:
-            best = _pick_best_payload(adv_exact, "advertencias")
-            section = "advertencias"
-        else:
-            alt = _best_for("advertencias")
-            if alt and _section_of(alt) == "advertencias":
-                best = alt
-                section = "advertencias"
+    # 4) Buscar payload correcto (ES/EN) en una sola consulta: sección exacta primero,
+    #    luego fallbacks (contraindicaciones -> advertencias), resueltos en el retriever
+    try:
+        best, found = await retriever_singleton.alookup_sections(name_hint, [section] + SECTION_FALLBACKS.get(section, []))
+    except Exception:
+        best, found = None, None
+    if best and found:
+        section = found
 
     # 5) Si no hay sección correcta, informar
     if not best or _section_of(best) != section:
@@ -535,7 +441,8 @@ async def search_vademecum(state: dict):
         state["data"] = {"match": best, "last_drug": last_drug}
         return state
 
-    nice = await _humanize(_sanitize(last_drug), label, main_text)
+    drug = _sanitize(last_drug)
+    nice = _precomputed_answer(best, drug, label, main_text) or await _humanize(drug, label, main_text)
     body = f"{nice}\n\nSi notas algo inusual o tomas otros fármacos, es mejor comentarlo con un profesional."
 
     state["output"] = greet_prefix + body
@@ -1,13 +1,17 @@
-from fastapi import Depends
-from app.services.redis_mem import RedisMemory
-from app.services.vademecum_retriever import VademecumRetriever
+import re
+import uuid
+
+from fastapi import Request, Response
+from app.services.redis_mem import RedisMemory, TTL_SECONDS
+from app.services.vademecum_retriever import VademecumRetriever, retriever_singleton
 from app.config import settings
 from app.agents.graph import build_agent
 import redis
+import redis.asyncio as aioredis
 
 _redis = None
+_aredis = None
 _graph = None
-_retriever = None
 
 
 def get_redis() -> redis.Redis:
@@ -17,19 +21,34 @@ def get_redis() -> redis.Redis:
     return _redis
 
 
-def get_memory(r: redis.Redis = Depends(get_redis)) -> RedisMemory:
-    return RedisMemory(r)
+def get_async_redis() -> aioredis.Redis:
+    """Cliente redis.asyncio (binario) para caches compartidos; no bloquea el event loop."""
+    global _aredis
+    if _aredis is None:
+        _aredis = aioredis.from_url(
+            settings.REDIS_URL,
+            decode_responses=False,
+            socket_connect_timeout=2,
+            socket_timeout=5,
+        )
+    return _aredis
+
+
+async def close_async_redis():
+    global _aredis
+    if _aredis is not None:
+        await _aredis.aclose()
+        _aredis = None
+
+
+def get_memory() -> RedisMemory:
+    # redis.asyncio: la sesión se lee/escribe con pipelines sin bloquear el event loop
+    return RedisMemory(get_async_redis())
 
 
 def get_retriever() -> VademecumRetriever:
-    global _retriever
-    if _retriever is None:
-        _retriever = VademecumRetriever(
-            url=settings.QDRANT_URL,
-            coll=settings.QDRANT_COLLECTION,
-            api_key=settings.QDRANT_API_KEY,
-        )
-    return _retriever
+    # la misma instancia que usan las tools: un solo modelo, pool, límites y métricas por proceso
+    return retriever_singleton
 
 
 def get_graph():
@@ -39,6 +58,19 @@ def get_graph():
     return _graph
 
 
-def get_user(token: str | None = None):
-    # Demo: usuario anónimo si no hay auth (puedes forzar JWT en producción)
-    return {"id": "anon", "name": "Anon"}
+SESSION_COOKIE = "sid"
+_SID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def get_user(request: Request, response: Response, token: str | None = None):
+    # Demo: usuario anónimo si no hay auth (puedes forzar JWT en producción).
+    # Cada cliente anónimo tiene su propia sesión (cookie `sid`): historial y
+    # last_drug de la memoria no se comparten entre usuarios.
+    sid = request.cookies.get(SESSION_COOKIE) or ""
+    if not _SID.match(sid):
+        sid = uuid.uuid4().hex
+        response.set_cookie(
+            SESSION_COOKIE, sid, max_age=TTL_SECONDS, httponly=True, samesite="lax",
+            secure=settings.APP_ENV not in ("dev", "local"),
+        )
+    return {"id": f"anon:{sid}", "name": "Anon", "anonymous": True}
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,8 +12,38 @@ from app.auth.router import router as auth_router
 from app.config import settings
 from app.routers.health import router as health_router
 from app.routers.graph_view import router as graph_view_router
+from app.services import minsal_client, minsal_shared, pharmacy_store
+from app.services.answer_cache import answer_cache
+from app.services.vademecum_retriever import retriever_singleton
+from app.deps import get_async_redis, close_async_redis
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Último feed MINSAL bueno desde disco: se responde de inmediato tras el arranque
+    pharmacy_store.load_snapshots()
+    # Cada refresco del feed arma su store en un thread (no dentro de una petición)
+    minsal_client.set_feed_listener(pharmacy_store.on_feed)
+    # Feed compartido entre workers vía Redis: un solo worker descarga del MINSAL
+    if minsal_shared.SHARED_ENABLED:
+        minsal_client.set_shared_tier(minsal_shared.RedisFeedTier(get_async_redis()))
+    # Re-ingestas del vademécum (versión en Redis) invalidan el caché por fármaco
+    retriever_singleton.drug_cache.set_version_source(
+        get_async_redis(), retriever_singleton.coll, baseline=retriever_singleton.snapshot_at
+    )
+    # Respuestas humanizadas compartidas entre workers (nivel Redis del caché)
+    answer_cache.set_redis(get_async_redis())
+    # Cliente HTTP del MINSAL compartido (keep-alive) durante toda la vida de la app
+    await minsal_client.start_client()
+    try:
+        yield
+    finally:
+        await minsal_client.close_client()
+        await retriever_singleton.aclose()
+        await close_async_redis()
+
 
-app = FastAPI(title="Farmacias & Vademécum AI")
+app = FastAPI(title="Farmacias & Vademécum AI", lifespan=lifespan)
 
 # CORS — ajusta dominios en producción
 app.add_middleware(
@@ -4,6 +4,9 @@ from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
 from app.config import settings
+from app.deps import get_redis
+from app.services.drug_cache import publish_version
+from app.services.vademecum_retriever import retriever_singleton
 
 router = APIRouter()
 
@@ -33,4 +36,7 @@ def upsert_items(items: List[Dict[str, Any]]):
         vec = embedder.encode(text).tolist()
         points.append(qm.PointStruct(id=doc.get("id", i), vector=vec, payload={**doc, "text": text}))
     client.upsert(collection_name=settings.QDRANT_COLLECTION, points=points)
+    # este worker invalida ya; el resto al ver la nueva versión en Redis
+    retriever_singleton.invalidate()
+    publish_version(get_redis(), settings.QDRANT_COLLECTION)
     return {"upserted": len(points)}
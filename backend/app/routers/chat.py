@@ -17,28 +17,34 @@ async def ask(
 ):
     """
     Orquesta una vuelta de conversación con el grafo.
-    - Carga y guarda historial en la memoria
-    - Intenta deducir last_drug cuando no viene del cliente
+    - Sesión en Redis: un round trip al entrar (historial reciente + hash de sesión)
+      y uno al salir (vuelta nueva + last_drug/tz/name)
+    - Intenta deducir last_drug cuando no viene del cliente (o usa el de la sesión)
     - Pasa lat/lon si el cliente las envió
     - Devuelve reply + data (ctas, pharmacies, last_drug, etc.)
     """
     user_id = user.get("id")
-    user_tz = user.get("tz") or "America/Santiago"
-    user_name = user.get("name") or None
 
-    # 1) Historial del usuario
+    # 1) Sesión del usuario: historial reciente + last_drug/tz/name
     try:
-        history = mem.load(user_id)
+        session = await mem.load_turn(user_id)
     except Exception:
-        history = []
+        session = {}
+    history = session.get("history") or []
+    user_tz = user.get("tz") or session.get("tz") or "America/Santiago"
+    user_name = user.get("name") or session.get("name") or None
 
     # 2) Preferir last_drug enviado por el cliente; si no, inferir rápido con el retriever
     last_drug = (payload.last_drug or "").strip()
     if not last_drug:
         try:
-            last_drug = retriever.extract_name_from_text(payload.message) or ""
+            last_drug = await retriever.aextract_name_from_text(payload.message) or ""
         except Exception:
             last_drug = ""
+    if not last_drug:
+        # seguimiento sin nombre ("¿y sus interacciones?"): el fármaco de la vuelta anterior
+        # (la sesión es por cliente: ver get_user / cookie `sid`)
+        last_drug = session.get("last_drug") or ""
 
     # 3) Estado inicial para el grafo
     state = {
@@ -63,20 +69,14 @@ async def ask(
         data = {"error": str(e)}
         print(data)
         try:
-            mem.save(user_id, history + [(payload.message, reply)])
+            await mem.save_turn(user_id, payload.message, reply, last_drug=last_drug, tz=user_tz, name=user_name)
         except Exception:
             pass
         return ChatResponse(reply=reply, data=data)
 
     reply = (result.get("output") or "").strip()
 
-    # 5) Guardar historial (no romper si falla la memoria)
-    try:
-        mem.save(user_id, history + [(payload.message, reply)])
-    except Exception:
-        pass
-
-    # 6) Preparar data de salida y consolidar last_drug
+    # 5) Preparar data de salida y consolidar last_drug
     data = result.get("data") or {}
     match = data.get("match") or {}
 
@@ -93,5 +93,18 @@ async def ask(
     if last_drug_out:
         data["last_drug"] = last_drug_out
 
+    # 6) Guardar la vuelta y la sesión (no romper si falla la memoria)
+    try:
+        await mem.save_turn(user_id, payload.message, reply, last_drug=last_drug_out, tz=user_tz, name=user_name)
+    except Exception:
+        pass
+
     # 7) Responder
     return ChatResponse(reply=reply, data=data)
+
+
+@router.get("/history")
+async def history(user=Depends(get_user), mem=Depends(get_memory)):
+    """Transcript completo retenido (hasta HISTORY_MAX_TURNS vueltas), bajo demanda."""
+    turns = await mem.transcript(user.get("id"))
+    return {"turns": [{"message": m, "reply": r} for m, r in turns]}
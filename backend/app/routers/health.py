@@ -28,3 +28,35 @@ async def health_minsal_cercanas():
     sample_lat, sample_lon = -33.45, -70.66
     cercanas = await get_locales_cercanos(user_lat=sample_lat, user_lon=sample_lon, radius_km=3.0, limit=5)
     return {"ok": True, "count": len(cercanas)}
+
+@router.get("/vademecum/embeddings")
+async def health_vademecum_embeddings():
+    """
+    Métricas del caché de embeddings y del micro-batching de consultas.
+    """
+    from app.services.vademecum_retriever import retriever_singleton
+    return {"ok": True, **retriever_singleton.embedder.stats()}
+
+@router.get("/vademecum/retriever")
+async def health_vademecum_retriever():
+    """
+    Llamadas async a Qdrant y al pool de CPU: conteos, latencias y espera por cupo.
+    """
+    from app.services.vademecum_retriever import retriever_singleton
+    return {"ok": True, **retriever_singleton.stats()}
+
+@router.get("/vademecum/answers")
+async def health_vademecum_answers():
+    """
+    Caché de respuestas humanizadas: aciertos en proceso / Redis, fallos y estado del breaker.
+    """
+    from app.services.answer_cache import answer_cache
+    return {"ok": True, **answer_cache.stats()}
+
+@router.get("/memory")
+async def health_memory():
+    """
+    Sesiones: estado del circuit breaker de Redis y del fallback en proceso (tamaño, desalojos).
+    """
+    from app.services.redis_mem import memory_stats
+    return {"ok": True, **memory_stats()}
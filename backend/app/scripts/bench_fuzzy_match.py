@@ -0,0 +1,89 @@
+# app/scripts/bench_fuzzy_match.py
+"""
+Microbenchmark del guesser de nombres con typos.
+
+  - legacy: SequenceMatcher de cada palabra contra vocab[:8000] (implementación anterior)
+  - index:  FuzzyNameIndex (trigramas + Levenshtein acotado) sobre TODO el vocab
+
+Uso:
+  python -m app.scripts.bench_fuzzy_match [n_nombres]   # por defecto 100.000
+"""
+import re
+import sys
+import time
+import random
+from difflib import SequenceMatcher
+from typing import List
+
+from app.utils.fuzzy_index import FuzzyNameIndex
+
+MESSAGES = [
+    "para que sirve el paracetmol",
+    "efectos secundarios del ibuprofenno",
+    "contraindicaciones de la amoxicilna en embarazo",
+    "y sus interacciones",
+    "me duele la cabeza, que puedo tomar",
+]
+ROUNDS = 20
+
+
+def legacy_guess(vocab: List[str], user_q: str) -> str:
+    words = [w.lower() for w in re.findall(r"[a-zA-ZáéíóúñÁÉÍÓÚÑ]+", user_q)]
+    words = [w for w in words if len(w) >= 5]
+    best = ("", 0.0)
+    for w in words:
+        for cand in vocab[:8000]:
+            if w in cand or cand in w:
+                return cand
+            sim = SequenceMatcher(a=w, b=cand).ratio()
+            if sim > best[1]:
+                best = (cand, sim)
+    return best[0] if best[1] >= 0.80 else ""
+
+
+def synthetic_vocab(n: int) -> List[str]:
+    random.seed(11)
+    syll = ["pa", "ra", "ce", "ta", "mol", "ibu", "pro", "fen", "ami", "xi", "ci", "li", "na", "lo", "sar", "tan", "zol", "met", "for", "mina", "dro", "clo", "vir", "tri"]
+    real = ["paracetamol", "ibuprofeno", "amoxicilina", "acido acetilsalicilico", "losartan"]
+    seen = set()
+    while len(seen) < n - len(real):
+        w = "".join(random.choice(syll) for _ in range(random.randint(3, 6)))
+        if random.random() < 0.2:
+            w += " " + "".join(random.choice(syll) for _ in range(random.randint(2, 4)))
+        seen.add(w)
+    # los nombres reales al final: el límite [:8000] del loop anterior no los ve
+    return list(seen) + real
+
+
+def _per_msg(fn, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for m in MESSAGES:
+            fn(m)
+    return (time.perf_counter() - t0) / (rounds * len(MESSAGES)) * 1000.0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    vocab = synthetic_vocab(n)
+
+    t0 = time.perf_counter()
+    idx = FuzzyNameIndex(vocab)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    def fast(m: str):
+        words = [w.lower() for w in re.findall(r"[a-zA-ZáéíóúñÁÉÍÓÚÑ]+", m)]
+        return idx.best_name_for_words(words)
+
+    for m in MESSAGES:
+        print(f"  {m!r:55} legacy={legacy_guess(vocab, m)!r:24} index={fast(m)!r}")
+
+    legacy = _per_msg(lambda m: legacy_guess(vocab, m), 1)
+    indexed = _per_msg(fast, ROUNDS)
+    print(f"Vocab: {len(vocab)} nombres ({len(idx.tokens)} tokens)")
+    print(f"legacy (SequenceMatcher, 8000): {legacy:9.2f} ms/mensaje")
+    print(f"index  (trigramas, todo)      : {indexed:9.2f} ms/mensaje  x{legacy / indexed:.0f}  (build {build_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# app/scripts/bench_geo.py
+"""
+Benchmark del ranking de farmacias por distancia.
+
+Compara, sobre el catálogo completo del MINSAL (o uno sintético del mismo tamaño):
+  - legacy: haversine escalar por item + sort completo (implementación anterior)
+  - numpy:  geo.attach_distance (extrae coords + una pasada vectorizada + argpartition)
+  - arrays: geo.rank_by_distance sobre arreglos float64 ya extraídos
+  - index:  GeoGridIndex ya construido (sólo celdas cercanas)
+
+Uso:
+  python -m app.scripts.bench_geo            # catálogo sintético (5000 locales)
+  python -m app.scripts.bench_geo --live     # descarga getLocales.php
+"""
+import sys
+import math
+import time
+import random
+import asyncio
+from typing import Dict, List, Optional
+
+from app.utils.geo import attach_distance, coords_arrays, rank_by_distance
+from app.utils.geo_index import GeoGridIndex
+
+QUERIES = [(-33.45, -70.66), (-36.82, -73.05), (-23.65, -70.40), (-41.47, -72.94), (-53.16, -70.91)]
+LIMIT = 10
+ROUNDS = 50
+
+
+# ---------- Implementación anterior (routers/farmacias._with_distance) ----------
+def _legacy_haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = 6371.0
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(math.radians(lat1))
+        * math.cos(math.radians(lat2))
+        * math.sin(dlon / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return round(R * c, 2)
+
+
+def _legacy_parse_float(v) -> Optional[float]:
+    try:
+        if v is None:
+            return None
+        return float(v)
+    except Exception:
+        try:
+            return float(str(v).replace(",", "."))
+        except Exception:
+            return None
+
+
+def legacy_with_distance(items: List[Dict], lat: float, lon: float) -> List[Dict]:
+    out = []
+    for x in items:
+        la = _legacy_parse_float(x.get("lat")) or _legacy_parse_float(x.get("local_lat"))
+        lo = _legacy_parse_float(x.get("long")) or _legacy_parse_float(x.get("local_lng"))
+        if la is None or lo is None:
+            continue
+        xx = dict(x)
+        xx["lat"] = la
+        xx["long"] = lo
+        xx["dist_km"] = _legacy_haversine_km(lat, lon, la, lo)
+        out.append(xx)
+    out.sort(key=lambda r: r.get("dist_km", 9999))
+    return out
+
+
+# ---------- Datos ----------
+def synthetic_catalog(n: int = 5000) -> List[Dict]:
+    random.seed(42)
+    out = []
+    for i in range(n):
+        # concentrado en ciudades, como el catálogo real
+        clat, clon = random.choice(QUERIES)
+        out.append({
+            "local_id": str(i),
+            "local_nombre": f"FARMACIA {i}",
+            "comuna_nombre": f"COMUNA {i % 340}",
+            "local_lat": f"{clat + random.gauss(0, 0.4):.6f}",
+            "local_lng": f"{clon + random.gauss(0, 0.4):.6f}",
+        })
+    return out
+
+
+def live_catalog() -> List[Dict]:
+    from app.services import minsal_client
+
+    async def _load():
+        try:
+            return await minsal_client.get_locales_all()
+        finally:
+            await minsal_client.close_client()
+
+    return asyncio.run(_load())
+
+
+def _timeit(fn) -> float:
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        for lat, lon in QUERIES:
+            fn(lat, lon)
+    return (time.perf_counter() - t0) / (ROUNDS * len(QUERIES)) * 1000.0
+
+
+def main():
+    items = live_catalog() if "--live" in sys.argv else synthetic_catalog()
+    if not items:
+        print("Sin locales para medir (¿MINSAL caído?).")
+        sys.exit(1)
+    print(f"Locales: {len(items)}  consultas: {len(QUERIES)} x {ROUNDS}  top-{LIMIT}")
+
+    t0 = time.perf_counter()
+    idx = GeoGridIndex.from_items(items)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    legacy = _timeit(lambda la, lo: legacy_with_distance(items, la, lo)[:LIMIT])
+    vect = _timeit(lambda la, lo: attach_distance(items, la, lo, limit=LIMIT))
+    _, lats, lons = coords_arrays(items)
+    arrs = _timeit(lambda la, lo: rank_by_distance(lats, lons, la, lo, limit=LIMIT))
+    grid = _timeit(lambda la, lo: idx.nearest(la, lo, limit=LIMIT))
+
+    print(f"legacy (escalar + sort)  : {legacy:7.3f} ms/consulta")
+    print(f"numpy  (attach_distance) : {vect:7.3f} ms/consulta  x{legacy / vect:.1f}")
+    print(f"arrays (rank_by_distance): {arrs:7.3f} ms/consulta  x{legacy / arrs:.1f}")
+    print(f"index  (GeoGridIndex)    : {grid:7.3f} ms/consulta  x{legacy / grid:.1f}  (build {build_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# app/scripts/bench_memory_retriever.py
+"""
+Microbenchmark del backend en memoria (sin Qdrant ni modelo).
+
+Colección sintética de n chunks x 384 dims:
+  - vector_search: coseno top-k con un producto matriz-vector
+  - scroll por nombre: filtro de lookup_sections sobre índices invertidos
+
+Uso:
+  python -m app.scripts.bench_memory_retriever [n_chunks]   # por defecto 20.000
+"""
+import sys
+import time
+import random
+
+import numpy as np
+
+from app.services.memory_retriever import PayloadIndex
+from app.services.vademecum_retriever import SECTION_ORDER, _name_filter
+
+DIM = 384
+ROUNDS = 200
+
+
+def synthetic(n: int):
+    random.seed(3)
+    rng = np.random.default_rng(3)
+    drugs = [f"farmaco{i}" for i in range(max(1, n // 7))]
+    payloads = []
+    for i in range(n):
+        d = drugs[i // 7 % len(drugs)]
+        payloads.append({"name_es": d.capitalize(), "section_es": SECTION_ORDER[i % 7], "text_es": f"texto {i}"})
+    vecs = rng.standard_normal((n, DIM), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return payloads, vecs, drugs
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    payloads, vecs, drugs = synthetic(n)
+
+    t0 = time.perf_counter()
+    index = PayloadIndex(payloads)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    rng = np.random.default_rng(5)
+    queries = rng.standard_normal((ROUNDS, DIM), dtype=np.float32)
+    t0 = time.perf_counter()
+    for q in queries:
+        scores = vecs @ q
+        top = np.argpartition(-scores, 11)[:12]
+        top[np.argsort(-scores[top])]
+    search_ms = (time.perf_counter() - t0) / ROUNDS * 1000.0
+
+    names = [random.choice(drugs) for _ in range(ROUNDS)]
+    t0 = time.perf_counter()
+    for name in names:
+        ids = index.evaluate(_name_filter(name, exact=True))
+    scroll_ms = (time.perf_counter() - t0) / ROUNDS * 1000.0
+
+    print(f"Colección: {n} chunks x {DIM} ({vecs.nbytes / 2**20:.1f} MiB)  índices: {build_ms:.0f} ms")
+    print(f"vector_search top-12 : {search_ms:8.3f} ms/consulta")
+    print(f"scroll por nombre    : {scroll_ms:8.3f} ms/consulta  ({len(ids)} chunks)")
+
+
+if __name__ == "__main__":
+    main()
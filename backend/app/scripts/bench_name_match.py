@@ -0,0 +1,83 @@
+# app/scripts/bench_name_match.py
+"""
+Microbenchmark de extracción de nombre de fármaco (match exacto por palabra).
+
+Compara, con un vocabulario sintético de 10.000 nombres:
+  - legacy: un re.search por nombre del vocab (implementación anterior)
+  - matcher: VocabMatcher (Aho-Corasick construido una vez en ensure_vocab)
+
+Uso:
+  python -m app.scripts.bench_name_match [n_nombres]
+"""
+import re
+import sys
+import time
+import random
+from typing import List, Optional
+
+from app.utils.name_matcher import VocabMatcher
+
+MESSAGES = [
+    "hola, para que sirve el paracetamol?",
+    "y sus interacciones con alcohol",
+    "efectos secundarios de ibuprofeno 400 mg en adultos mayores",
+    "me puedes contar las contraindicaciones del acido acetilsalicilico durante el embarazo",
+    "farmacias de turno cerca",
+    "gracias!",
+]
+LEGACY_ROUNDS = 2  # el loop anterior tarda ~1 s por mensaje con 10k nombres
+ROUNDS = 200
+
+
+def legacy_extract(names_norm: List[str], t: str) -> Optional[str]:
+    for cand in names_norm:
+        if re.search(rf"(^|[\s\W]){re.escape(cand)}($|[\s\W])", t):
+            return cand
+    return None
+
+
+def synthetic_vocab(n: int) -> List[str]:
+    random.seed(7)
+    syll = ["pa", "ra", "ce", "ta", "mol", "ibu", "pro", "fen", "ami", "xi", "ci", "li", "na", "lo", "sar", "tan", "zol", "met", "for", "mina"]
+    real = ["paracetamol", "ibuprofeno", "acido acetilsalicilico", "aspirina", "amoxicilina", "losartan"]
+    seen = set(real)
+    while len(seen) < n:
+        w = "".join(random.choice(syll) for _ in range(random.randint(2, 5)))
+        if random.random() < 0.15:
+            w += " " + "".join(random.choice(syll) for _ in range(random.randint(2, 3)))
+        seen.add(w)
+    return sorted(seen, key=len, reverse=True)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    names = synthetic_vocab(n)
+
+    t0 = time.perf_counter()
+    matcher = VocabMatcher(names)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    for m in MESSAGES:
+        a = legacy_extract(names, m)
+        b = matcher.find_longest(m)
+        assert (a is None) == (b is None) and (a is None or len(a) == len(b)), (m, a, b)
+
+    t0 = time.perf_counter()
+    for _ in range(LEGACY_ROUNDS):
+        for m in MESSAGES:
+            legacy_extract(names, m)
+    legacy = (time.perf_counter() - t0) / (LEGACY_ROUNDS * len(MESSAGES)) * 1000.0
+
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        for m in MESSAGES:
+            matcher.find_longest(m)
+    fast = (time.perf_counter() - t0) / (ROUNDS * len(MESSAGES)) * 1000.0
+
+    print(f"Vocab: {len(names)} nombres  mensajes: {len(MESSAGES)}")
+    print(f"legacy  (re.search por nombre): {legacy:9.3f} ms/mensaje")
+    print(f"matcher (Aho-Corasick)        : {fast:9.3f} ms/mensaje  x{legacy / fast:.0f}  (build {build_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
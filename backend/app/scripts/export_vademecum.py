@@ -0,0 +1,32 @@
+# app/scripts/export_vademecum.py
+"""
+Exporta la colección de Qdrant (payloads + vectores) al snapshot binario que
+mapean los workers al arrancar (app/services/vademecum_snapshot.py):
+  - VADEMECUM_BACKEND=memory: vectores, payloads e índices sin Qdrant
+  - VADEMECUM_BACKEND=qdrant: vocab de nombres sin el scroll completo
+
+Uso:
+  python -m app.scripts.export_vademecum [directorio]   # por defecto VADEMECUM_SNAPSHOT_DIR
+"""
+import sys
+import time
+
+from qdrant_client import QdrantClient
+
+from app.config import settings
+from app.services.memory_retriever import InMemoryVademecumRetriever
+from app.services.vademecum_snapshot import SNAPSHOT_DIR
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_DIR
+    client = QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY or None)
+    t0 = time.perf_counter()
+    payloads, vectors = InMemoryVademecumRetriever.fetch_from_qdrant(client, settings.QDRANT_COLLECTION)
+    if not InMemoryVademecumRetriever.write_snapshot(payloads, vectors, settings.QDRANT_COLLECTION, path=path):
+        sys.exit(1)
+    print(f"[OK] {len(payloads)} chunks {vectors.shape} -> {path}/ ({time.perf_counter() - t0:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
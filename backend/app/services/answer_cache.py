@@ -0,0 +1,154 @@
+# backend/app/services/answer_cache.py
+"""
+Caché de respuestas humanizadas del vademécum (salida de _humanize).
+
+Clave: answer_key (app/services/answer_prompt.py), sha256 de (modelo, prompt,
+fármaco, sección, texto fuente). Si cambia
+el texto de un chunk (re-ingesta), el prompt o el modelo, cambia la clave: la
+respuesta vieja simplemente deja de pedirse y vence por TTL.
+
+Dos niveles:
+  - en proceso: TTLCache (microsegundos)
+  - Redis: answer:{hash} con SETEX, compartido entre workers
+Se registra Redis con answer_cache.set_redis() (lifespan de main.py); sin él
+sólo se usa el nivel local. Un mismo prompt pedido a la vez se genera una vez.
+
+Antes de todo esto, search_vademecum sirve la respuesta precalculada en la
+ingesta (payload answer_es) si su answer_key calza; `precomputed` las cuenta.
+"""
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from redis.exceptions import RedisError, AuthenticationError, ConnectionError, TimeoutError
+
+from app.utils.ttl_cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() not in ("0", "false", "no")
+ANSWER_CACHE_PREFIX = os.getenv("ANSWER_CACHE_PREFIX", "answer")
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(60 * 60 * 24 * 7)))  # 7 días (Redis)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))  # respuestas en proceso
+ANSWER_CACHE_LOCAL_TTL = float(os.getenv("ANSWER_CACHE_LOCAL_TTL", str(60 * 60 * 6)))  # 6 h
+
+_OUTAGE = (ConnectionError, TimeoutError, AuthenticationError)
+
+
+class AnswerCache:
+    def __init__(self, maxsize: int = ANSWER_CACHE_SIZE, local_ttl: float = ANSWER_CACHE_LOCAL_TTL,
+                 ttl: int = ANSWER_CACHE_TTL, prefix: str = ANSWER_CACHE_PREFIX):
+        self.local = TTLCache(maxsize, local_ttl)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.breaker = CircuitBreaker("redis-answers")
+        self._redis = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # métricas
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.shared = 0  # esperaron la generación de otra request
+        self.stores = 0
+        self.redis_errors = 0
+        self.precomputed = 0  # servidas desde el payload (ingesta)
+        self.stale_precomputed = 0  # answer_es con otro prompt/texto: se ignoró
+
+    def set_redis(self, redis_client) -> None:
+        """Cliente redis.asyncio (binario) del nivel compartido."""
+        self._redis = redis_client
+
+    def _rkey(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def _redis_call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self._redis is None or not self.breaker.allow():
+            return None
+        try:
+            out = await fn()
+        except _OUTAGE as e:
+            self.breaker.failure()
+            self.redis_errors += 1
+            print(f"[AnswerCache] Redis no disponible: {type(e).__name__}: {e}")
+            return None
+        except RedisError as e:
+            self.redis_errors += 1
+            print(f"[AnswerCache] error de Redis: {type(e).__name__}: {e}")
+            return None
+        self.breaker.success()
+        return out
+
+    async def get(self, key: str) -> Optional[str]:
+        out = self.local.get(key)
+        if out is not None:
+            self.local_hits += 1
+            return out
+        raw = await self._redis_call(lambda: self._redis.get(self._rkey(key)))
+        if raw is None:
+            return None
+        out = raw.decode("utf-8") if isinstance(raw, bytes) else str(raw)
+        self.local.put(key, out)
+        self.redis_hits += 1
+        return out
+
+    async def put(self, key: str, answer: str) -> None:
+        self.local.put(key, answer)
+        self.stores += 1
+        await self._redis_call(lambda: self._redis.set(self._rkey(key), answer.encode("utf-8"), ex=self.ttl))
+
+    async def invalidate(self, key: str) -> None:
+        self.local.pop(key)
+        await self._redis_call(lambda: self._redis.delete(self._rkey(key)))
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Respuesta cacheada o compute(); sólo se guardan respuestas no vacías.
+        Los errores de compute() se propagan (el llamador tiene su fallback); si se cancela
+        quien generaba, los que esperaban reciben RuntimeError, no CancelledError.
+        """
+        out = await self.get(key)
+        if out is not None:
+            return out
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.shared += 1
+            return await asyncio.shield(fut)
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            out = (await compute() or "").strip()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # se canceló la request que generaba; las que esperan no deben cancelarse,
+                # sólo caer a su fallback (un Exception normal)
+                e = RuntimeError("la generación compartida se canceló")
+            fut.set_exception(e)
+            fut.exception()  # la recupera quien espera; evita el aviso de asyncio
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        fut.set_result(out)
+        if out:
+            await self.put(key, out)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses + self.shared
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "precomputed": self.precomputed,
+            "stale_precomputed": self.stale_precomputed,
+            "redis": self._redis is not None,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round((hits + self.shared) / total, 4) if total else 0.0,
+            "stores": self.stores,
+            "redis_errors": self.redis_errors,
+            "breaker": self.breaker.stats(),
+            "local": self.local.stats(),
+        }
+
+
+answer_cache = AnswerCache()
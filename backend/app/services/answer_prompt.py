@@ -0,0 +1,42 @@
+# backend/app/services/answer_prompt.py
+"""
+Prompt y etiquetas de la respuesta humanizada del vademécum.
+
+Los usan search_vademecum (app/agents/tools_vademecum.py) al humanizar en línea
+y la ingesta (ingestion/ingest_vademecum.py) al precalcular answer_es: al ser
+el mismo módulo, answer_key coincide en ambos lados. Sólo stdlib, para que la
+ingesta lo importe sin cargar la API.
+"""
+import json
+import hashlib
+
+ANSWER_PROMPT = """Reformula EN ESPAÑOL, tono cálido y claro, el contenido clínico exactamente como está,
+SIN agregar datos ni recomendaciones personalizadas. No inventes. No sugieras dosis.
+Devuelve 2–3 frases como máximo.
+
+Medicamento: {drug}
+Sección: {label}
+Texto fuente:
+---
+{text}
+---
+Responde en texto corrido, sin listas ni viñetas.
+"""
+ANSWER_TEMPERATURE = 0.2
+ANSWER_MAX_TOKENS = 220
+
+SECTION_LABEL = {
+    "indicaciones": "Para qué sirve",
+    "efectos_secundarios": "Efectos secundarios",
+    "contraindicaciones": "Contraindicaciones",
+    "interacciones": "Interacciones",
+    "advertencias": "Advertencias / Precauciones",
+    "posologia": "Posología (solo informativa)",
+    "mecanismo": "Mecanismo de acción",
+}
+
+
+def answer_key(model: str, prompt: str, drug: str, label: str, text: str) -> str:
+    """Hash de todo lo que determina la respuesta (el prompt va como plantilla, sin formatear)."""
+    raw = json.dumps([model, prompt, drug, label, text], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,138 @@
+# backend/app/services/drug_cache.py
+"""
+Caché en proceso de los payloads del vademécum por fármaco.
+
+Cada entrada es un DrugGroup: todos los chunks de un fármaco (clave canónica,
+la misma de _drug_key) indexados por sección canónica. Un seguimiento como
+"y sus interacciones" se responde sin ir a Qdrant.
+
+Invalidación: la ingesta publica una versión en Redis
+(vademecum:{colección}:version); si cambia, se vacía el caché.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.ttl_cache import TTLCache
+
+DRUG_CACHE_SIZE = int(os.getenv("DRUG_CACHE_SIZE", "512"))  # fármacos
+DRUG_CACHE_TTL = float(os.getenv("DRUG_CACHE_TTL", str(60 * 60 * 6)))  # 6 h
+DRUG_CACHE_CHECK_SECONDS = float(os.getenv("DRUG_CACHE_CHECK_SECONDS", "30"))
+
+_UNSET = object()  # versión aún no leída
+
+
+def version_key(collection: str) -> str:
+    return f"vademecum:{collection}:version"
+
+
+def publish_version(redis_client, collection: str) -> None:
+    """Marca la colección como re-ingestada (cliente redis síncrono); best effort."""
+    try:
+        redis_client.set(version_key(collection), repr(time.time()))
+    except Exception as e:
+        print(f"[DrugCache] no se pudo publicar la versión: {e}")
+
+
+class DrugGroup:
+    __slots__ = ("key", "payloads", "by_section")
+
+    def __init__(self, key: str, payloads: List[Dict[str, Any]], section_fn: Callable[[Dict[str, Any]], str]):
+        self.key = key
+        self.payloads = payloads
+        self.by_section: Dict[str, List[Dict[str, Any]]] = {}
+        for p in payloads:
+            self.by_section.setdefault(section_fn(p), []).append(p)
+
+
+class DrugDocCache:
+    def __init__(
+        self,
+        key_fn: Callable[[Dict[str, Any]], str],
+        section_fn: Callable[[Dict[str, Any]], str],
+        maxsize: int = DRUG_CACHE_SIZE,
+        ttl: float = DRUG_CACHE_TTL,
+    ):
+        self.key_fn = key_fn
+        self.section_fn = section_fn
+        self.cache = TTLCache(maxsize, ttl)
+        self.invalidations = 0
+
+        # versión publicada por la ingesta (cliente redis.asyncio; opcional)
+        self._redis = None
+        self._collection = ""
+        self._version: Any = _UNSET
+        self._checked_at = 0.0
+        self._baseline: Optional[float] = None
+
+    def get(self, key: str) -> Optional[DrugGroup]:
+        return self.cache.get(key) if key else None
+
+    def group(self, payloads: List[Dict[str, Any]]) -> Dict[str, DrugGroup]:
+        buckets: Dict[str, List[Dict[str, Any]]] = {}
+        for p in payloads:
+            k = self.key_fn(p)
+            if k:
+                buckets.setdefault(k, []).append(p)
+        return {k: DrugGroup(k, items, self.section_fn) for k, items in buckets.items()}
+
+    def put_payloads(self, payloads: List[Dict[str, Any]], complete: bool = True) -> Dict[str, DrugGroup]:
+        """
+        Agrupa por fármaco y guarda cada grupo. Si la página vino truncada
+        (complete=False) no se guarda nada: un grupo parcial respondería mal después.
+        """
+        groups = self.group(payloads)
+        if complete:
+            for k, g in groups.items():
+                self.cache.put(k, g)
+        return groups
+
+    def invalidate(self) -> None:
+        self.cache.clear()
+        self.invalidations += 1
+
+    # ---------- Versión (re-ingesta) ----------
+    def set_version_source(self, redis_client, collection: str, baseline: Optional[float] = None) -> None:
+        """`baseline`: epoch de los datos ya cargados (p.ej. el snapshot); una versión posterior los invalida."""
+        self._redis = redis_client
+        self._collection = collection
+        self._baseline = baseline
+
+    async def check_version(self) -> bool:
+        """True si la colección fue re-ingestada (y el caché se vació). Consulta Redis cada N s."""
+        if self._redis is None:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < DRUG_CACHE_CHECK_SECONDS:
+            return False
+        self._checked_at = now
+        try:
+            version = await self._redis.get(version_key(self._collection))
+        except Exception as e:
+            print(f"[DrugCache] no se pudo leer la versión: {e}")
+            return False
+        if self._version is _UNSET:
+            changed = self._baseline is not None and version is not None and float(version) > self._baseline
+        else:
+            changed = version != self._version
+        self._version = version
+        if changed:
+            print(f"[DrugCache] colección {self._collection} re-ingestada: caché invalidado")
+            self.invalidate()
+        return changed
+
+    @property
+    def redis(self):
+        """Cliente redis.asyncio registrado con set_version_source (None sin Redis)."""
+        return self._redis
+
+    def version_epoch(self) -> Optional[float]:
+        """Última versión leída de Redis (epoch de la ingesta), o None."""
+        try:
+            return float(self._version)
+        except (TypeError, ValueError):
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        version = self._version if isinstance(self._version, bytes) else b""
+        return {"invalidations": self.invalidations, "version": version.decode("utf-8", "ignore"), **self.cache.stats()}
@@ -0,0 +1,418 @@
+# backend/app/services/memory_retriever.py
+"""
+Backend del vademécum 100% en memoria (sin Qdrant).
+
+- Vectores en una matriz float32 contigua (n, d), normalizados: el coseno
+  top-k es un solo producto matriz-vector + argpartition.
+- Filtros por payload (qm.Filter con must/should/must_not, MatchValue,
+  MatchAny, MatchText) resueltos con índices invertidos precalculados.
+- Misma interfaz que VademecumRetriever (hereda toda la lógica de negocio).
+
+Arranca mapeando el snapshot binario (app/services/vademecum_snapshot.py,
+exportado con app/scripts/export_vademecum.py): vectores, payloads, índices y
+vocab quedan disponibles sin leer la colección. Si no hay snapshot, lee la
+colección de Qdrant una sola vez y lo escribe.
+
+Re-ingesta: cuando la versión publicada en Redis es posterior al snapshot, se
+reabre el snapshot si otro worker ya lo regeneró. Si no, un solo worker (lock
+vademecum:{colección}:snapshot_lock, SET NX PX) vuelve a copiar la colección de
+Qdrant y reescribe el snapshot; el resto espera a que aparezca y lo mapea. Todo
+en segundo plano: mientras tanto se sirven los datos anteriores.
+"""
+import os
+import re
+import time
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qm
+
+from app.services.vademecum_retriever import VademecumRetriever, collect_names, _EMB_MODEL_NAME
+from app.services import vademecum_snapshot
+from app.utils import redis_lock
+
+# el holder copia la colección completa y escribe el snapshot antes de que venza
+SNAPSHOT_LOCK_MS = int(os.getenv("VADEMECUM_SNAPSHOT_LOCK_MS", "300000"))
+SNAPSHOT_POLL = 1.0
+
+# campos con índice invertido (el resto de los filtros se evalúan recorriendo)
+INDEXED_KEYS = ("name_es", "generic_name_es", "name", "generic_name", "section_es", "section", "doc_id")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _text_tokens(value: Any) -> Set[str]:
+    # como el índice de texto de Qdrant (multilingual, lowercase, min_token_len=2)
+    if not isinstance(value, str):
+        return set()
+    return {t for t in _TOKEN.findall(value.lower()) if 2 <= len(t) <= 30}
+
+
+def snapshot_lock_key(collection: str) -> str:
+    return f"vademecum:{collection}:snapshot_lock"
+
+
+class PayloadIndex:
+    """Índices invertidos valor -> ids y token -> ids por campo; evalúa qm.Filter como conjuntos."""
+
+    def __init__(self, payloads: Sequence[Dict[str, Any]], keys: Iterable[str] = INDEXED_KEYS, build: bool = True):
+        self.payloads = payloads
+        self.all_ids: Set[int] = set(range(len(payloads)))
+        self.values: Dict[str, Dict[Any, Set[int]]] = {}
+        self.tokens: Dict[str, Dict[str, Set[int]]] = {}
+        if not build:
+            return
+        for key in keys:
+            vals: Dict[Any, Set[int]] = {}
+            toks: Dict[str, Set[int]] = {}
+            for i, p in enumerate(payloads):
+                v = p.get(key)
+                if v is None or isinstance(v, (dict, list)):
+                    continue
+                vals.setdefault(v, set()).add(i)
+                for t in _text_tokens(v):
+                    toks.setdefault(t, set()).add(i)
+            self.values[key] = vals
+            self.tokens[key] = toks
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forma serializable (sólo valores str, que es lo que indexamos)."""
+        return {
+            "values": {k: {v: sorted(ids) for v, ids in vals.items() if isinstance(v, str)} for k, vals in self.values.items()},
+            "tokens": {k: {t: sorted(ids) for t, ids in toks.items()} for k, toks in self.tokens.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, payloads: Sequence[Dict[str, Any]], data: Dict[str, Any]) -> "PayloadIndex":
+        idx = cls(payloads, build=False)
+        idx.values = {k: {v: set(ids) for v, ids in vals.items()} for k, vals in data.get("values", {}).items()}
+        idx.tokens = {k: {t: set(ids) for t, ids in toks.items()} for k, toks in data.get("tokens", {}).items()}
+        return idx
+
+    # ---------- Condiciones ----------
+    def _match_value(self, key: str, value: Any) -> Set[int]:
+        if key in self.values:
+            return set(self.values[key].get(value, ()))
+        return {i for i, p in enumerate(self.payloads) if p.get(key) == value}
+
+    def _match_text(self, key: str, text: str) -> Set[int]:
+        wanted = _text_tokens(text)
+        if not wanted:
+            return set()
+        if key in self.tokens:
+            out: Optional[Set[int]] = None
+            for t in sorted(wanted, key=lambda t: len(self.tokens[key].get(t, ()))):
+                ids = self.tokens[key].get(t)
+                if not ids:
+                    return set()
+                out = set(ids) if out is None else out & ids
+                if not out:
+                    return set()
+            return out or set()
+        return {i for i, p in enumerate(self.payloads) if wanted <= _text_tokens(p.get(key))}
+
+    def _condition(self, cond: Any) -> Set[int]:
+        if isinstance(cond, qm.Filter):
+            return self.evaluate(cond)
+        if isinstance(cond, qm.FieldCondition):
+            m = cond.match
+            if isinstance(m, qm.MatchValue):
+                return self._match_value(cond.key, m.value)
+            if isinstance(m, qm.MatchAny):
+                out: Set[int] = set()
+                for v in m.any:
+                    out |= self._match_value(cond.key, v)
+                return out
+            if isinstance(m, qm.MatchText):
+                return self._match_text(cond.key, m.text)
+        raise ValueError(f"condición no soportada en memoria: {type(cond).__name__}")
+
+    @staticmethod
+    def _as_list(x: Any) -> List[Any]:
+        if x is None:
+            return []
+        return list(x) if isinstance(x, (list, tuple)) else [x]
+
+    def evaluate(self, flt: Optional[qm.Filter]) -> Set[int]:
+        if flt is None:
+            return set(self.all_ids)
+        ids = set(self.all_ids)
+        for c in self._as_list(flt.must):
+            ids &= self._condition(c)
+            if not ids:
+                return ids
+        should = self._as_list(flt.should)
+        if should:
+            any_ids: Set[int] = set()
+            for c in should:
+                any_ids |= self._condition(c)
+            ids &= any_ids
+        for c in self._as_list(flt.must_not):
+            ids -= self._condition(c)
+        return ids
+
+
+class InMemoryVademecumRetriever(VademecumRetriever):
+    """VademecumRetriever sobre una matriz float32 y payloads en RAM (o mapeados desde el snapshot)."""
+
+    def __init__(
+        self,
+        payloads: Sequence[Dict[str, Any]],
+        vectors: np.ndarray,
+        coll: str = "memory",
+        top_k_default: int = 12,
+        index: Optional[PayloadIndex] = None,
+        vocab: Optional[Dict[str, str]] = None,
+        normalized: bool = False,
+        qdrant: Optional[Tuple[str, Optional[str]]] = None,
+    ):
+        self._init_state(coll, top_k_default)
+        self._qdrant_source = qdrant  # (url, api_key) para regenerar el snapshot tras una re-ingesta
+        self._reload_task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self._set_data(payloads, vectors, index, normalized)
+        if vocab is not None:
+            self._build_vocab(dict(vocab))
+        print(f"[Memoria] vademécum: {len(payloads)} chunks, dim={vectors.shape[1] if len(payloads) else 0}")
+
+    def _set_data(self, payloads: Sequence[Dict[str, Any]], vectors: np.ndarray,
+                  index: Optional[PayloadIndex], normalized: bool) -> None:
+        if not normalized:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(payloads):
+            raise ValueError(f"vectores {vectors.shape} no calzan con {len(payloads)} payloads")
+        if not normalized and vectors.size:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms  # coseno == producto punto
+        # una sola asignación: una búsqueda en curso ve los datos viejos o los nuevos, nunca mezclados
+        self._data = (payloads, vectors, index if index is not None else PayloadIndex(payloads))
+
+    @property
+    def payloads(self) -> Sequence[Dict[str, Any]]:
+        return self._data[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._data[1]
+
+    @property
+    def index(self) -> PayloadIndex:
+        return self._data[2]
+
+    # ---------- Carga / exportación ----------
+    @classmethod
+    def from_snapshot(cls, snap: "vademecum_snapshot.VademecumSnapshot", **kwargs) -> "InMemoryVademecumRetriever":
+        """Sin copiar: vectores como np.memmap, payloads decodificados bajo demanda."""
+        r = cls(
+            snap.payloads, snap.vectors,
+            index=PayloadIndex.from_dict(snap.payloads, snap.index),
+            vocab=snap.vocab,
+            normalized=True,
+            **kwargs,
+        )
+        r.snapshot_at = snap.meta.get("created_at")
+        return r
+
+    # ---------- Re-ingesta ----------
+    async def _on_reingest(self) -> None:
+        await super()._on_reingest()
+        if self._reload_task is None or self._reload_task.done():
+            version = self.drug_cache.version_epoch()
+            self._reload_task = asyncio.get_running_loop().create_task(self._areload(version))
+
+    async def _areload(self, version: Optional[float]) -> None:
+        try:
+            if await self._reload_shared(version):
+                # lo que se cacheó mientras se recargaba viene de los datos viejos
+                self.drug_cache.invalidate()
+        except Exception as e:
+            print(f"[Memoria] no se pudo recargar el vademécum: {type(e).__name__}: {e}")
+
+    async def _reload_shared(self, version: Optional[float]) -> bool:
+        """reload() con un solo worker copiando Qdrant; el resto espera el snapshot que éste escribe."""
+        r = self.drug_cache.redis
+        if r is None or not self._qdrant_source:
+            return await asyncio.to_thread(self.reload, version)
+        key = snapshot_lock_key(self.coll)
+        deadline = time.monotonic() + 2 * SNAPSHOT_LOCK_MS / 1000
+        waited = False
+        while True:
+            # 1) otro worker (o export_vademecum) ya publicó un snapshot posterior a la re-ingesta
+            if self._fresh_meta(version) is not None:
+                return await asyncio.to_thread(self.reload, version)
+            # 2) sólo un worker a la vez copia la colección
+            try:
+                token = await redis_lock.acquire(r, key, SNAPSHOT_LOCK_MS)
+            except Exception as e:
+                print(f"[Memoria] lock del snapshot no disponible: {type(e).__name__}: {e}")
+                return await asyncio.to_thread(self.reload, version)
+            if token:
+                try:
+                    return await asyncio.to_thread(self.reload, version)
+                finally:
+                    try:
+                        await redis_lock.release(r, key, token)
+                    except Exception:
+                        pass
+            # 3) otro worker está regenerando: esperar su snapshot (si se cae, vence el lock y se reintenta)
+            if time.monotonic() >= deadline:
+                print("[Memoria] no apareció el snapshot regenerado por otro worker: se siguen sirviendo los datos anteriores")
+                return False
+            if not waited:
+                print("[Memoria] otro worker regenera el snapshot: esperando")
+                waited = True
+            await asyncio.sleep(SNAPSHOT_POLL)
+
+    def _fresh_meta(self, version: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Meta del snapshot en disco si es de esta colección y posterior a `version`."""
+        meta = vademecum_snapshot.read_meta() or {}
+        if meta.get("collection") == self.coll and (meta.get("created_at") or 0.0) > (version or 0.0):
+            return meta
+        return None
+
+    def reload(self, version: Optional[float] = None) -> bool:
+        """
+        Reemplaza los datos por los de la colección re-ingestada. Si el snapshot en disco
+        ya es posterior a `version` (lo regeneró otro worker o export_vademecum) se mapea;
+        si no, se copia la colección de Qdrant y se reescribe el snapshot.
+        """
+        meta = self._fresh_meta(version)
+        fresh = meta is not None
+        if fresh and meta.get("created_at") == self.snapshot_at:
+            return False  # ya es el que tenemos mapeado
+        if fresh:
+            snap = vademecum_snapshot.open_snapshot(self.coll)
+        elif self._qdrant_source:
+            url, api_key = self._qdrant_source
+            client = QdrantClient(url=url, api_key=api_key) if api_key else QdrantClient(url=url)
+            payloads, vectors = self.fetch_from_qdrant(client, self.coll)
+            snap = None
+            if self.write_snapshot(payloads, vectors, self.coll):
+                snap = vademecum_snapshot.open_snapshot(self.coll)
+            if snap is None:
+                self._set_data(payloads, vectors, None, normalized=False)
+                self._build_vocab(collect_names(payloads, {}))
+                self.snapshot_at = time.time()
+                self.reloads += 1
+                print(f"[Memoria] vademécum recargado desde Qdrant: {len(payloads)} chunks (sin snapshot)")
+                return True
+        else:
+            print("[Memoria] la colección fue re-ingestada pero no hay QDRANT_URL ni snapshot nuevo: "
+                  "se siguen sirviendo los datos anteriores")
+            return False
+        if snap is None:
+            return False
+        self._set_data(snap.payloads, snap.vectors, PayloadIndex.from_dict(snap.payloads, snap.index), normalized=True)
+        self._build_vocab(dict(snap.vocab))
+        self.snapshot_at = snap.meta.get("created_at")
+        self.reloads += 1
+        print(f"[Memoria] vademécum recargado: {len(snap.payloads)} chunks (snapshot {self.snapshot_at:.0f})")
+        return True
+
+    @staticmethod
+    def write_snapshot(payloads: List[Dict[str, Any]], vectors: np.ndarray, coll: str,
+                       path: str = vademecum_snapshot.SNAPSHOT_DIR) -> Optional[str]:
+        return vademecum_snapshot.write_snapshot(
+            payloads, vectors, coll,
+            index=PayloadIndex(payloads).to_dict(),
+            vocab=collect_names(payloads, {}),
+            model=_EMB_MODEL_NAME,
+            path=path,
+        )
+
+    @staticmethod
+    def fetch_from_qdrant(client: QdrantClient, coll: str, page: int = 512) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Lee toda la colección (payload + vector), en orden de id."""
+        payloads: List[Dict[str, Any]] = []
+        vecs: List[List[float]] = []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=coll, limit=page, offset=offset, with_payload=True, with_vectors=True,
+            )
+            for p in points:
+                if p.vector is None:
+                    continue
+                payloads.append(dict(p.payload or {}))
+                vecs.append(p.vector if isinstance(p.vector, list) else list(p.vector.values())[0])
+            if not offset:
+                break
+        if not vecs:
+            return payloads, np.zeros((0, 0), dtype=np.float32)
+        return payloads, np.asarray(vecs, dtype=np.float32)
+
+    # ---------- Vocabulario ----------
+    def ensure_vocab(self):
+        if not self._vocab_ready:
+            self._build_vocab(collect_names(self.payloads, {}))
+
+    async def aensure_vocab(self):
+        if not self._vocab_ready:
+            await self._cpu("build_vocab", self.ensure_vocab)
+
+    # ---------- Acceso a datos ----------
+    def _scroll(self, scroll_filter: qm.Filter, limit: int) -> List[Dict[str, Any]]:
+        payloads, _, index = self._data
+        ids = sorted(index.evaluate(scroll_filter))[:limit]
+        return [dict(payloads[i]) for i in ids]
+
+    async def ascroll(self, scroll_filter: qm.Filter, limit: int = 256) -> List[Dict[str, Any]]:
+        # índices invertidos: microsegundos, se resuelve en el event loop
+        self.metrics.begin("scroll", 0.0)
+        ok = False
+        try:
+            out = self._scroll(scroll_filter, limit)
+            ok = True
+            return out
+        finally:
+            self.metrics.end("scroll", 0.0, ok)
+
+    def _vector_search(self, vec: np.ndarray, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        payloads, vectors, _ = self._data
+        n = vectors.shape[0]
+        if n == 0:
+            return []
+        q = np.asarray(vec, dtype=np.float32)
+        qn = float(np.linalg.norm(q))
+        if qn:
+            q = q / qn
+        scores = vectors @ q
+        k = min(limit, n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(dict(payloads[i]), float(scores[i])) for i in top]
+
+    async def _avector_search(self, vec: np.ndarray, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        return await self._cpu("vector_search", self._vector_search, vec, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "chunks": len(self.payloads), "snapshot_at": self.snapshot_at,
+                "reloads": self.reloads, **super().stats()}
+
+    async def aclose(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def build_memory_retriever(coll: str, url: Optional[str] = None, api_key: Optional[str] = None) -> InMemoryVademecumRetriever:
+    """Mapea el snapshot si existe; si no, copia la colección de Qdrant, escribe el snapshot y lo mapea."""
+    source = (url, api_key) if url else None
+    snap = vademecum_snapshot.open_snapshot(coll)
+    if snap is not None:
+        return InMemoryVademecumRetriever.from_snapshot(snap, coll=coll, qdrant=source)
+    if not url:
+        print(f"[Memoria] sin snapshot en {vademecum_snapshot.SNAPSHOT_DIR} ni QDRANT_URL: vademécum vacío")
+        return InMemoryVademecumRetriever([], np.zeros((0, 0), dtype=np.float32), coll=coll)
+    try:
+        client = QdrantClient(url=url, api_key=api_key) if api_key else QdrantClient(url=url)
+        payloads, vectors = InMemoryVademecumRetriever.fetch_from_qdrant(client, coll)
+    except Exception as e:
+        print(f"[Memoria] no se pudo leer '{coll}' desde Qdrant: {e}")
+        return InMemoryVademecumRetriever([], np.zeros((0, 0), dtype=np.float32), coll=coll)
+    if InMemoryVademecumRetriever.write_snapshot(payloads, vectors, coll):
+        snap = vademecum_snapshot.open_snapshot(coll)
+        if snap is not None:
+            return InMemoryVademecumRetriever.from_snapshot(snap, coll=coll, qdrant=source)
+    return InMemoryVademecumRetriever(payloads, vectors, coll=coll, qdrant=source)
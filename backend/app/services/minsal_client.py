@@ -1,49 +1,295 @@
-import os, asyncio, httpx
+import os, time, random, asyncio, httpx
 from typing import List, Dict, Optional
 
 BASE = "https://midas.minsal.cl/farmacia_v2/WS"
 VERIFY_SSL = os.getenv("MINSAL_VERIFY_SSL", "true").lower() not in ("0", "false", "no")
 
-DEFAULT_TIMEOUT = 12.0
-RETRIES = 3
-RETRY_DELAY = 0.8
+DEFAULT_TIMEOUT = float(os.getenv("MINSAL_TIMEOUT", "12"))
+CONNECT_TIMEOUT = float(os.getenv("MINSAL_CONNECT_TIMEOUT", "5"))
+RETRIES = int(os.getenv("MINSAL_RETRIES", "3"))
+RETRY_DELAY = float(os.getenv("MINSAL_RETRY_DELAY", "0.8"))
+RETRY_MAX_DELAY = float(os.getenv("MINSAL_RETRY_MAX_DELAY", "5"))
+
+# Pool de conexiones (cliente compartido por toda la app)
+MAX_CONNECTIONS = int(os.getenv("MINSAL_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("MINSAL_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("MINSAL_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("MINSAL_HTTP2", "false").lower() in ("1", "true", "yes")
+
+URL_TURNOS = f"{BASE}/getLocalesTurnos.php"
+URL_LOCALES = f"{BASE}/getLocales.php"
+
+# TTL por endpoint (segundos): los turnos cambian a diario, el catálogo casi nunca.
+TTL_TURNOS = float(os.getenv("MINSAL_TTL_TURNOS", "900"))
+TTL_LOCALES = float(os.getenv("MINSAL_TTL_LOCALES", "21600"))
+
+
+# ---------- Cliente HTTP compartido ----------
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except Exception:
+            print("[MINSAL] MINSAL_HTTP2 activo pero falta el paquete 'h2'; se usa HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        verify=VERIFY_SSL,
+        http2=http2,
+    )
+
+
+async def start_client() -> None:
+    """Crea el cliente compartido (se llama en el startup de FastAPI)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+
+async def close_client() -> None:
+    """Cierra el cliente compartido (se llama en el shutdown de FastAPI)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    # Scripts o tests que no pasan por el startup de la app
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def _backoff(attempt: int) -> float:
+    """Backoff exponencial con jitter (mitad fija + mitad aleatoria)."""
+    delay = min(RETRY_MAX_DELAY, RETRY_DELAY * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
 
 
 async def _fetch_json(url: str) -> Optional[list]:
+    client = _get_client()
     for attempt in range(1, RETRIES + 1):
         try:
-            async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, verify=VERIFY_SSL) as client:
-                r = await client.get(url)
-                r.raise_for_status()
-                data = r.json()
-                if isinstance(data, list):
-                    return data
-                if isinstance(data, dict):
-                    for k in ("locales", "datos", "data", "result"):
-                        v = data.get(k)
-                        if isinstance(v, list):
-                            return v
-                return []
+            r = await client.get(url)
+            r.raise_for_status()
+            data = r.json()
+            if isinstance(data, list):
+                return data
+            if isinstance(data, dict):
+                for k in ("locales", "datos", "data", "result"):
+                    v = data.get(k)
+                    if isinstance(v, list):
+                        return v
+            return []
         except Exception as e:
             print(f"[MINSAL] intento {attempt} {url} -> {type(e).__name__}: {e}")
             if attempt < RETRIES:
-                await asyncio.sleep(RETRY_DELAY)
+                await asyncio.sleep(_backoff(attempt))
     return None
 
 
+# ---------- Cache en proceso (por endpoint) ----------
+class _CacheEntry:
+    __slots__ = ("data", "fetched_at")
+
+    def __init__(self, data: list, fetched_at: float):
+        self.data = data
+        self.fetched_at = fetched_at
+
+
+_CACHE: Dict[str, _CacheEntry] = {}
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+
+# Capa compartida entre workers (p.ej. Redis); ver set_shared_tier()
+_SHARED = None
+SHARED_LOCK_WAIT = float(os.getenv("MINSAL_SHARED_LOCK_WAIT", "15"))
+SHARED_POLL = 0.25
+
+
+def set_shared_tier(tier) -> None:
+    """
+    Registra la capa compartida. Debe exponer (async):
+      get_if_newer(url, after) -> (data, fetched_at) | None
+      put(url, data, fetched_at)
+      acquire(url) -> token | None
+      release(url, token)
+    """
+    global _SHARED
+    _SHARED = tier
+
+
+# Se avisa antes de publicar datos nuevos en _CACHE; ver set_feed_listener()
+_LISTENER = None
+
+
+def set_feed_listener(listener) -> None:
+    """
+    Registra `async listener(url, data, fetched_at)`, que se espera ANTES de publicar
+    un feed nuevo en el cache (p.ej. pharmacy_store arma su store fuera del event loop):
+    ninguna petición ve el feed nuevo sin lo derivado de él.
+    """
+    global _LISTENER
+    _LISTENER = listener
+
+
+async def _store(url: str, data: list, fetched_at: float, origin: str) -> list:
+    if _LISTENER is not None:
+        try:
+            await _LISTENER(url, data, fetched_at)
+        except Exception as e:
+            print(f"[MINSAL] listener del feed falló: {type(e).__name__}: {e}")
+    _CACHE[url] = _CacheEntry(data, fetched_at)
+    print(f"[MINSAL] cache actualizado ({origin}) {url}: {len(data)} registros")
+    return data
+
+
+async def _shared_newer(url: str, ttl: Optional[float] = None) -> Optional[list]:
+    """Versión de la capa compartida más nueva que la local (y fresca si se pasa ttl)."""
+    entry = _CACHE.get(url)
+    after = entry.fetched_at if entry is not None else 0.0
+    try:
+        got = await _SHARED.get_if_newer(url, after)
+    except Exception as e:
+        print(f"[MINSAL] capa compartida no disponible: {type(e).__name__}: {e}")
+        return None
+    if not got:
+        return None
+    data, at = got
+    if ttl is not None and time.time() - at >= ttl:
+        return None
+    return await _store(url, data, at, "compartido")
+
+
+async def _refresh_shared(url: str, ttl: float) -> Optional[list]:
+    # 1) Otro worker ya publicó una versión fresca: no se toca el upstream
+    data = await _shared_newer(url, ttl)
+    if data is not None:
+        return data
+
+    # 2) Sólo un worker a la vez descarga del MINSAL
+    try:
+        token = await _SHARED.acquire(url)
+    except Exception as e:
+        print(f"[MINSAL] lock compartido no disponible: {type(e).__name__}: {e}")
+        return await _refresh_direct(url)
+
+    if token:
+        try:
+            data = await _fetch_json(url)
+            if data is not None:
+                at = time.time()
+                await _store(url, data, at, "upstream")
+                try:
+                    await _SHARED.put(url, data, at)
+                except Exception as e:
+                    print(f"[MINSAL] no se pudo publicar en capa compartida: {type(e).__name__}: {e}")
+                return data
+        finally:
+            try:
+                await _SHARED.release(url, token)
+            except Exception:
+                pass
+    else:
+        # 3) Otro worker está descargando: esperar a que publique la versión nueva
+        deadline = time.monotonic() + SHARED_LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(SHARED_POLL)
+            data = await _shared_newer(url, ttl)
+            if data is not None:
+                return data
+
+    # Upstream caído o el otro worker no publicó: cualquier versión compartida más nueva sirve
+    return await _shared_newer(url)
+
+
+async def _refresh_direct(url: str) -> Optional[list]:
+    data = await _fetch_json(url)
+    if data is None:
+        # upstream caído: se conserva lo que haya en cache
+        return None
+    return await _store(url, data, time.time(), "upstream")
+
+
+async def _refresh(url: str, ttl: float) -> Optional[list]:
+    if _SHARED is not None:
+        return await _refresh_shared(url, ttl)
+    return await _refresh_direct(url)
+
+
+def _start_refresh(url: str, ttl: float) -> asyncio.Task:
+    """Single-flight: todas las llamadas concurrentes comparten la misma descarga."""
+    task = _INFLIGHT.get(url)
+    if task is None or task.done():
+        task = asyncio.create_task(_refresh(url, ttl))
+        _INFLIGHT[url] = task
+
+        def _done(t: asyncio.Task, u: str = url):
+            if _INFLIGHT.get(u) is t:
+                _INFLIGHT.pop(u, None)
+
+        task.add_done_callback(_done)
+    return task
+
+
+async def _cached_fetch(url: str, ttl: float) -> Optional[list]:
+    """
+    - Fresco: devuelve el cache.
+    - Vencido: devuelve el cache y refresca en segundo plano (stale-while-revalidate).
+    - Sin datos: espera la descarga (compartida con otras peticiones).
+    """
+    entry = _CACHE.get(url)
+    if entry is not None:
+        if time.time() - entry.fetched_at >= ttl:
+            _start_refresh(url, ttl)
+        return entry.data
+    # shield: si el cliente cancela, la descarga sigue para los demás
+    await asyncio.shield(_start_refresh(url, ttl))
+    entry = _CACHE.get(url)
+    return entry.data if entry is not None else None
+
+
+def clear_cache() -> None:
+    _CACHE.clear()
+
+
+def seed(url: str, data: list, fetched_at: float) -> bool:
+    """
+    Precarga el cache (p.ej. desde un snapshot en disco al arrancar).
+    No pisa datos más nuevos. Si ya venció su TTL, el primer uso lo refresca en segundo plano.
+    """
+    entry = _CACHE.get(url)
+    if entry is not None and entry.fetched_at >= fetched_at:
+        return False
+    _CACHE[url] = _CacheEntry(data, fetched_at)
+    return True
+
+
+def fetched_at(url: str) -> Optional[float]:
+    """Epoch de la última descarga buena (o del snapshot) para `url`."""
+    entry = _CACHE.get(url)
+    return entry.fetched_at if entry is not None else None
+
+
 async def get_locales_turno() -> List[Dict]:
     """Farmacias de turno (hoy, a nivel país)."""
-    url = f"{BASE}/getLocalesTurnos.php"
-    data = await _fetch_json(url)
-    print(f"[MINSAL] turnos recibidos: {len(data) if data else 0}")
+    data = await _cached_fetch(URL_TURNOS, TTL_TURNOS)
     return data or []
 
 
 async def get_locales_all() -> List[Dict]:
     """Catálogo completo de locales (no sólo turno)."""
-    url = f"{BASE}/getLocales.php"
-    data = await _fetch_json(url)
-    print(f"[MINSAL] locales recibidos: {len(data) if data else 0}")
+    data = await _cached_fetch(URL_LOCALES, TTL_LOCALES)
     return data or []
 
 
@@ -67,4 +313,11 @@ __all__ = [
     "get_turnos_hoy",
     "get_locales",
     "get_locales_cercanos",
+    "clear_cache",
+    "seed",
+    "set_shared_tier",
+    "set_feed_listener",
+    "fetched_at",
+    "start_client",
+    "close_client",
 ]
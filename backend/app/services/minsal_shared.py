@@ -0,0 +1,78 @@
+# backend/app/services/minsal_shared.py
+"""
+Capa compartida del feed MINSAL en Redis (entre workers / máquinas).
+
+Por feed se guardan:
+  minsal:{feed}:version  -> epoch de la descarga (float)
+  minsal:{feed}:data     -> feed normalizado, columnar, JSON + zlib
+  minsal:{feed}:lock     -> lock distribuido del refresco (SET NX PX + token)
+
+Un solo worker descarga del MINSAL; el resto ve subir `version` y copia `data`.
+Se registra con minsal_client.set_shared_tier().
+"""
+import os
+import json
+import asyncio
+import zlib
+from typing import List, Optional, Tuple
+
+from app.services.pharmacy_store import columns_to_feed, feed_to_columns
+from app.utils import redis_lock
+
+SHARED_ENABLED = os.getenv("MINSAL_SHARED_CACHE", "true").lower() not in ("0", "false", "no")
+KEY_PREFIX = os.getenv("MINSAL_SHARED_PREFIX", "minsal")
+DATA_TTL = int(os.getenv("MINSAL_SHARED_TTL", str(60 * 60 * 24 * 7)))  # 7 días
+LOCK_MS = int(os.getenv("MINSAL_SHARED_LOCK_MS", "30000"))
+
+
+def _feed_name(url: str) -> str:
+    # .../getLocalesTurnos.php -> getLocalesTurnos
+    return url.rstrip("/").rsplit("/", 1)[-1].split(".", 1)[0]
+
+
+def encode_feed(data: List[dict]) -> bytes:
+    body = feed_to_columns(data)
+    return zlib.compress(json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def decode_feed(blob: bytes) -> List[dict]:
+    return columns_to_feed(json.loads(zlib.decompress(blob).decode("utf-8")))
+
+
+class RedisFeedTier:
+    """Implementa la interfaz de minsal_client.set_shared_tier() sobre redis.asyncio."""
+
+    def __init__(self, redis_client):
+        # cliente redis.asyncio con decode_responses=False (los datos son binarios)
+        self.r = redis_client
+
+    def _key(self, url: str, kind: str) -> str:
+        return f"{KEY_PREFIX}:{_feed_name(url)}:{kind}"
+
+    async def get_if_newer(self, url: str, after: float) -> Optional[Tuple[List[dict], float]]:
+        raw = await self.r.get(self._key(url, "version"))
+        if raw is None:
+            return None
+        version = float(raw)
+        if version <= after:
+            return None
+        blob = await self.r.get(self._key(url, "data"))
+        if not blob:
+            return None
+        # zlib + JSON del feed nacional: fuera del event loop
+        return await asyncio.to_thread(decode_feed, blob), version
+
+    async def put(self, url: str, data: List[dict], fetched_at: float) -> None:
+        blob = await asyncio.to_thread(encode_feed, data)
+        # data y version juntos (MULTI/EXEC): nadie ve una versión sin sus datos
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(url, "data"), blob, ex=DATA_TTL)
+            pipe.set(self._key(url, "version"), repr(fetched_at), ex=DATA_TTL)
+            await pipe.execute()
+        print(f"[MINSAL] publicado en Redis {_feed_name(url)}: {len(blob) // 1024} KiB")
+
+    async def acquire(self, url: str) -> Optional[str]:
+        return await redis_lock.acquire(self.r, self._key(url, "lock"), LOCK_MS)
+
+    async def release(self, url: str, token: str) -> None:
+        await redis_lock.release(self.r, self._key(url, "lock"), token)
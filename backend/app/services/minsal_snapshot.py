@@ -0,0 +1,60 @@
+# backend/app/services/minsal_snapshot.py
+"""
+Snapshot en disco del último feed MINSAL bueno (ya normalizado).
+
+- Un archivo gzip+JSON por feed ("turnos", "locales") en MINSAL_SNAPSHOT_DIR.
+- Escritura atómica (tmp + os.replace): un worker nunca lee un archivo a medias.
+- Se carga al arrancar para servir de inmediato y sobrevivir caídas del upstream.
+"""
+import os
+import gzip
+import json
+from typing import Any, Dict, Optional
+
+SNAPSHOT_DIR = os.getenv("MINSAL_SNAPSHOT_DIR", ".minsal_snapshot")
+SNAPSHOT_ENABLED = os.getenv("MINSAL_SNAPSHOT", "true").lower() not in ("0", "false", "no")
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_path(tag: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{tag}.json.gz")
+
+
+def write_snapshot(tag: str, payload: Dict[str, Any]) -> Optional[str]:
+    """Escribe el snapshot de `tag`; devuelve la ruta o None si falla/está desactivado."""
+    if not SNAPSHOT_ENABLED:
+        return None
+    path = snapshot_path(tag)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        body = {"version": SNAPSHOT_VERSION, **payload}
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(body, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        return path
+    except Exception as e:
+        print(f"[SNAPSHOT] no se pudo escribir {path}: {type(e).__name__}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return None
+
+
+def read_snapshot(tag: str) -> Optional[Dict[str, Any]]:
+    """Lee el snapshot de `tag`; None si no existe, está corrupto o es de otra versión."""
+    if not SNAPSHOT_ENABLED:
+        return None
+    path = snapshot_path(tag)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            body = json.load(f)
+    except Exception as e:
+        print(f"[SNAPSHOT] no se pudo leer {path}: {type(e).__name__}: {e}")
+        return None
+    if not isinstance(body, dict) or body.get("version") != SNAPSHOT_VERSION:
+        return None
+    return body
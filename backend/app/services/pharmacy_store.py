@@ -0,0 +1,463 @@
+# backend/app/services/pharmacy_store.py
+"""
+Store columnar de locales MINSAL, construido UNA vez por refresco del feed.
+
+Cada petición sólo indexa arreglos ya normalizados: no se vuelven a parsear
+coordenadas, ni a clasificar nombres, ni a copiar los dicts crudos.
+"""
+import sys
+import heapq
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import minsal_client
+from app.services.minsal_client import get_locales_all, get_locales_turno
+from app.services.minsal_snapshot import read_snapshot, write_snapshot
+from app.utils.geo import extract_coords, haversine_km_np
+from app.utils.geo_index import GeoGridIndex
+
+_EXCLUDE = ("VETERINARIA", "CLÍNICA", "CLINICA", "HOSPITAL", "CONSULTORIO", "CENTRO MÉDICO", "CENTRO MEDICO", "CESFAM", "SAPU")
+_INCLUDE = ("FARMAC", "SIMI", "CRUZ VERDE", "SALCO", "AHUMADA")
+
+
+def is_pharmacy_only(name: str) -> bool:
+    """Descarta veterinarias, clínicas, CESFAM, etc.; deja farmacias y cadenas conocidas."""
+    if not name:
+        return False
+    u = name.upper()
+    if any(bad in u for bad in _EXCLUDE):
+        return False
+    return any(ok in u for ok in _INCLUDE)
+
+
+def _s(v: Any) -> str:
+    return str(v).strip() if v is not None else ""
+
+
+class PharmacyRecord:
+    """Campos de despliegue de un local (nombres de campo del MINSAL)."""
+
+    __slots__ = (
+        "local_id",
+        "local_nombre",
+        "comuna_nombre",
+        "localidad_nombre",
+        "local_direccion",
+        "local_telefono",
+        "funcionamiento_hora_apertura",
+        "funcionamiento_hora_cierre",
+        "funcionamiento_dia",
+        "fk_region",
+        "fk_comuna",
+        "fecha",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        intern = sys.intern
+        self.local_id = _s(raw.get("local_id"))
+        self.local_nombre = _s(raw.get("local_nombre") or raw.get("local"))
+        self.comuna_nombre = intern(_s(raw.get("comuna_nombre") or raw.get("comuna")))
+        self.localidad_nombre = intern(_s(raw.get("localidad_nombre")))
+        self.local_direccion = _s(raw.get("local_direccion") or raw.get("direccion"))
+        self.local_telefono = _s(raw.get("local_telefono") or raw.get("telefono"))
+        self.funcionamiento_hora_apertura = intern(_s(raw.get("funcionamiento_hora_apertura")))
+        self.funcionamiento_hora_cierre = intern(_s(raw.get("funcionamiento_hora_cierre")))
+        self.funcionamiento_dia = intern(_s(raw.get("funcionamiento_dia")))
+        self.fk_region = intern(_s(raw.get("fk_region")))
+        self.fk_comuna = intern(_s(raw.get("fk_comuna")))
+        self.fecha = intern(_s(raw.get("fecha")))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+def feed_to_columns(raw: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Forma normalizada y columnar de un feed crudo (sin construir índices)."""
+    fields = list(PharmacyRecord.__slots__)
+    rows: List[List[str]] = []
+    lats: List[float] = []
+    lons: List[float] = []
+    for it in raw or []:
+        lat, lon = extract_coords(it)
+        if lat is None or lon is None:
+            continue
+        r = PharmacyRecord(it)
+        rows.append([getattr(r, k) for k in fields])
+        lats.append(lat)
+        lons.append(lon)
+    return {"fields": fields, "rows": rows, "lat": lats, "lon": lons}
+
+
+def columns_to_feed(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverso de feed_to_columns: registros normalizados (válidos para from_feed)."""
+    fields = body["fields"]
+    out: List[Dict[str, Any]] = []
+    for row, lat, lon in zip(body["rows"], body["lat"], body["lon"]):
+        rec = dict(zip(fields, row))
+        rec["lat"] = lat
+        rec["long"] = lon
+        out.append(rec)
+    return out
+
+
+class ComunaPartition:
+    """
+    Locales (subconjunto `ids` de un store) agrupados por comuna:
+    - members[c]: ids del store en la comuna (arreglo pequeño).
+    - c_lat/c_lon + radius: círculo que contiene a todos sus locales; da una
+      cota inferior exacta de la distancia a cualquiera de ellos.
+    - region[c]: fk_region de la comuna, para prefiltrar.
+    La comuna -1 agrupa a los locales sin comuna.
+    """
+
+    def __init__(self, store: "PharmacyStore", ids: np.ndarray):
+        self.lat = store.lat
+        self.lon = store.lon
+        ids = np.asarray(ids, dtype=np.int64)
+        cids = store.comuna_id[ids]
+        order = np.argsort(cids, kind="stable")
+        ids, cids = ids[order], cids[order]
+        keys, starts = np.unique(cids, return_index=True)
+        self.keys = keys
+        self.members: List[np.ndarray] = np.split(ids, starts[1:]) if ids.shape[0] else []
+
+        n = len(self.members)
+        self.c_lat = np.empty(n, dtype=np.float64)
+        self.c_lon = np.empty(n, dtype=np.float64)
+        self.radius = np.empty(n, dtype=np.float64)
+        self.region = np.empty(n, dtype=object)
+        for c, mem in enumerate(self.members):
+            clat = float(self.lat[mem].mean())
+            clon = float(self.lon[mem].mean())
+            self.c_lat[c] = clat
+            self.c_lon[c] = clon
+            self.radius[c] = float(haversine_km_np(clat, clon, self.lat[mem], self.lon[mem]).max())
+            self.region[c] = store.records[int(mem[0])].fk_region
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def nearest_per_comuna(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+        region: Optional[str] = None,
+        include_unknown: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (ids, dist_km) del local más cercano de cada comuna, ordenados ascendente.
+        Visita las comunas por cota inferior de distancia y se detiene cuando
+        ninguna comuna restante puede mejorar el top-`limit`.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        if not len(self):
+            return empty
+        lb = np.maximum(haversine_km_np(lat, lon, self.c_lat, self.c_lon) - self.radius, 0.0)
+        mask = np.ones(len(self), dtype=bool)
+        if not include_unknown:
+            mask &= self.keys >= 0
+        if region:
+            mask &= self.region == str(region).strip()
+        if radius_km is not None:
+            mask &= lb <= radius_km
+        cand = np.flatnonzero(mask)
+        cand = cand[np.argsort(lb[cand], kind="stable")]
+
+        best: List[Tuple[float, int]] = []  # max-heap (-dist, id) de tamaño `limit`
+        for c in cand.tolist():
+            if limit and len(best) >= limit and lb[c] > -best[0][0]:
+                break
+            mem = self.members[c]
+            d = haversine_km_np(lat, lon, self.lat[mem], self.lon[mem])
+            j = int(np.argmin(d))
+            dj = float(d[j])
+            if radius_km is not None and dj > radius_km:
+                continue
+            item = (-dj, int(mem[j]))
+            if not limit or len(best) < limit:
+                heapq.heappush(best, item)
+            elif dj < -best[0][0]:
+                heapq.heapreplace(best, item)
+        if not best:
+            return empty
+        best.sort(key=lambda t: -t[0])
+        ids = np.fromiter((i for _, i in best), dtype=np.int64, count=len(best))
+        dists = np.fromiter((-d for d, _ in best), dtype=np.float64, count=len(best))
+        return ids, dists
+
+
+class PharmacyStore:
+    """
+    - lat/lon: float64 contiguos, alineados con `records`.
+    - comuna_id: int32 hacia `comunas` (nombres internados; -1 si no hay comuna).
+    - pharmacy_mask: bool, precalculado con is_pharmacy_only().
+    - index / pharmacy_index: grillas espaciales sobre todos / sólo farmacias.
+    - comunas_all / comunas_pharmacy: particiones por comuna (modo "una por comuna").
+    - fetched_at: epoch de la descarga (o snapshot) de la que sale el store.
+    """
+
+    def __init__(
+        self,
+        records: List[PharmacyRecord],
+        lat: np.ndarray,
+        lon: np.ndarray,
+        fetched_at: float = 0.0,
+    ):
+        self.records = records
+        self.fetched_at = fetched_at
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+
+        self.comunas: List[str] = []
+        comuna_ids: Dict[str, int] = {}
+        cids = np.full(len(records), -1, dtype=np.int32)
+        for i, r in enumerate(records):
+            key = r.comuna_nombre.lower()
+            if not key:
+                continue
+            cid = comuna_ids.get(key)
+            if cid is None:
+                cid = comuna_ids[key] = len(self.comunas)
+                self.comunas.append(r.comuna_nombre)
+            cids[i] = cid
+        self.comuna_id = cids
+        self.fk_region = np.array([r.fk_region for r in records], dtype=object)
+
+        self.pharmacy_mask = np.fromiter(
+            (is_pharmacy_only(r.local_nombre) for r in records), dtype=bool, count=len(records)
+        )
+        self.index = GeoGridIndex(self.lat, self.lon)
+        self.pharmacy_index = GeoGridIndex(self.lat, self.lon, ids=np.flatnonzero(self.pharmacy_mask))
+        self.comunas_all = ComunaPartition(self, np.arange(len(records)))
+        self.comunas_pharmacy = ComunaPartition(self, np.flatnonzero(self.pharmacy_mask))
+
+    @classmethod
+    def from_feed(cls, raw: List[Dict[str, Any]]) -> "PharmacyStore":
+        """Normaliza el feed crudo; descarta locales sin coordenadas válidas."""
+        records: List[PharmacyRecord] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        for it in raw or []:
+            lat, lon = extract_coords(it)
+            if lat is None or lon is None:
+                continue
+            records.append(PharmacyRecord(it))
+            lats.append(lat)
+            lons.append(lon)
+        return cls(records, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+
+    # ---------- snapshot (forma normalizada, columnar) ----------
+    def to_snapshot(self) -> Dict[str, Any]:
+        fields = list(PharmacyRecord.__slots__)
+        return {
+            "fetched_at": self.fetched_at,
+            "fields": fields,
+            "rows": [[getattr(r, k) for k in fields] for r in self.records],
+            "lat": self.lat.tolist(),
+            "lon": self.lon.tolist(),
+        }
+
+    @classmethod
+    def from_snapshot(cls, body: Dict[str, Any]) -> "PharmacyStore":
+        fields = body["fields"]
+        records = [PharmacyRecord(dict(zip(fields, row))) for row in body["rows"]]
+        return cls(
+            records,
+            np.asarray(body["lat"], dtype=np.float64),
+            np.asarray(body["lon"], dtype=np.float64),
+            fetched_at=float(body.get("fetched_at") or 0.0),
+        )
+
+    def to_feed(self) -> List[Dict[str, Any]]:
+        """Registros normalizados como feed (válido para from_feed)."""
+        out = []
+        for i, r in enumerate(self.records):
+            rec = r.to_dict()
+            rec["lat"] = float(self.lat[i])
+            rec["long"] = float(self.lon[i])
+            out.append(rec)
+        return out
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def updated_at(self) -> Optional[str]:
+        """Frescura de los datos (ISO 8601, UTC)."""
+        if not self.fetched_at:
+            return None
+        return datetime.fromtimestamp(self.fetched_at, timezone.utc).isoformat(timespec="seconds")
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+        region: Optional[str] = None,
+        pharmacy_only: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (ids, dist_km) ordenados ascendente; misma semántica limit/radius_km que attach_distance.
+        Con `region` (fk_region) se recorren sólo los locales de esa región, sin la grilla.
+        """
+        if region:
+            mask = self.fk_region == str(region).strip()
+            if pharmacy_only:
+                mask &= self.pharmacy_mask
+            ids = np.flatnonzero(mask)
+            d = haversine_km_np(lat, lon, self.lat[ids], self.lon[ids])
+            if radius_km is not None:
+                keep = d <= radius_km
+                ids, d = ids[keep], d[keep]
+            order = np.argsort(d, kind="stable")
+            if limit:
+                order = order[:limit]
+            return ids[order], d[order]
+        idx = self.pharmacy_index if pharmacy_only else self.index
+        return idx.query(lat, lon, limit=limit, radius_km=radius_km)
+
+    def nearest_per_comuna(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+        region: Optional[str] = None,
+        pharmacy_only: bool = False,
+        include_unknown: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """El más cercano de cada comuna (ver ComunaPartition.nearest_per_comuna)."""
+        part = self.comunas_pharmacy if pharmacy_only else self.comunas_all
+        return part.nearest_per_comuna(
+            lat, lon, limit=limit, radius_km=radius_km, region=region, include_unknown=include_unknown
+        )
+
+    def to_dicts(
+        self,
+        ids: np.ndarray,
+        dists: np.ndarray,
+        *,
+        distance_key: str = "dist_km",
+        ndigits: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """Salida para la API: campos MINSAL + lat/long normalizados + distancia."""
+        out: List[Dict[str, Any]] = []
+        for i, d in zip(ids.tolist(), dists.tolist()):
+            rec = self.records[i].to_dict()
+            rec["lat"] = float(self.lat[i])
+            rec["long"] = float(self.lon[i])
+            rec[distance_key] = round(d, ndigits)
+            out.append(rec)
+        return out
+
+
+# ---------- Un store por feed, reconstruido sólo cuando el feed cambia ----------
+# El cache del MINSAL devuelve la MISMA lista hasta que se refresca.
+_FEED_URLS = {"turnos": minsal_client.URL_TURNOS, "locales": minsal_client.URL_LOCALES}
+_STORES: Dict[str, Tuple[List[Dict[str, Any]], PharmacyStore]] = {}
+_SNAPSHOT_AT: Dict[str, float] = {}
+
+
+def _save_snapshot(tag: str, store: PharmacyStore) -> None:
+    path = write_snapshot(tag, store.to_snapshot())
+    if path:
+        print(f"[SNAPSHOT] {tag}: {len(store)} locales -> {path}")
+
+
+def _schedule_snapshot(tag: str, store: PharmacyStore) -> None:
+    if not len(store) or store.fetched_at <= _SNAPSHOT_AT.get(tag, 0.0):
+        return
+    _SNAPSHOT_AT[tag] = store.fetched_at
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _save_snapshot(tag, store)
+        return
+    # I/O de disco fuera del event loop
+    loop.run_in_executor(None, _save_snapshot, tag, store)
+
+
+def _install(tag: str, raw: List[Dict[str, Any]], store: PharmacyStore) -> None:
+    _STORES[tag] = (raw, store)
+    print(f"[STORE] {tag}: {len(store)} locales ({int(store.pharmacy_mask.sum())} farmacias)")
+    _schedule_snapshot(tag, store)
+
+
+def _build(raw: List[Dict[str, Any]], fetched_at: float) -> PharmacyStore:
+    store = PharmacyStore.from_feed(raw)
+    store.fetched_at = fetched_at or 0.0
+    return store
+
+
+async def on_feed(url: str, raw: List[Dict[str, Any]], fetched_at: float) -> None:
+    """
+    Listener de minsal_client (set_feed_listener): arma el store en un thread al
+    refrescarse el feed, antes de que las peticiones lo vean.
+    """
+    tag = next((t for t, u in _FEED_URLS.items() if u == url), None)
+    if tag is None:
+        return
+    _install(tag, raw, await asyncio.to_thread(_build, raw, fetched_at))
+
+
+def store_for(raw: List[Dict[str, Any]], tag: str) -> PharmacyStore:
+    hit = _STORES.get(tag)
+    if hit is not None and hit[0] is raw:
+        return hit[1]
+    # sin listener registrado (scripts, tests): se arma en la petición
+    url = _FEED_URLS.get(tag)
+    store = _build(raw, (minsal_client.fetched_at(url) if url else None) or 0.0)
+    _install(tag, raw, store)
+    return store
+
+
+def load_snapshots() -> None:
+    """
+    Al arrancar: carga los snapshots en disco y precarga el cache del MINSAL,
+    para responder sin esperar (ni depender de) el upstream.
+    """
+    for tag, url in _FEED_URLS.items():
+        body = read_snapshot(tag)
+        if not body:
+            continue
+        try:
+            store = PharmacyStore.from_snapshot(body)
+        except Exception as e:
+            print(f"[SNAPSHOT] {tag} inválido: {type(e).__name__}: {e}")
+            continue
+        feed = store.to_feed()
+        if minsal_client.seed(url, feed, store.fetched_at):
+            _STORES[tag] = (feed, store)
+            _SNAPSHOT_AT[tag] = store.fetched_at
+            print(f"[SNAPSHOT] {tag}: {len(store)} locales cargados ({store.updated_at()})")
+
+
+async def get_store_turnos() -> PharmacyStore:
+    return store_for(await get_locales_turno(), "turnos")
+
+
+async def get_store_locales() -> PharmacyStore:
+    return store_for(await get_locales_all(), "locales")
+
+
+__all__ = [
+    "PharmacyRecord",
+    "ComunaPartition",
+    "PharmacyStore",
+    "is_pharmacy_only",
+    "feed_to_columns",
+    "columns_to_feed",
+    "store_for",
+    "on_feed",
+    "load_snapshots",
+    "get_store_turnos",
+    "get_store_locales",
+]
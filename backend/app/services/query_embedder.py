@@ -0,0 +1,214 @@
+# backend/app/services/query_embedder.py
+"""
+Embeddings de consultas con caché y micro-batching.
+
+- Caché LRU/TTL por texto normalizado: "Para qué sirve el paracetamol?" y
+  "para que sirve el paracetamol" comparten vector.
+- Las consultas concurrentes que no están en caché se juntan durante unos
+  milisegundos (o hasta EMB_BATCH_MAX) y se codifican en un solo encode().
+- Una misma consulta en vuelo se codifica una sola vez (single-flight).
+"""
+import os
+import re
+import time
+import queue
+import asyncio
+import threading
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.ttl_cache import TTLCache
+
+EMB_CACHE_SIZE = int(os.getenv("EMB_CACHE_SIZE", "4096"))
+EMB_CACHE_TTL = float(os.getenv("EMB_CACHE_TTL", str(60 * 60 * 24)))  # 24 h
+EMB_BATCH_MAX = int(os.getenv("EMB_BATCH_MAX", "32"))
+EMB_BATCH_WAIT_MS = float(os.getenv("EMB_BATCH_WAIT_MS", "5"))
+
+
+def cache_key(text: str) -> str:
+    s = (text or "").strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    s = re.sub(r"[¿?¡!.,;:]+", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+class QueryEmbedder:
+    """
+    Envuelve un SentenceTransformer; embed() es bloqueante y seguro entre threads.
+    Con `loader` el modelo se carga en el primer uso (o en warmup(), en segundo plano).
+    """
+
+    def __init__(
+        self,
+        model=None,
+        cache_size: int = EMB_CACHE_SIZE,
+        cache_ttl: float = EMB_CACHE_TTL,
+        max_batch: int = EMB_BATCH_MAX,
+        max_wait_ms: float = EMB_BATCH_WAIT_MS,
+        loader: Optional[Callable[[], Any]] = None,
+    ):
+        self._model = model
+        self._loader = loader
+        self._model_lock = threading.Lock()
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue: "queue.Queue[Tuple[str, str, Future]]" = queue.Queue()
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+        # métricas
+        self.batches = 0
+        self.encoded = 0
+        self.max_seen_batch = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    t0 = time.perf_counter()
+                    self._model = self._loader()
+                    print(f"[Embed] modelo cargado en {time.perf_counter() - t0:.1f} s")
+        return self._model
+
+    def warmup(self) -> None:
+        """Carga el modelo en un thread aparte: el arranque no espera por él."""
+        if self._model is None and self._loader is not None:
+            threading.Thread(target=lambda: self.model, name="embedder-warmup", daemon=True).start()
+
+    # ---------- API ----------
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Un vector normalizado por texto, en el mismo orden."""
+        futs = [self.submit(t) for t in texts]
+        return np.stack([f.result() for f in futs]) if futs else np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def batching(self) -> bool:
+        return self.max_batch > 1 and self.max_wait > 0.0
+
+    async def aembed(self, texts: List[str], executor=None) -> np.ndarray:
+        """Versión async: espera los futures del worker sin ocupar el event loop."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if not self.batching:
+            # sin worker, submit() codifica en el thread que llama: mandarlo al pool
+            return await asyncio.get_running_loop().run_in_executor(executor, self.embed, texts)
+        # shield: cancelar esta request no cancela el future compartido (single-flight)
+        vecs = await asyncio.gather(*(asyncio.shield(asyncio.wrap_future(self.submit(t))) for t in texts))
+        return np.stack(vecs)
+
+    def submit(self, text: str) -> Future:
+        key = cache_key(text)
+        vec = self.cache.get(key)
+        if vec is not None:
+            fut: Future = Future()
+            fut.set_result(vec)
+            return fut
+
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is not None:
+                return fut
+            fut = Future()
+            self._pending[key] = fut
+
+        if not self.batching:
+            self._run_batch([(key, text, fut)])
+        else:
+            self._ensure_worker()
+            self._queue.put((key, text, fut))
+        return fut
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "batches": self.batches,
+            "encoded": self.encoded,
+            "avg_batch": round(self.encoded / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_seen_batch,
+            "encode_ms_total": round(self.encode_seconds * 1000.0, 1),
+            "in_flight": len(self._pending),
+            "model_loaded": self._model is not None,
+        }
+
+    # ---------- Worker ----------
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, name="query-embedder", daemon=True)
+                self._worker.start()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as e:  # el worker no debe morir: dejaría colgados a todos
+                print(f"[Embed] error en el lote: {type(e).__name__}: {e}")
+
+    def _settle(self, batch: List[Tuple[str, str, Future]], vecs=None, error: Optional[BaseException] = None) -> None:
+        """Resuelve los futures del lote; uno ya resuelto o cancelado no frena al resto."""
+        with self._lock:
+            for key, _, _ in batch:
+                self._pending.pop(key, None)
+        for i, (_, _, fut) in enumerate(batch):
+            try:
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(vecs[i])
+            except Exception as e:  # InvalidStateError: alguien lo resolvió/canceló
+                print(f"[Embed] future no resuelto: {type(e).__name__}")
+
+    def _run_batch(self, batch: List[Tuple[str, str, Future]]) -> None:
+        # los cancelados antes de empezar se descartan; el resto ya no se puede cancelar
+        live = []
+        for item in batch:
+            if item[2].set_running_or_notify_cancel():
+                live.append(item)
+            else:
+                with self._lock:
+                    self._pending.pop(item[0], None)
+        batch = live
+        if not batch:
+            return
+        texts = [text for _, text, _ in batch]
+        t0 = time.perf_counter()
+        try:
+            vecs = np.asarray(
+                self.model.encode(texts, normalize_embeddings=True, batch_size=len(texts)),
+                dtype=np.float32,
+            )
+        except Exception as e:
+            print(f"[Embed] encode error ({len(texts)} textos): {e}")
+            self._settle(batch, error=e)
+            return
+
+        self.encode_seconds += time.perf_counter() - t0
+        self.batches += 1
+        self.encoded += len(texts)
+        self.max_seen_batch = max(self.max_seen_batch, len(texts))
+
+        for (key, _, fut), vec in zip(batch, vecs):
+            vec.setflags(write=False)  # compartido entre requests: sólo lectura
+            self.cache.put(key, vec)
+        self._settle(batch, vecs)
@@ -1,58 +1,299 @@
+import os
 import json
-from typing import List, Tuple
-from redis.exceptions import RedisError, AuthenticationError, ConnectionError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from redis.exceptions import RedisError, AuthenticationError, ConnectionError, TimeoutError
+
+from app.utils.ttl_cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
 
 TTL_SECONDS = 60 * 60 * 24 * 14  # 14 días
 
+# El historial es una lista de Redis (un elemento por vuelta): append + trim,
+# sin re-serializar todo el historial en cada turno.
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "10"))  # vueltas que recibe el grafo
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "200"))  # vueltas retenidas (transcript)
+HISTORY_CODEC = os.getenv("HISTORY_CODEC", "orjson")  # "json" | "orjson" | "msgpack" (cliente binario)
+
+# campos del hash de sesión session:{user_id}
+SESSION_FIELDS = ("last_drug", "tz", "name")
+
+# Fallback en proceso (compartido por todas las instancias) si Redis no responde
+SESSION_FALLBACK_USERS = int(os.getenv("SESSION_FALLBACK_USERS", "10000"))
+SESSION_FALLBACK_TTL = float(os.getenv("SESSION_FALLBACK_TTL", str(60 * 60 * 2)))  # 2 h
+SESSION_FALLBACK_MB = float(os.getenv("SESSION_FALLBACK_MB", "32"))
+SESSION_FALLBACK_TURNS = int(os.getenv("SESSION_FALLBACK_TURNS", "20"))
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "3"))
+REDIS_BREAKER_BACKOFF = float(os.getenv("REDIS_BREAKER_BACKOFF", "5"))
+REDIS_BREAKER_MAX_BACKOFF = float(os.getenv("REDIS_BREAKER_MAX_BACKOFF", "60"))
+
+# Redis caído (cuentan para el breaker); otros RedisError sólo caen al fallback
+_OUTAGE = (ConnectionError, TimeoutError, AuthenticationError)
+
+
+def _codec(name: str, binary_ok: bool) -> Tuple[str, Callable[[Any], Any], Callable[[Any], Any]]:
+    """(nombre, encode, decode) del codec pedido, o el más cercano disponible."""
+    if name == "msgpack" and binary_ok:
+        try:
+            import msgpack
+            return "msgpack", msgpack.packb, lambda b: msgpack.unpackb(b, raw=False)
+        except ImportError:
+            print("[Memoria] msgpack no instalado; se usa orjson")
+            name = "orjson"
+    elif name == "msgpack":
+        print("[Memoria] msgpack requiere un cliente Redis sin decode_responses; se usa orjson")
+        name = "orjson"
+    if name == "orjson":
+        try:
+            import orjson
+            return "orjson", orjson.dumps, orjson.loads
+        except ImportError:
+            pass
+    return "json", lambda v: json.dumps(v, ensure_ascii=False, separators=(",", ":")), json.loads
+
+
+def _text(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    return v.decode("utf-8", "replace") if isinstance(v, bytes) else str(v)
+
+
+def _session_size(entry: Dict[str, Any]) -> int:
+    """Bytes aproximados de una sesión en memoria (strings + overhead de contenedores)."""
+    size = 240
+    for msg, reply in entry.get("history", ()):
+        size += len(msg) + len(reply) + 170
+    for f in SESSION_FIELDS:
+        v = entry.get(f)
+        if v:
+            size += len(v) + 50
+    return size
+
+
+class SessionFallback:
+    """
+    Sesiones en proceso mientras Redis no está: LRU+TTL por usuario, con tope
+    de usuarios, de memoria (aprox.) y de vueltas por usuario. Una instancia por proceso.
+    """
+
+    def __init__(self, maxsize: int = SESSION_FALLBACK_USERS, ttl: float = SESSION_FALLBACK_TTL,
+                 max_mb: float = SESSION_FALLBACK_MB, max_turns: int = SESSION_FALLBACK_TURNS):
+        self.cache = TTLCache(maxsize, ttl, maxbytes=int(max_mb * 1024 * 1024), sizeof=_session_size)
+        self.max_turns = max(1, max_turns)
+        self.writes = 0
+
+    def state(self, user_id: str, n: int) -> Dict[str, Any]:
+        entry = self.cache.get(user_id) or {}
+        state: Dict[str, Any] = {f: entry.get(f) for f in SESSION_FIELDS}
+        turns = entry.get("history", [])
+        state["turns"] = entry.get("turns", len(turns))
+        state["history"] = turns[-n:]
+        return state
+
+    def _update(self, user_id: str, history: Optional[List[Tuple[str, str]]] = None,
+                turns: int = 0, values: Optional[Dict[str, str]] = None):
+        # las entradas no se mutan: put() recalcula el tamaño
+        entry = dict(self.cache.get(user_id) or {})
+        if history is not None:
+            entry["history"] = history[-self.max_turns:]
+        entry["turns"] = entry.get("turns", 0) + turns
+        entry.update(values or {})
+        self.cache.put(user_id, entry)
+        self.writes += 1
+
+    def add_turn(self, user_id: str, message: str, reply: str, values: Dict[str, str]):
+        entry = self.cache.get(user_id) or {}
+        self._update(user_id, list(entry.get("history", [])) + [(message, reply)], 1, values)
+
+    def set_history(self, user_id: str, history: List[Tuple[str, str]]):
+        entry = self.cache.get(user_id) or {}
+        self._update(user_id, history, len(history) - entry.get("turns", 0))
+
+    def set_fields(self, user_id: str, values: Dict[str, str]):
+        self._update(user_id, values=values)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"writes": self.writes, "max_turns": self.max_turns, **self.cache.stats()}
+
+
+session_fallback = SessionFallback()
+redis_breaker = CircuitBreaker(
+    "redis-sessions",
+    failures=REDIS_BREAKER_FAILURES,
+    backoff=REDIS_BREAKER_BACKOFF,
+    max_backoff=REDIS_BREAKER_MAX_BACKOFF,
+)
+
+
+def memory_stats() -> Dict[str, Any]:
+    return {"breaker": redis_breaker.stats(), "fallback": session_fallback.stats()}
+
 
 class RedisMemory:
-    def __init__(self, redis_client):
+    """
+    Estado de sesión sobre redis.asyncio; una vuelta de chat cuesta dos round trips:
+      load_turn(): HGETALL session:{u} + LRANGE session:{u}:turns (pipeline)
+      save_turn(): RPUSH/LTRIM/EXPIRE de la lista + HSET/HINCRBY/EXPIRE del hash (pipeline)
+    El hash guarda last_drug, tz, name y `turns` (vueltas escritas: puntero al historial).
+
+    Si Redis no responde se usa el fallback del proceso; tras varias fallas
+    seguidas el breaker deja de intentar durante el backoff (sin timeouts por turno).
+    """
+
+    def __init__(self, redis_client, window: int = HISTORY_WINDOW, max_turns: int = HISTORY_MAX_TURNS,
+                 codec: str = HISTORY_CODEC, fallback: Optional[SessionFallback] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self.r = redis_client
-        # Fallback en proceso por si Redis falla
-        self._fallback_history = {}
-        self._fallback_last_drug = {}
+        self.window = max(1, window)
+        self.max_turns = max(self.window, max_turns)
+        decodes = getattr(getattr(redis_client, "connection_pool", None), "connection_kwargs", {}).get("decode_responses")
+        self.codec, self._encode, self._decode = _codec(codec, binary_ok=not decodes)
+        # compartidos por todas las instancias (deps crea una por request)
+        self.fallback = fallback if fallback is not None else session_fallback
+        self.breaker = breaker if breaker is not None else redis_breaker
 
     # ---------- keys ----------
+    def _key_session(self, user_id: str) -> str:
+        return f"session:{user_id}"
+
+    def _key_turns(self, user_id: str) -> str:
+        return f"session:{user_id}:turns"
+
     def _key_history(self, user_id: str) -> str:
+        # formato anterior: todo el historial como un solo JSON (se migra al leer)
         return f"session:{user_id}:history"
 
     def _key_last_drug(self, user_id: str) -> str:
+        # formato anterior: last_drug en su propia key (se migra al hash)
         return f"session:{user_id}:last_drug"
 
-    # ---------- history ----------
-    def load(self, user_id: str) -> List[Tuple[str, str]]:
-        try:
-            data = self.r.get(self._key_history(user_id))
-            if not data:
-                return self._fallback_history.get(user_id, [])
-            return json.loads(data)
-        except (RedisError, AuthenticationError, ConnectionError):
-            return self._fallback_history.get(user_id, [])
-
-    def save(self, user_id: str, history: List[tuple]):
+    # ---------- helpers ----------
+    def _turns(self, raw: List[Any]) -> List[Tuple[str, str]]:
+        out = []
+        for item in raw:
+            try:
+                msg, reply = self._decode(item)
+                out.append((msg, reply))
+            except Exception:
+                continue  # elemento de otro codec o corrupto: se omite
+        return out
+
+    async def _execute(self, pipe) -> Optional[List[Any]]:
+        """Resultado del pipeline, o None si Redis no está disponible (o el breaker está abierto)."""
+        if not self.breaker.allow():
+            return None
         try:
-            self.r.set(
-                self._key_history(user_id),
-                json.dumps(history, ensure_ascii=False),
-                ex=TTL_SECONDS,
-            )
-        except (RedisError, AuthenticationError, ConnectionError):
-            self._fallback_history[user_id] = history
+            out = await pipe.execute()
+        except _OUTAGE as e:
+            self.breaker.failure()
+            print(f"[Memoria] Redis no disponible: {type(e).__name__}: {e}")
+            return None
+        except RedisError as e:
+            print(f"[Memoria] error de Redis: {type(e).__name__}: {e}")
+            return None
+        self.breaker.success()
+        return out
+
+    def _push(self, pipe, user_id: str, turns: List[Tuple[str, str]]):
+        key = self._key_turns(user_id)
+        pipe.rpush(key, *[self._encode(list(t)) for t in turns])
+        pipe.ltrim(key, -self.max_turns, -1)
+        pipe.expire(key, TTL_SECONDS)
+
+    async def _migrate_legacy(self, user_id: str, history: Any, last_drug: Any) -> List[Tuple[str, str]]:
+        turns = [tuple(t) for t in json.loads(history)][-self.max_turns:] if history else []
+        pipe = self.r.pipeline(transaction=True)
+        if turns:
+            self._push(pipe, user_id, turns)
+            pipe.hset(self._key_session(user_id), "turns", len(turns))
+        if last_drug:
+            pipe.hset(self._key_session(user_id), "last_drug", last_drug)
+        pipe.expire(self._key_session(user_id), TTL_SECONDS)
+        pipe.delete(self._key_history(user_id), self._key_last_drug(user_id))
+        if await self._execute(pipe) is None:
+            raise ConnectionError("no se pudo migrar la sesión")
+        return turns
+
+    # ---------- vuelta de chat ----------
+    async def load_turn(self, user_id: str, n: int | None = None) -> Dict[str, Any]:
+        """
+        {"history": últimas n vueltas, "last_drug", "tz", "name", "turns"} en un round trip.
+        (Las keys del formato anterior viajan en el mismo pipeline y se migran si existen.)
+        """
+        n = n or self.window
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hgetall(self._key_session(user_id))
+        pipe.lrange(self._key_turns(user_id), -n, -1)
+        pipe.get(self._key_history(user_id))
+        pipe.get(self._key_last_drug(user_id))
+        out = await self._execute(pipe)
+        if out is None:
+            return self.fallback.state(user_id, n)
+        fields, raw, legacy_history, legacy_last_drug = out
+
+        fields = {_text(k): _text(v) for k, v in (fields or {}).items()}
+        if legacy_history is not None or legacy_last_drug is not None:
+            try:
+                turns = await self._migrate_legacy(user_id, None if raw else legacy_history, legacy_last_drug)
+                raw = raw or [self._encode(list(t)) for t in turns[-n:]]
+                fields.setdefault("turns", str(len(turns)))
+                if legacy_last_drug is not None:
+                    fields.setdefault("last_drug", _text(legacy_last_drug))
+            except (RedisError, ValueError):
+                pass
+        if not raw and not fields:
+            # nada en Redis: puede haber una sesión de un corte reciente
+            return self.fallback.state(user_id, n)
+
+        state: Dict[str, Any] = {f: fields.get(f) or None for f in SESSION_FIELDS}
+        state["turns"] = int(fields.get("turns") or 0)
+        state["history"] = self._turns(raw)
+        return state
+
+    async def save_turn(self, user_id: str, message: str, reply: str, **session: Optional[str]):
+        """
+        Agrega la vuelta y actualiza el hash (last_drug/tz/name no vacíos) en un round trip.
+        Escribe sólo la vuelta nueva, no el historial.
+        """
+        values = {k: v for k, v in session.items() if k in SESSION_FIELDS and v}
+        pipe = self.r.pipeline(transaction=False)
+        self._push(pipe, user_id, [(message, reply)])
+        if values:
+            pipe.hset(self._key_session(user_id), mapping=values)
+        pipe.hincrby(self._key_session(user_id), "turns", 1)
+        pipe.expire(self._key_session(user_id), TTL_SECONDS)
+        if await self._execute(pipe) is None:
+            self.fallback.add_turn(user_id, message, reply, values)
+
+    # ---------- history ----------
+    async def load(self, user_id: str, n: int | None = None) -> List[Tuple[str, str]]:
+        """Últimas `n` vueltas (por defecto HISTORY_WINDOW), de la más antigua a la más nueva."""
+        return (await self.load_turn(user_id, n))["history"]
+
+    async def transcript(self, user_id: str) -> List[Tuple[str, str]]:
+        """Todas las vueltas retenidas (hasta HISTORY_MAX_TURNS)."""
+        return await self.load(user_id, self.max_turns)
+
+    async def save(self, user_id: str, history: List[tuple]):
+        """Reemplaza el historial completo (p.ej. para importar); el chat usa save_turn()."""
+        history = [tuple(t) for t in history][-self.max_turns:]
+        pipe = self.r.pipeline(transaction=True)
+        pipe.delete(self._key_turns(user_id))
+        if history:
+            self._push(pipe, user_id, history)
+        pipe.hset(self._key_session(user_id), "turns", len(history))
+        pipe.expire(self._key_session(user_id), TTL_SECONDS)
+        if await self._execute(pipe) is None:
+            self.fallback.set_history(user_id, history)
 
     # ---------- last drug ----------
-    def load_last_drug(self, user_id: str) -> str | None:
-        try:
-            v = self.r.get(self._key_last_drug(user_id))
-            if v is None:
-                return self._fallback_last_drug.get(user_id)
-            return v
-        except (RedisError, AuthenticationError, ConnectionError):
-            return self._fallback_last_drug.get(user_id)
-
-    def save_last_drug(self, user_id: str, drug: str | None):
+    async def load_last_drug(self, user_id: str) -> str | None:
+        return (await self.load_turn(user_id, 1))["last_drug"]
+
+    async def save_last_drug(self, user_id: str, drug: str | None):
         if not drug:
             return
-        try:
-            self.r.set(self._key_last_drug(user_id), drug, ex=TTL_SECONDS)
-        except (RedisError, AuthenticationError, ConnectionError):
-            self._fallback_last_drug[user_id] = drug
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hset(self._key_session(user_id), "last_drug", drug)
+        pipe.expire(self._key_session(user_id), TTL_SECONDS)
+        if await self._execute(pipe) is None:
+            self.fallback.set_fields(user_id, {"last_drug": drug})
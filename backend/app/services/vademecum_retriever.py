@@ -1,15 +1,26 @@
 from __future__ import annotations
 import os
 import re
+import time
+import asyncio
+import functools
+import threading
 import unicodedata
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models as qm
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import dotenv
 
+from app.utils.name_matcher import VocabMatcher
+from app.utils.fuzzy_index import FuzzyNameIndex
+from app.services.query_embedder import QueryEmbedder
+from app.services.drug_cache import DrugDocCache, DrugGroup
+from app.services import vademecum_snapshot
+
 dotenv.load_dotenv()
 
 try:
@@ -32,6 +43,27 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "vademecum_es")
 _EMB_MODEL_NAME = os.getenv("EMB_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+VADEMECUM_BACKEND = os.getenv("VADEMECUM_BACKEND", "qdrant").lower()
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+# llamadas simultáneas a Qdrant por worker; el resto espera (y se mide la espera)
+QDRANT_MAX_CONCURRENCY = int(os.getenv("QDRANT_MAX_CONCURRENCY", "16"))
+# threads para trabajo de CPU (índices de nombres, encode sin micro-batching)
+RETRIEVER_WORKERS = int(os.getenv("RETRIEVER_WORKERS", "4"))
+# tope de payloads por fármaco en lookup_sections (todas las secciones en una sola página)
+NAME_LOOKUP_LIMIT = int(os.getenv("NAME_LOOKUP_LIMIT", "1024"))
+
+SECTION_ORDER = ["indicaciones", "efectos_secundarios", "contraindicaciones", "interacciones", "advertencias", "posologia", "mecanismo"]
+
+# Secciones en inglés (datasets bilingües)
+EN_SECTIONS: Dict[str, List[str]] = {
+    "indicaciones": ["indications"],
+    "efectos_secundarios": ["adverse_reactions", "side effects", "side_effects"],
+    "contraindicaciones": ["contraindications"],
+    "interacciones": ["interactions"],
+    "advertencias": ["warnings", "precautions"],
+    "posologia": ["dosage", "dosing", "dose"],
+    "mecanismo": ["mechanism", "mechanism_of_action"],
+}
 
 
 def _norm(s: str) -> str:
@@ -92,26 +124,116 @@ def _canon_section(payload: Dict[str, Any]) -> str:
     return raw
 
 
+class RetrieverMetrics:
+    """Contadores por operación (sólo se tocan desde el event loop)."""
+
+    def __init__(self):
+        self.ops: Dict[str, Dict[str, float]] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def begin(self, op: str, waited_s: float) -> None:
+        m = self.ops.setdefault(op, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "wait_ms": 0.0})
+        m["calls"] += 1
+        m["wait_ms"] += waited_s * 1000.0
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def end(self, op: str, elapsed_s: float, ok: bool) -> None:
+        m = self.ops[op]
+        ms = elapsed_s * 1000.0
+        m["total_ms"] += ms
+        m["max_ms"] = max(m["max_ms"], ms)
+        if not ok:
+            m["errors"] += 1
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        ops = {}
+        for op, m in self.ops.items():
+            calls = m["calls"] or 1
+            ops[op] = {
+                "calls": int(m["calls"]),
+                "errors": int(m["errors"]),
+                "avg_ms": round(m["total_ms"] / calls, 2),
+                "max_ms": round(m["max_ms"], 2),
+                "avg_wait_ms": round(m["wait_ms"] / calls, 2),
+            }
+        return {"in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight, "ops": ops}
+
+
+_NAME_KEYS = ("name_es", "generic_name_es", "name", "generic_name")
+
+
+def collect_names(payloads: Iterable[Dict[str, Any]], norm_to_display: Dict[str, str]) -> Dict[str, str]:
+    """Vocab de nombres: normalizado -> nombre para mostrar (el primero visto gana)."""
+    for pl in payloads:
+        for k in _NAME_KEYS:
+            v = pl.get(k)
+            if isinstance(v, str) and v.strip():
+                norm = _norm(v)
+                if norm and norm not in norm_to_display:
+                    display = pl.get("name_es") or pl.get("generic_name_es") or pl.get("name") or pl.get("generic_name") or v
+                    norm_to_display[norm] = display
+    return norm_to_display
+
+
+def _name_filter(text: str, exact: bool = False) -> qm.Filter:
+    should = []
+    for key in _NAME_KEYS:
+        should.append(qm.FieldCondition(key=key, match=qm.MatchText(text=text)))
+        if exact:
+            should.append(qm.FieldCondition(key=key, match=qm.MatchValue(value=text)))
+    return qm.Filter(should=should)
+
+
+def _is_exact_section(payload: Dict[str, Any], section: str) -> bool:
+    """section_es literal == sección, o section (EN) es uno de sus alias."""
+    return payload.get("section_es") == section or payload.get("section") in EN_SECTIONS.get(section, ())
+
+
+def _has_text(payload: Dict[str, Any]) -> bool:
+    return bool(payload.get("text_es") or payload.get("text"))
+
+
+def _chunk_index(payload: Dict[str, Any]) -> int:
+    # los ids son hashes de contenido: el scroll no sigue el orden de los chunks
+    idx = payload.get("chunk_index")
+    return idx if isinstance(idx, int) else 0
+
+
+def _first_chunk(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """El primer fragmento de la sección (menor chunk_index), preferentemente con texto."""
+    return min(payloads, key=lambda p: (0 if _has_text(p) else 1, _chunk_index(p)))
+
+
 class VademecumRetriever:
     """
     Estrategia metadata-first; incluye:
     - Vocabulario de nombres cacheado (para extracción por palabra exacta).
     - Búsqueda por nombre con filtros (sin vectores) y selección por sección.
     - Fallback semántico sólo si NO tenemos nombre.
+
+    Los métodos `a*` son la API async: Qdrant vía AsyncQdrantClient (con tope de
+    concurrencia) y el trabajo de CPU en un pool acotado, sin bloquear el event loop.
     """
 
     def __init__(self, url: str, coll: str, api_key: Optional[str] = None, top_k_default: int = 12):
         self.q = QdrantClient(url=url, api_key=api_key) if api_key else QdrantClient(url=url)
-        self.coll = coll
-        self.emb = SentenceTransformer(_EMB_MODEL_NAME)
-        self.top_k_default = top_k_default
+        self.aq = AsyncQdrantClient(url=url, api_key=api_key, timeout=QDRANT_TIMEOUT)
+        self._init_state(coll, top_k_default)
 
-        # vocab
-        self._vocab_ready = False
-        self._names_norm: List[str] = []
-        self._norm_to_display: Dict[str, str] = {}
+        # vocab desde el snapshot en disco (si existe): sin scroll completo al arrancar
+        vocab = vademecum_snapshot.read_vocab(coll)
+        if vocab:
+            self._build_vocab(vocab)
+            self.snapshot_at = (vademecum_snapshot.read_meta() or {}).get("created_at")
+            print(f"[Qdrant] vocab desde snapshot: {len(vocab)} nombres")
+
+        # índices (best effort) en segundo plano: son idempotentes y no deben frenar el arranque
+        threading.Thread(target=self._ensure_payload_indexes, name="qdrant-indexes", daemon=True).start()
 
-        # índices (best effort)
+    def _ensure_payload_indexes(self) -> None:
         try:
             def try_index(key: str, params: qm.PayloadIndexParams):
                 try:
@@ -125,14 +247,50 @@ class VademecumRetriever:
         except Exception as e:
             print(f"[Qdrant] No se pudieron crear índices opcionales: {e}")
 
+    @property
+    def emb(self):
+        return self.embedder.model
+
+    def _init_state(self, coll: str, top_k_default: int) -> None:
+        """Estado común a todos los backends (modelo, vocab, pool, métricas, cachés)."""
+        self.coll = coll
+        self.snapshot_at: Optional[float] = None  # epoch del snapshot cargado, si hay
+        # caché LRU/TTL + micro-batching; el modelo se carga en segundo plano
+        self.embedder = QueryEmbedder(loader=lambda: SentenceTransformer(_EMB_MODEL_NAME))
+        self.embedder.warmup()
+        self.top_k_default = top_k_default
+
+        # vocab
+        self._vocab_ready = False
+        self._names_norm: List[str] = []
+        self._norm_to_display: Dict[str, str] = {}
+        self._matcher = VocabMatcher([])
+        self._fuzzy = FuzzyNameIndex([])
+
+        # async: pool de CPU, semáforo de Qdrant (perezoso, ligado al loop) y métricas
+        self._pool = ThreadPoolExecutor(max_workers=RETRIEVER_WORKERS, thread_name_prefix="retriever")
+        self._qdrant_sem: Optional[asyncio.Semaphore] = None
+        self._vocab_lock: Optional[asyncio.Lock] = None
+        self.metrics = RetrieverMetrics()
+
+        # payloads por fármaco (clave canónica) indexados por sección
+        self.drug_cache = DrugDocCache(
+            key_fn=lambda p: _drug_key(p) or _norm(p.get("doc_id") or ""),
+            section_fn=_canon_section,
+        )
+
     # ---------- Vocabulario ----------
     def try_index(self, *args, **kwargs):
         pass  # backward-compat; ya manejado arriba
 
+    @staticmethod
+    def _collect_names(points, norm_to_display: Dict[str, str]) -> None:
+        collect_names((p.payload or {} for p in points), norm_to_display)
+
     def ensure_vocab(self):
         if self._vocab_ready:
             return
-        seen = set()
+        norm_to_display: Dict[str, str] = {}
         try:
             offset = None
             page = 256
@@ -143,23 +301,49 @@ class VademecumRetriever:
                     with_payload=True,
                     offset=offset,
                 )
-                for p in points:
-                    pl = p.payload or {}
-                    for k in ("name_es", "generic_name_es", "name", "generic_name"):
-                        v = pl.get(k)
-                        if isinstance(v, str) and v.strip():
-                            norm = _norm(v)
-                            if norm and norm not in seen:
-                                seen.add(norm)
-                                display = pl.get("name_es") or pl.get("generic_name_es") or pl.get("name") or pl.get("generic_name") or v
-                                self._norm_to_display[norm] = display
+                self._collect_names(points, norm_to_display)
                 if not next_page:
                     break
                 offset = next_page
         except Exception as e:
             print(f"[Qdrant] ensure_vocab error: {e}")
+        self._build_vocab(norm_to_display)
 
-        self._names_norm = sorted(seen, key=lambda s: len(s), reverse=True)
+    async def aensure_vocab(self):
+        if self._vocab_ready:
+            return
+        if self._vocab_lock is None:
+            self._vocab_lock = asyncio.Lock()
+        async with self._vocab_lock:
+            if self._vocab_ready:
+                return
+            norm_to_display: Dict[str, str] = {}
+            try:
+                offset = None
+                page = 256
+                while True:
+                    points, next_page = await self._qdrant(
+                        "scroll_vocab", self.aq.scroll,
+                        collection_name=self.coll,
+                        limit=page,
+                        with_payload=True,
+                        offset=offset,
+                    )
+                    self._collect_names(points, norm_to_display)
+                    if not next_page:
+                        break
+                    offset = next_page
+            except Exception as e:
+                print(f"[Qdrant] aensure_vocab error: {e}")
+            await self._cpu("build_vocab", self._build_vocab, norm_to_display)
+
+    def _build_vocab(self, norm_to_display: Dict[str, str]) -> None:
+        self._norm_to_display = norm_to_display
+        self._names_norm = sorted(self._norm_to_display, key=lambda s: len(s), reverse=True)
+        # autómata multi-patrón: extracción lineal en el largo del mensaje
+        self._matcher = VocabMatcher(self._names_norm)
+        # índice de trigramas para typos (en vez de comparar contra todo el vocab)
+        self._fuzzy = FuzzyNameIndex(self._names_norm)
         self._vocab_ready = True
 
     def extract_name_from_text(self, text: str, strict_only: bool = False) -> Optional[str]:
@@ -174,10 +358,10 @@ class VademecumRetriever:
         if not t:
             return None
 
-        # 1) match exacto por palabra completa
-        for cand in self._names_norm:
-            if re.search(rf"(^|[\s\W]){re.escape(cand)}($|[\s\W])", t):
-                return self._norm_to_display.get(cand, cand)
+        # 1) match exacto por palabra completa (el nombre más largo gana)
+        cand = self._matcher.find_longest(t)
+        if cand:
+            return self._norm_to_display.get(cand, cand)
 
         if strict_only:
             return None
@@ -186,39 +370,142 @@ class VademecumRetriever:
         if len(t) < 18:
             return None
 
-        best = None
-        best_score = 0
-        for cand in self._names_norm[:5000]:
-            sc = fuzz.token_set_ratio(t, cand)
-            if sc > best_score:
-                best_score = sc
-                best = cand
-        if best and best_score >= 92 and len(best) >= 6:
+        # todos los tokens de un nombre (>= 6 letras) presentes, en cualquier orden y con typos menores
+        best = self._fuzzy.best_name_covering(t, min_len=6)
+        if best:
             return self._norm_to_display.get(best, best)
         return None
 
+    def guess_name_loose(self, text: str) -> Optional[str]:
+        """
+        Nombre a partir de palabras sueltas con typos ("paracetmol", "aspir").
+        Devuelve el nombre para mostrar o None.
+        """
+        self.ensure_vocab()
+        words = [_norm(w) for w in re.findall(r"[a-zA-ZáéíóúñÁÉÍÓÚÑ]+", text or "")]
+        best = self._fuzzy.best_name_for_words(words)
+        if not best:
+            return None
+        return self._norm_to_display.get(best, best)
+
+    async def aextract_name_from_text(self, text: str, strict_only: bool = False) -> Optional[str]:
+        if not text:
+            return None
+        await self.aensure_vocab()
+        return await self._cpu("extract_name", self.extract_name_from_text, text, strict_only)
+
+    async def aguess_name_loose(self, text: str) -> Optional[str]:
+        await self.aensure_vocab()
+        return await self._cpu("guess_name", self.guess_name_loose, text)
+
+    # ---------- Infra async ----------
+    async def _qdrant(self, op: str, fn: Callable, *args, **kwargs):
+        """Llamada a AsyncQdrantClient con tope de concurrencia y métricas."""
+        if self._qdrant_sem is None:
+            self._qdrant_sem = asyncio.Semaphore(QDRANT_MAX_CONCURRENCY)
+        t_wait = time.perf_counter()
+        async with self._qdrant_sem:
+            t0 = time.perf_counter()
+            self.metrics.begin(op, t0 - t_wait)
+            ok = False
+            try:
+                out = await fn(*args, **kwargs)
+                ok = True
+                return out
+            finally:
+                self.metrics.end(op, time.perf_counter() - t0, ok)
+
+    async def _cpu(self, op: str, fn: Callable, *args):
+        """Trabajo bloqueante en el pool acotado del retriever."""
+        loop = asyncio.get_running_loop()
+        t_wait = time.perf_counter()
+        self.metrics.begin(op, 0.0)
+        ok = False
+        try:
+            out = await loop.run_in_executor(self._pool, functools.partial(fn, *args))
+            ok = True
+            return out
+        finally:
+            self.metrics.end(op, time.perf_counter() - t_wait, ok)
+
+    # ---------- Acceso a datos (lo que cambia entre backends) ----------
+    def _scroll(self, scroll_filter: qm.Filter, limit: int) -> List[Dict[str, Any]]:
+        points, _ = self.q.scroll(
+            collection_name=self.coll,
+            scroll_filter=scroll_filter,
+            limit=limit,
+            with_payload=True,
+        )
+        return [dict(p.payload or {}) for p in points]
+
+    def _vector_search(self, vec: np.ndarray, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        res = self.q.query_points(
+            collection_name=self.coll,
+            query=vec.tolist(),
+            limit=limit,
+            with_payload=True,
+        ).points
+        return [(dict(r.payload or {}), float(r.score or 0.0)) for r in res]
+
+    async def _avector_search(self, vec: np.ndarray, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        res = (await self._qdrant(
+            "query_points", self.aq.query_points,
+            collection_name=self.coll,
+            query=vec.tolist(),
+            limit=limit,
+            with_payload=True,
+        )).points
+        return [(dict(r.payload or {}), float(r.score or 0.0)) for r in res]
+
+    async def ascroll(self, scroll_filter: qm.Filter, limit: int = 256) -> List[Dict[str, Any]]:
+        """Payloads que cumplen `scroll_filter` (una página). Propaga errores de Qdrant."""
+        points, _ = await self._qdrant(
+            "scroll", self.aq.scroll,
+            collection_name=self.coll,
+            scroll_filter=scroll_filter,
+            limit=limit,
+            with_payload=True,
+        )
+        return [dict(p.payload or {}) for p in points]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "qdrant_max_concurrency": QDRANT_MAX_CONCURRENCY,
+            "workers": RETRIEVER_WORKERS,
+            "drug_cache": self.drug_cache.stats(),
+            **self.metrics.snapshot(),
+        }
+
+    def invalidate(self) -> None:
+        """Tras re-ingestar: vaciar el caché por fármaco y recargar el vocab en la próxima consulta."""
+        self.drug_cache.invalidate()
+        self._vocab_ready = False
+
+    async def _on_reingest(self) -> None:
+        """La ingesta publicó una versión nueva (drug_cache ya se vació): releer el vocab."""
+        self._vocab_ready = False
+
+    async def aclose(self) -> None:
+        try:
+            await self.aq.close()
+        except Exception as e:
+            print(f"[Qdrant] close error: {e}")
+        self._pool.shutdown(wait=False)
+
     # ---------- Búsqueda por metadata ----------
     def _scroll_by_name(self, name_hint: str, limit: int = 512) -> List[Dict[str, Any]]:
-        text = name_hint
-        filt = qm.Filter(should=[
-            qm.FieldCondition(key="name_es", match=qm.MatchText(text=text)),
-            qm.FieldCondition(key="generic_name_es", match=qm.MatchText(text=text)),
-            qm.FieldCondition(key="name", match=qm.MatchText(text=text)),
-            qm.FieldCondition(key="generic_name", match=qm.MatchText(text=text)),
-        ])
-        out: List[Dict[str, Any]] = []
         try:
-            points, _ = self.q.scroll(
-                collection_name=self.coll,
-                scroll_filter=filt,
-                limit=limit,
-                with_payload=True,
-            )
-            for p in points:
-                out.append(dict(p.payload or {}))
+            return self._scroll(_name_filter(name_hint), limit)
         except Exception as e:
             print(f"[Qdrant] scroll_by_name error: {e}")
-        return out
+            return []
+
+    async def _ascroll_by_name(self, name_hint: str, limit: int = 512) -> List[Dict[str, Any]]:
+        try:
+            return await self.ascroll(_name_filter(name_hint), limit=limit)
+        except Exception as e:
+            print(f"[Qdrant] scroll_by_name error: {e}")
+            return []
 
     def _pick_best_in_group(self, group: List[Dict[str, Any]], order: List[str]) -> Dict[str, Any]:
         """
@@ -227,15 +514,25 @@ class VademecumRetriever:
         """
         if not group:
             return {}
-        group_sorted = sorted(group, key=lambda p: (order.index(_canon_section(p)) if _canon_section(p) in order else 99))
-        group_sorted = sorted(group_sorted, key=lambda p: 0 if (p.get("text_es") or p.get("text")) else 1)
-        return group_sorted[0]
+        return min(group, key=lambda p: (
+            0 if (p.get("text_es") or p.get("text")) else 1,
+            order.index(_canon_section(p)) if _canon_section(p) in order else 99,
+            _chunk_index(p),
+        ))
 
     def best_metadata_first(self, name_hint: str, prefer: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         name_hint = (name_hint or "").strip()
         if len(name_hint) < 3:
             return None
-        candidates = self._scroll_by_name(name_hint)
+        return self._best_in_candidates(name_hint, self._scroll_by_name(name_hint), prefer)
+
+    async def abest_metadata_first(self, name_hint: str, prefer: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        name_hint = (name_hint or "").strip()
+        if len(name_hint) < 3:
+            return None
+        return self._best_in_candidates(name_hint, await self._ascroll_by_name(name_hint), prefer)
+
+    def _best_in_candidates(self, name_hint: str, candidates: List[Dict[str, Any]], prefer: Optional[List[str]]) -> Optional[Dict[str, Any]]:
         if not candidates:
             return None
 
@@ -262,12 +559,87 @@ class VademecumRetriever:
         if best_key is None:
             return None
 
-        order = (prefer or []) + ["indicaciones","efectos_secundarios","contraindicaciones","interacciones","advertencias","posologia","mecanismo"]
+        order = (prefer or []) + SECTION_ORDER
         return self._pick_best_in_group(groups[best_key], order)
 
+    # ---------- Nombre + secciones en una sola consulta ----------
+    def _resolve_sections(self, name_hint: str, payloads: List[Dict[str, Any]], sections: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Primera sección de `sections` con contenido para el fármaco:
+        1) payload con esa sección exacta (ES o alias EN), preferentemente con texto;
+        2) si no, el mejor grupo por nombre (como best_metadata_first) si trae esa sección.
+        """
+        for sec in sections:
+            exact = [p for p in payloads if _is_exact_section(p, sec) and _canon_section(p) == sec]
+            if exact:
+                return _first_chunk(exact), sec
+            m = self._best_in_candidates(name_hint, payloads, [sec])
+            if m and _canon_section(m) == sec:
+                return m, sec
+        return None, None
+
+    @staticmethod
+    def _resolve_in_group(group: DrugGroup, sections: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Como _resolve_sections, pero dentro de un solo fármaco ya indexado por sección."""
+        for sec in sections:
+            items = group.by_section.get(sec)
+            if not items:
+                continue
+            pool = [p for p in items if _is_exact_section(p, sec)] or items
+            return _first_chunk(pool), sec
+        return None, None
+
+    def lookup_sections(self, name_hint: str, sections: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        name_hint = (name_hint or "").strip()
+        if len(name_hint) < 3 or not sections:
+            return None, None
+        try:
+            payloads = self._scroll(_name_filter(name_hint, exact=True), NAME_LOOKUP_LIMIT)
+        except Exception as e:
+            print(f"[Qdrant] lookup_sections error: {e}")
+            return None, None
+        return self._resolve_sections(name_hint, payloads, sections)
+
+    async def alookup_sections(self, name_hint: str, sections: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        (payload, sección) para el fármaco y la primera sección disponible de `sections`
+        (en orden de prioridad), con UNA sola consulta a Qdrant: todas las secciones del
+        fármaco vienen en la misma página y la prioridad se resuelve en el cliente.
+        Si el fármaco está en drug_cache no hay round trip a Qdrant.
+        """
+        name_hint = (name_hint or "").strip()
+        if len(name_hint) < 3 or not sections:
+            return None, None
+        if await self.drug_cache.check_version():
+            await self._on_reingest()
+        key = _norm(name_hint)
+        group = self.drug_cache.get(key)
+        if group is not None:
+            return self._resolve_in_group(group, sections)
+        try:
+            payloads = await self.ascroll(_name_filter(name_hint, exact=True), limit=NAME_LOOKUP_LIMIT)
+        except Exception as e:
+            print(f"[Qdrant] lookup_sections error: {e}")
+            return None, None
+        groups = self.drug_cache.put_payloads(payloads, complete=len(payloads) < NAME_LOOKUP_LIMIT)
+        if key in groups:
+            return self._resolve_in_group(groups[key], sections)
+        return self._resolve_sections(name_hint, payloads, sections)
+
     # ---------- Semántico (agrupado por fármaco) ----------
     def _embed(self, texts: List[str]) -> np.ndarray:
-        return self.emb.encode(texts, normalize_embeddings=True)
+        return self.embedder.embed(texts)
+
+    async def _aembed(self, texts: List[str]) -> np.ndarray:
+        t0 = time.perf_counter()
+        self.metrics.begin("embed", 0.0)
+        ok = False
+        try:
+            out = await self.embedder.aembed(texts, self._pool)
+            ok = True
+            return out
+        finally:
+            self.metrics.end("embed", time.perf_counter() - t0, ok)
 
     def _search_semantic(self, query: str, k: int) -> List[Dict[str, Any]]:
         # Busca k candidatos y agrupa por fármaco (doc_id/nombre canónico).
@@ -276,20 +648,27 @@ class VademecumRetriever:
             return []
         emb = self._embed([query])[0]
         try:
-            res = self.q.search(
-                collection_name=self.coll,
-                query_vector=emb,
-                limit=max(8, k),
-                with_payload=True,
-                score_threshold=None,
-            )
+            hits = self._vector_search(emb, max(8, k))
         except Exception:
             return []
+        return self._group_semantic(query, hits)
+
+    async def _asearch_semantic(self, query: str, k: int) -> List[Dict[str, Any]]:
+        if not query:
+            return []
+        try:
+            emb = (await self._aembed([query]))[0]
+            hits = await self._avector_search(emb, max(8, k))
+        except Exception as e:
+            print(f"[Qdrant] search_semantic error: {e}")
+            return []
+        return self._group_semantic(query, hits)
 
+    def _group_semantic(self, query: str, hits: List[Tuple[Dict[str, Any], float]]) -> List[Dict[str, Any]]:
         payloads: List[Dict[str, Any]] = []
-        for r in res:
-            payload = dict(r.payload or {})
-            payload["_score"] = float(r.score or 0.0)
+        for payload, score in hits:
+            payload = dict(payload)
+            payload["_score"] = score
             payloads.append(payload)
 
         if not payloads:
@@ -315,7 +694,7 @@ class VademecumRetriever:
 
         # Ordenar dentro del grupo por intención inferida
         intent = detect_section(query)
-        preferred_order = ["indicaciones","efectos_secundarios","contraindicaciones","interacciones","advertencias","posologia","mecanismo"]
+        preferred_order = SECTION_ORDER
         def section_rank(p: Dict[str, Any]) -> int:
             sec = _canon_section(p)
             if sec == intent:
@@ -329,26 +708,53 @@ class VademecumRetriever:
 
     def best_for(self, query: str, prefer: Optional[List[str]] = None, name_hint: Optional[str] = None, k: int = 12) -> Optional[Dict[str, Any]]:
         if name_hint:
-            m = self.best_metadata_first(name_hint=name_hint, prefer=prefer)
-            if m:
-                return m
             # si hay name_hint pero no hay resultados, NO degrades a semántico (evita mezclar fármacos)
-            return None
+            return self.best_metadata_first(name_hint=name_hint, prefer=prefer)
+        if query:
+            return self._prefer_section(self._search_semantic(query, k=max(12, k)), prefer)
+        return None
+
+    async def abest(self, query: str, k: int = 12) -> Optional[Dict[str, Any]]:
+        return await self.abest_for(query, prefer=None, name_hint=None, k=k)
+
+    async def abest_for(self, query: str, prefer: Optional[List[str]] = None, name_hint: Optional[str] = None, k: int = 12) -> Optional[Dict[str, Any]]:
+        if name_hint:
+            return await self.abest_metadata_first(name_hint=name_hint, prefer=prefer)
         if query:
-            cand = self._search_semantic(query, k=max(12, k))
-            if not cand:
-                return None
-            prefer_set = set(prefer or [])
-            for p in cand:
-                if _canon_section(p) in prefer_set:
-                    return p
-            return cand[0]
+            return self._prefer_section(await self._asearch_semantic(query, k=max(12, k)), prefer)
         return None
 
+    @staticmethod
+    def _prefer_section(cand: List[Dict[str, Any]], prefer: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        if not cand:
+            return None
+        prefer_set = set(prefer or [])
+        for p in cand:
+            if _canon_section(p) in prefer_set:
+                return p
+        return cand[0]
+
     def intent_from_query(self, query: str) -> str:
         return detect_section(query)
 
 
-retriever_singleton = VademecumRetriever(
-    url=QDRANT_URL, coll=QDRANT_COLLECTION, api_key=QDRANT_API_KEY
-)
+def build_retriever() -> VademecumRetriever:
+    """VADEMECUM_BACKEND=qdrant (por defecto) | memory (matriz NumPy en RAM, sin Qdrant)."""
+    if VADEMECUM_BACKEND == "memory":
+        from app.services.memory_retriever import build_memory_retriever
+        return build_memory_retriever(QDRANT_COLLECTION, url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    return VademecumRetriever(url=QDRANT_URL, coll=QDRANT_COLLECTION, api_key=QDRANT_API_KEY)
+
+
+_SINGLETON: Optional[VademecumRetriever] = None
+
+
+def __getattr__(name: str):
+    # `retriever_singleton` se construye al primer import que lo pide (no al importar
+    # este módulo): así memory_retriever puede importar la clase base sin ciclo.
+    global _SINGLETON
+    if name == "retriever_singleton":
+        if _SINGLETON is None:
+            _SINGLETON = build_retriever()
+        return _SINGLETON
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
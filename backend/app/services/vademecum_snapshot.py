@@ -0,0 +1,219 @@
+# backend/app/services/vademecum_snapshot.py
+"""
+Snapshot binario de la colección del vademécum, pensado para mmap.
+
+Un directorio VADEMECUM_SNAPSHOT_DIR con:
+  meta.json      -> versión, colección, n, dim, modelo, fecha
+  vectors.f32    -> matriz float32 (n, dim) normalizada, row-major (np.memmap)
+  payloads.bin   -> payloads JSON concatenados
+  payloads.idx   -> offsets uint64 (n + 1): el payload i es bin[idx[i]:idx[i+1]]
+  index.json     -> índices invertidos de PayloadIndex (valor/token -> ids)
+  vocab.json     -> nombre normalizado -> nombre para mostrar
+
+Los workers mapean los mismos archivos: el page cache los comparte entre procesos
+y el arranque no depende del tamaño de la colección.
+Escritura atómica: cada snapshot es un directorio versionado ({dir}.v{ns}-{pid})
+y VADEMECUM_SNAPSHOT_DIR es un symlink a la versión vigente, que se cambia con
+os.replace sobre el link: siempre hay un snapshot completo en la ruta. Se conserva
+la versión anterior (puede estar abriéndola otro worker); las más viejas se borran.
+"""
+import os
+import json
+import mmap
+import time
+import shutil
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+SNAPSHOT_DIR = os.getenv("VADEMECUM_SNAPSHOT_DIR", ".vademecum_snapshot")
+SNAPSHOT_VERSION = 1
+
+
+class MmapPayloads(Sequence):
+    """Secuencia de payloads decodificados bajo demanda desde payloads.bin (mmap)."""
+
+    def __init__(self, data_path: str, idx_path: str):
+        self.offsets = np.memmap(idx_path, dtype=np.uint64, mode="r")
+        self._f = open(data_path, "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return max(0, len(self.offsets) - 1)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self._mm[a:b].decode("utf-8"))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class VademecumSnapshot:
+    __slots__ = ("path", "meta", "vectors", "payloads", "index", "vocab")
+
+    def __init__(self, path: str, meta: Dict[str, Any], vectors: np.ndarray, payloads: MmapPayloads,
+                 index: Dict[str, Any], vocab: Dict[str, str]):
+        self.path = path
+        self.meta = meta
+        self.vectors = vectors
+        self.payloads = payloads
+        self.index = index
+        self.vocab = vocab
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.size == 0:
+        return vectors.reshape(vectors.shape[0], -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _version_stamp(name: str, base: str) -> Optional[int]:
+    """ns de una versión "{base}.v{ns}-{pid}" (None si el nombre no es una versión terminada)."""
+    if not name.startswith(base + ".v") or name.endswith(".tmp"):
+        return None
+    try:
+        return int(name[len(base) + 2:].split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _publish(path: str, target: str) -> None:
+    """Apunta `path` a `target` (hermano de `path`) con un os.replace atómico sobre el symlink."""
+    pid = os.getpid()
+    if os.path.isdir(path) and not os.path.islink(path):
+        # layout anterior (directorio real): se mueve a una versión para poder reemplazarlo por el link
+        os.replace(path, f"{path}.v0-{pid}")
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    link = f"{path}.{pid}.lnk"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(target), link)
+    os.replace(link, path)
+    _prune(path, target, previous)
+
+
+def _prune(path: str, current: str, previous: Optional[str]) -> None:
+    """Borra las versiones anteriores a `current`, salvo `previous` (quizá la está abriendo otro worker)."""
+    parent, base = os.path.split(os.path.abspath(path))
+    newest = _version_stamp(os.path.basename(current), base) or 0
+    keep = {os.path.realpath(current), previous}
+    for name in os.listdir(parent):
+        stamp = _version_stamp(name, base)
+        full = os.path.join(parent, name)
+        if stamp is None or stamp >= newest or os.path.realpath(full) in keep:
+            continue
+        shutil.rmtree(full, ignore_errors=True)
+
+
+def write_snapshot(payloads: List[Dict[str, Any]], vectors: np.ndarray, collection: str,
+                   index: Dict[str, Any], vocab: Dict[str, str], model: str = "",
+                   path: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Escribe el snapshot completo; devuelve la ruta o None si falla."""
+    path = path.rstrip("/") or path
+    target = f"{path}.v{time.time_ns()}-{os.getpid()}"
+    tmp = f"{target}.tmp"
+    try:
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        vecs = _normalized(vectors)
+        vecs.tofile(os.path.join(tmp, "vectors.f32"))
+
+        offsets = np.zeros(len(payloads) + 1, dtype=np.uint64)
+        with open(os.path.join(tmp, "payloads.bin"), "wb") as f:
+            pos = 0
+            for i, p in enumerate(payloads):
+                blob = json.dumps(p, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                f.write(blob)
+                pos += len(blob)
+                offsets[i + 1] = pos
+        offsets.tofile(os.path.join(tmp, "payloads.idx"))
+
+        with open(os.path.join(tmp, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(tmp, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False, separators=(",", ":"))
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "collection": collection,
+            "count": len(payloads),
+            "dim": int(vecs.shape[1]) if vecs.ndim == 2 and len(payloads) else 0,
+            "model": model,
+            "created_at": time.time(),
+        }
+        # meta.json al final: un directorio sin meta no se considera válido
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        # los workers que ya mapearon la versión anterior siguen leyendo sus inodos
+        os.replace(tmp, target)
+        _publish(path, target)
+        return path
+    except Exception as e:
+        print(f"[SNAPSHOT] no se pudo escribir {path}: {type(e).__name__}: {e}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not (os.path.islink(path) and os.path.realpath(path) == os.path.realpath(target)):
+            shutil.rmtree(target, ignore_errors=True)
+        return None
+
+
+def read_meta(path: str = SNAPSHOT_DIR) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[SNAPSHOT] meta inválida en {path}: {type(e).__name__}: {e}")
+        return None
+    if not isinstance(meta, dict) or meta.get("version") != SNAPSHOT_VERSION:
+        return None
+    return meta
+
+
+def read_vocab(collection: str, path: str = SNAPSHOT_DIR) -> Optional[Dict[str, str]]:
+    """Sólo el vocab (para el backend Qdrant): evita el scroll completo de ensure_vocab."""
+    path = os.path.realpath(path)  # meta y vocab de la misma versión aunque cambie el link
+    meta = read_meta(path)
+    if not meta or meta.get("collection") != collection:
+        return None
+    try:
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[SNAPSHOT] no se pudo leer vocab de {path}: {type(e).__name__}: {e}")
+        return None
+
+
+def open_snapshot(collection: str, path: str = SNAPSHOT_DIR) -> Optional[VademecumSnapshot]:
+    """Mapea el snapshot; None si no existe, es de otra versión/colección o está incompleto."""
+    path = os.path.realpath(path)  # todos los archivos de la misma versión aunque cambie el link
+    meta = read_meta(path)
+    if not meta or meta.get("collection") != collection:
+        return None
+    try:
+        n, dim = int(meta["count"]), int(meta["dim"])
+        if n and dim:
+            vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(n, dim))
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        payloads = MmapPayloads(os.path.join(path, "payloads.bin"), os.path.join(path, "payloads.idx"))
+        if len(payloads) != n:
+            raise ValueError(f"payloads.idx tiene {len(payloads)} entradas, meta dice {n}")
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+    except Exception as e:
+        print(f"[SNAPSHOT] no se pudo abrir {path}: {type(e).__name__}: {e}")
+        return None
+    return VademecumSnapshot(path, meta, vectors, payloads, index, vocab)
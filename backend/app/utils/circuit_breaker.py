@@ -0,0 +1,73 @@
+# app/utils/circuit_breaker.py
+import time
+import threading
+from typing import Any, Dict
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a una dependencia caída.
+
+    - closed: todo pasa; `failures` fallas seguidas lo abren.
+    - open: allow() devuelve False durante el backoff (sin tocar la red).
+    - half-open: pasado el backoff deja pasar una sola prueba; si falla se
+      vuelve a abrir con el doble de backoff (hasta max_backoff), si anda se cierra.
+    """
+
+    def __init__(self, name: str, failures: int = 3, backoff: float = 5.0, max_backoff: float = 60.0):
+        self.name = name
+        self.threshold = max(1, int(failures))
+        self.base_backoff = max(0.0, float(backoff))
+        self.max_backoff = max(self.base_backoff, float(max_backoff))
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._backoff = self.base_backoff
+        self._open_until = 0.0
+        self.state = "closed"
+        # métricas
+        self.opened = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if now >= self._open_until:
+                # una prueba; si se cuelga (o se cancela), otra al vencer el siguiente backoff
+                self.state = "half-open"
+                self._open_until = now + self._backoff
+                return True
+            self.short_circuited += 1
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print(f"[Breaker] {self.name}: recuperado")
+            self.state = "closed"
+            self._failures = 0
+            self._backoff = self.base_backoff
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "open":
+                return
+            if self.state == "half-open":
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            elif self._failures < self.threshold:
+                return
+            self.state = "open"
+            self._open_until = time.monotonic() + self._backoff
+            self.opened += 1
+            print(f"[Breaker] {self.name}: abierto por {self._backoff:g} s tras {self._failures} fallas")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "backoff": self._backoff,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
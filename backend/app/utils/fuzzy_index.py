@@ -0,0 +1,198 @@
+# app/utils/fuzzy_index.py
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN = re.compile(r"\w+")
+
+
+def max_edits(word: str) -> int:
+    """Presupuesto de edición según largo: palabras cortas no admiten typos."""
+    n = len(word)
+    if n < 4:
+        return 0
+    if n <= 6:
+        return 1
+    return 2
+
+
+def _grams(s: str) -> Set[str]:
+    p = f"^{s}$"
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def _inner_grams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def levenshtein_within(a: str, b: str, k: int) -> Optional[int]:
+    """Distancia de edición si es <= k; None si la supera (corta temprano)."""
+    la, lb = len(a), len(b)
+    if abs(la - lb) > k:
+        return None
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    prev = list(range(lb + 1))
+    for i in range(1, la + 1):
+        cur = [i] + [0] * lb
+        ca = a[i - 1]
+        row_min = i
+        for j in range(1, lb + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > k:
+            return None
+        prev = cur
+    return prev[lb] if prev[lb] <= k else None
+
+
+class FuzzyNameIndex:
+    """
+    Índice tolerante a typos sobre nombres ya normalizados.
+
+    - Los tokens distintos del vocab van a un índice invertido de trigramas.
+    - Una consulta cuenta trigramas compartidos, poda con la cota
+      |G(a) ∩ G(b)| >= max(|G(a)|, |G(b)|) - 3k y verifica con Levenshtein acotado.
+    - Cada token apunta a los nombres que lo contienen.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = []
+        self.tokens: List[str] = []
+        self._token_id: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._ngrams: List[int] = []          # |G(token)|
+        self._ninner: List[int] = []          # |trigramas internos(token)|
+        self._token_names: List[List[int]] = []
+        self._name_tokens: List[Tuple[int, ...]] = []
+
+        for name in names:
+            if not name:
+                continue
+            nid = len(self.names)
+            self.names.append(name)
+            tids = []
+            for tok in _TOKEN.findall(name):
+                tid = self._token_id.get(tok)
+                if tid is None:
+                    tid = self._add_token(tok)
+                tids.append(tid)
+                if not self._token_names[tid] or self._token_names[tid][-1] != nid:
+                    self._token_names[tid].append(nid)
+            self._name_tokens.append(tuple(dict.fromkeys(tids)))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _add_token(self, tok: str) -> int:
+        tid = len(self.tokens)
+        self.tokens.append(tok)
+        self._token_id[tok] = tid
+        g = _grams(tok)
+        for gram in g:
+            self._postings.setdefault(gram, []).append(tid)
+        self._ngrams.append(len(g))
+        self._ninner.append(len(_inner_grams(tok)))
+        self._token_names.append([])
+        return tid
+
+    def _shared_counts(self, word: str) -> Tuple[Dict[int, int], Set[str]]:
+        g = _grams(word)
+        counts: Dict[int, int] = {}
+        for gram in g:
+            for tid in self._postings.get(gram, ()):
+                counts[tid] = counts.get(tid, 0) + 1
+        return counts, g
+
+    def match_token(self, word: str, k: Optional[int] = None) -> List[Tuple[int, int]]:
+        """[(distancia, token_id)] de tokens del vocab a <= k ediciones de `word`, mejor primero."""
+        k = max_edits(word) if k is None else k
+        tid = self._token_id.get(word)
+        if k == 0:
+            return [(0, tid)] if tid is not None else []
+        counts, g = self._shared_counts(word)
+        out: List[Tuple[int, int]] = []
+        for cand, shared in counts.items():
+            if shared < max(len(g), self._ngrams[cand]) - 3 * k:
+                continue
+            d = levenshtein_within(word, self.tokens[cand], k)
+            if d is not None:
+                out.append((d, cand))
+        out.sort(key=lambda t: (t[0], abs(len(self.tokens[t[1]]) - len(word))))
+        return out
+
+    def _substring_tokens(self, word: str) -> List[int]:
+        """Tokens que contienen a `word` o están contenidos en él (ambos de largo >= 5)."""
+        counts, _ = self._shared_counts(word)
+        inner = len(_inner_grams(word))
+        out = []
+        for cand, shared in counts.items():
+            tok = self.tokens[cand]
+            if len(tok) < 5:
+                continue
+            # los trigramas internos del más corto deben estar todos en el más largo
+            if (shared >= inner and word in tok) or (shared >= self._ninner[cand] and tok in word):
+                out.append(cand)
+        out.sort(key=lambda t: abs(len(self.tokens[t]) - len(word)))
+        return out
+
+    def _name_for_token(self, tid: int) -> str:
+        # preferir el nombre más corto que contiene el token (idealmente el token solo)
+        nids = self._token_names[tid]
+        return self.names[min(nids, key=lambda n: (len(self._name_tokens[n]), len(self.names[n])))]
+
+    def best_name_for_words(self, words: List[str]) -> Optional[str]:
+        """
+        Nombre para palabras sueltas del usuario (largo >= 5):
+        1) token exacto;
+        2) el token más cercano dentro del presupuesto de edición ("paracetmol");
+        3) si no, la palabra es parte de un token o lo contiene ("aspir", "paracetamolito").
+        """
+        words = [w for w in words if len(w) >= 5]
+        for w in words:
+            if w in self._token_id:
+                return self._name_for_token(self._token_id[w])
+        best: Optional[Tuple[float, int]] = None
+        for w in words:
+            hits = self.match_token(w)
+            if not hits:
+                continue
+            d, tid = hits[0]
+            score = d / max(len(w), len(self.tokens[tid]))
+            if best is None or score < best[0]:
+                best = (score, tid)
+        if best:
+            return self._name_for_token(best[1])
+        for w in words:
+            subs = self._substring_tokens(w)
+            if subs:
+                return self._name_for_token(subs[0])
+        return None
+
+    def best_name_covering(self, text: str, min_len: int = 6) -> Optional[str]:
+        """
+        El nombre más largo (>= min_len) cuyos tokens aparecen TODOS en `text`,
+        en cualquier orden y admitiendo typos por token.
+        """
+        matched: Set[int] = set()
+        for w in set(_TOKEN.findall(text)):
+            for _, tid in self.match_token(w):
+                matched.add(tid)
+        if not matched:
+            return None
+        best: Optional[str] = None
+        seen: Set[int] = set()
+        for tid in matched:
+            for nid in self._token_names[tid]:
+                if nid in seen:
+                    continue
+                seen.add(nid)
+                name = self.names[nid]
+                if len(name) < min_len:
+                    continue
+                if all(t in matched for t in self._name_tokens[nid]):
+                    if best is None or len(name) > len(best):
+                        best = name
+        return best
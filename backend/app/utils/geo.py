@@ -1,10 +1,13 @@
 # backend/app/utils/geo.py
 
+import math
 from typing import Any, Dict, Iterable, List, Optional, Tuple
-from haversine import haversine
+
+import numpy as np
 
 LAT_RANGE = (-90.0, 90.0)
 LON_RANGE = (-180.0, 180.0)
+EARTH_RADIUS_KM = 6371.0088  # radio medio (mismo valor que el paquete `haversine`)
 
 
 def _to_float(v: Any) -> Optional[float]:
@@ -47,14 +50,14 @@ def normalize_coords(
 def extract_coords(item: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
     """
     Intenta distintos nombres comunes del MINSAL / datasets:
-      - lat / long
+      - lat / long / lng / lon
       - latitude / longitude
       - latitud / longitud
       - local_lat / local_lng / local_longitud
     Retorna (lat, lon) normalizados o (None, None).
     """
     lat_keys = ["lat", "latitude", "latitud", "local_lat", "local_latitud"]
-    lon_keys = ["long", "lng", "longitude", "longitud", "local_lng", "local_longitud"]
+    lon_keys = ["long", "lng", "lon", "longitude", "longitud", "local_lng", "local_longitud"]
 
     lat = None
     lon = None
@@ -73,7 +76,79 @@ def extract_coords(item: Dict[str, Any]) -> Tuple[Optional[float], Optional[floa
 
 def geodesic_distance_km(a_lat: float, a_lon: float, b_lat: float, b_lon: float) -> float:
     """Distancia geodésica en km (haversine)."""
-    return float(haversine((a_lat, a_lon), (b_lat, b_lon)))
+    p1 = math.radians(a_lat)
+    p2 = math.radians(b_lat)
+    dphi = p2 - p1
+    dlmb = math.radians(b_lon - a_lon)
+    a = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# ---------- Motor vectorizado (NumPy) ----------
+def haversine_km_np(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Distancias (km) desde (lat, lon) a todos los puntos en una sola pasada.
+    `lats`/`lons` son arreglos float64 en grados.
+    """
+    p1 = math.radians(lat)
+    p2 = np.radians(lats)
+    dphi = p2 - p1
+    dlmb = np.radians(lons) - math.radians(lon)
+    a = np.sin(dphi * 0.5) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dlmb * 0.5) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def top_k(dists: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Índices de las k menores distancias, ordenados ascendente.
+    argpartition deja la selección en O(n); sólo se ordenan los k elegidos.
+    """
+    n = dists.shape[0]
+    if k is None or k <= 0 or k >= n:
+        return np.argsort(dists, kind="stable")
+    part = np.argpartition(dists, k - 1)[:k]
+    return part[np.argsort(dists[part], kind="stable")]
+
+
+def coords_arrays(items: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray]:
+    """
+    Extrae coordenadas válidas a arreglos contiguos float64.
+    Devuelve (items_con_coords, lats, lons) alineados por posición.
+    """
+    kept: List[Dict[str, Any]] = []
+    lats: List[float] = []
+    lons: List[float] = []
+    for it in items:
+        lat, lon = extract_coords(it)
+        if lat is None or lon is None:
+            continue
+        kept.append(it)
+        lats.append(lat)
+        lons.append(lon)
+    return kept, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+
+
+def rank_by_distance(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    user_lat: float,
+    user_lon: float,
+    *,
+    limit: Optional[int] = None,
+    radius_km: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (idx, dist_km) de los puntos más cercanos, ordenados ascendente.
+    Aplica radius_km (filtro) y limit (top-k) igual que attach_distance.
+    """
+    d = haversine_km_np(user_lat, user_lon, lats, lons)
+    idx = np.arange(d.shape[0])
+    if radius_km is not None:
+        mask = d <= radius_km
+        idx = idx[mask]
+        d = d[mask]
+    order = top_k(d, limit)
+    return idx[order], d[order]
 
 
 def attach_distance(
@@ -92,24 +167,20 @@ def attach_distance(
     - Si limit se entrega, corta la lista.
 
     Devuelve una NUEVA lista (no modifica los items originales).
+    Calcula todas las distancias en una pasada vectorizada; para feeds grandes
+    y consultas repetidas usar app.utils.geo_index (mismo formato de salida).
     """
+    kept, lats, lons = coords_arrays(items)
+    if not kept:
+        return []
+    idx, dist = rank_by_distance(lats, lons, user_lat, user_lon, limit=limit, radius_km=radius_km)
     out: List[Dict[str, Any]] = []
-    for it in items:
-        lat, lon = extract_coords(it)
-        if lat is None or lon is None:
-            continue
-        d = geodesic_distance_km(user_lat, user_lon, lat, lon)
-        if radius_km is not None and d > radius_km:
-            continue
-        rec = dict(it)
-        rec["lat"] = lat
-        rec["long"] = lon
+    for i, d in zip(idx.tolist(), dist.tolist()):
+        rec = dict(kept[i])
+        rec["lat"] = float(lats[i])
+        rec["long"] = float(lons[i])
         rec[distance_key] = round(d, 3)
         out.append(rec)
-
-    out.sort(key=lambda r: r[distance_key])
-    if limit is not None and limit > 0:
-        out = out[:limit]
     return out
 
 
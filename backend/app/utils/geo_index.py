@@ -0,0 +1,163 @@
+# backend/app/utils/geo_index.py
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.geo import EARTH_RADIUS_KM, coords_arrays, haversine_km_np, top_k
+
+CELL_DEG = 0.05  # ~5.5 km en latitud
+_START_RADIUS_KM = 2.0
+_MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM
+
+
+def _bbox(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Bounding box (lat_min, lat_max, lon_min, lon_max) que contiene el círculo
+    de radio `radius_km`. Si toca un polo se cubren todas las longitudes.
+    """
+    ang = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(ang)
+    lat_min, lat_max = lat - dlat, lat + dlat
+    if lat_min <= -90.0 or lat_max >= 90.0 or ang >= math.pi / 2:
+        return max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0
+    s = math.sin(ang) / math.cos(math.radians(lat))
+    if s >= 1.0:
+        return lat_min, lat_max, -180.0, 180.0
+    dlon = math.degrees(math.asin(s))
+    return lat_min, lat_max, lon - dlon, lon + dlon
+
+
+class GeoGridIndex:
+    """
+    Índice espacial en grilla lat/lon (celdas de CELL_DEG grados).
+    - Trabaja sobre arreglos float64 contiguos (`lat`, `lon`); distancias vectorizadas.
+    - `ids` permite indexar sólo un subconjunto; query() devuelve posiciones en los arreglos.
+    - query()/nearest(): k más cercanos y/o dentro de un radio, visitando sólo celdas cercanas.
+    """
+
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        ids: Optional[np.ndarray] = None,
+        cell_deg: float = CELL_DEG,
+    ):
+        self.cell_deg = cell_deg
+        self.lat = lat
+        self.lon = lon
+        self.ids = np.arange(lat.shape[0]) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.items: List[Dict[str, Any]] = []
+        self._cells: Dict[Tuple[int, int], np.ndarray] = {}
+        if not self.ids.shape[0]:
+            return
+        ci = np.floor(lat[self.ids] / cell_deg).astype(np.int64)
+        cj = np.floor(lon[self.ids] / cell_deg).astype(np.int64)
+        # agrupar por celda con un solo sort
+        order = np.lexsort((cj, ci))
+        ci_s, cj_s = ci[order], cj[order]
+        breaks = np.flatnonzero((np.diff(ci_s) != 0) | (np.diff(cj_s) != 0)) + 1
+        for chunk in np.split(order, breaks):
+            self._cells[(int(ci[chunk[0]]), int(cj[chunk[0]]))] = self.ids[chunk]
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]], cell_deg: float = CELL_DEG) -> "GeoGridIndex":
+        """Índice sobre dicts crudos (descarta los que no tienen coordenadas válidas)."""
+        kept, lat, lon = coords_arrays(items)
+        idx = cls(lat, lon, cell_deg=cell_deg)
+        idx.items = kept
+        return idx
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def coord(self, i: int) -> Tuple[float, float]:
+        return float(self.lat[i]), float(self.lon[i])
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        lat_min, lat_max, lon_min, lon_max = _bbox(lat, lon, radius_km)
+        i0, j0 = self._cell(lat_min, lon_min)
+        i1, j1 = self._cell(lat_max, lon_max)
+        parts: List[np.ndarray] = []
+        # Si el rango de celdas supera las celdas ocupadas, recorrer las ocupadas
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            for (ci, cj), idxs in self._cells.items():
+                if i0 <= ci <= i1 and j0 <= cj <= j1:
+                    parts.append(idxs)
+        else:
+            for ci in range(i0, i1 + 1):
+                for cj in range(j0, j1 + 1):
+                    idxs = self._cells.get((ci, cj))
+                    if idxs is not None:
+                        parts.append(idxs)
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def _within(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        if radius_km >= _MAX_RADIUS_KM:
+            cand = self.ids
+        else:
+            cand = self._candidates(lat, lon, radius_km)
+        d = haversine_km_np(lat, lon, self.lat[cand], self.lon[cand])
+        mask = d <= radius_km
+        return cand[mask], d[mask]
+
+    def query(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve (idx, dist_km) ordenados por distancia.
+        - radius_km: sólo puntos dentro del radio.
+        - limit: top-N más cercanos (exacto; el radio de búsqueda crece hasta cubrirlos).
+        """
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if radius_km is not None:
+            idx, d = self._within(lat, lon, radius_km)
+        elif limit is None or limit <= 0:
+            idx, d = self._within(lat, lon, _MAX_RADIUS_KM)
+        else:
+            # Se dobla el radio hasta tener `limit` puntos dentro del círculo:
+            # todo lo que queda fuera está más lejos que ellos.
+            r = _START_RADIUS_KM
+            while True:
+                idx, d = self._within(lat, lon, r)
+                if idx.shape[0] >= limit or r >= _MAX_RADIUS_KM:
+                    break
+                r *= 2
+        order = top_k(d, limit)
+        return idx[order], d[order]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        distance_key: str = "dist_km",
+        limit: Optional[int] = None,
+        radius_km: Optional[float] = None,
+        ndigits: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """
+        Misma salida que geo.attach_distance: NUEVA lista de dicts con lat/long
+        normalizados y la distancia en `distance_key`, ordenada ascendente.
+        Requiere un índice construido con from_items().
+        """
+        idx, dist = self.query(lat, lon, limit=limit, radius_km=radius_km)
+        out: List[Dict[str, Any]] = []
+        for i, d in zip(idx.tolist(), dist.tolist()):
+            rec = dict(self.items[i])
+            rec["lat"], rec["long"] = self.coord(i)
+            rec[distance_key] = round(d, ndigits)
+            out.append(rec)
+        return out
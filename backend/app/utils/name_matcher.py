@@ -0,0 +1,94 @@
+# app/utils/name_matcher.py
+import re
+from typing import Dict, Iterable, List, Optional
+
+_WORD = re.compile(r"\w")
+
+
+def _is_word(ch: str) -> bool:
+    return _WORD.match(ch) is not None
+
+
+class VocabMatcher:
+    """
+    Autómata Aho-Corasick sobre un vocabulario de nombres ya normalizados.
+
+    find_longest(text) equivale a recorrer el vocab de mayor a menor largo con
+    re.search(rf"(^|[\\s\\W]){re.escape(cand)}($|[\\s\\W])", text), pero en una
+    sola pasada lineal sobre el texto (más las coincidencias encontradas).
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._term: List[int] = [-1]  # índice en self.names del patrón que termina aquí
+        self._dict: List[int] = [0]   # nodo terminal más cercano por enlaces de falla
+        self.names: List[str] = []
+
+        for name in names:
+            if not name:
+                continue
+            node = 0
+            for ch in name:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._term.append(-1)
+                    self._dict.append(0)
+                    self._goto[node][ch] = nxt
+                node = nxt
+            if self._term[node] < 0:
+                self._term[node] = len(self.names)
+                self.names.append(name)
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _build_links(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fc = self._goto[f].get(ch, 0)
+                self._fail[child] = fc if fc != child else 0
+                fchild = self._fail[child]
+                self._dict[child] = fchild if self._term[fchild] >= 0 else self._dict[fchild]
+                queue.append(child)
+
+    def find_all(self, text: str) -> List[str]:
+        """Todos los nombres que aparecen como palabra completa (en orden de término)."""
+        out: List[str] = []
+        goto, fail, term, dlink = self._goto, self._fail, self._term, self._dict
+        n = len(text)
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            k = node if term[node] >= 0 else dlink[node]
+            if not k:
+                continue
+            after_ok = i + 1 == n or not _is_word(text[i + 1])
+            while k:
+                name = self.names[term[k]]
+                start = i - len(name) + 1
+                if (start == 0 or not _is_word(text[start - 1])) and after_ok:
+                    out.append(name)
+                k = dlink[k]
+        return out
+
+    def find_longest(self, text: str) -> Optional[str]:
+        """El nombre más largo que aparece como palabra completa, o None."""
+        best: Optional[str] = None
+        for name in self.find_all(text):
+            if best is None or len(name) > len(best):
+                best = name
+        return best
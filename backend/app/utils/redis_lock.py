@@ -0,0 +1,22 @@
+# app/utils/redis_lock.py
+import uuid
+from typing import Optional
+
+# Libera el lock sólo si sigue siendo nuestro
+RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def acquire(redis_client, key: str, ms: int) -> Optional[str]:
+    """Lock distribuido (SET NX PX) sobre un cliente redis.asyncio: token si se obtuvo, None si lo tiene otro."""
+    token = uuid.uuid4().hex
+    ok = await redis_client.set(key, token, nx=True, px=ms)
+    return token if ok else None
+
+
+async def release(redis_client, key: str, token: str) -> None:
+    await redis_client.eval(RELEASE_LUA, 1, key, token)
@@ -0,0 +1,98 @@
+# app/utils/ttl_cache.py
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    LRU acotado por número de entradas, con expiración por TTL.
+
+    - get() renueva la posición LRU (no el TTL).
+    - Thread-safe: se usa desde el event loop y desde el pool de threads.
+    - ttl <= 0 desactiva la expiración.
+    - Con `maxbytes` y `sizeof` también se acota el tamaño aproximado total
+      (se desalojan las entradas menos usadas hasta quedar bajo el tope).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, maxbytes: int = 0,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.maxbytes = max(0, int(maxbytes))
+        self._sizeof = sizeof if sizeof is not None and self.maxbytes else None
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def _drop(self, key: Hashable) -> Any:
+        _, value, size = self._data.pop(key)
+        self.bytes -= size
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            if self._expired(item[0], now):
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        size = self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (now, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes and self.bytes > self.maxbytes and self._data):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        out = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+        if self.maxbytes:
+            out["bytes"] = self.bytes
+            out["maxbytes"] = self.maxbytes
+        return out
@@ -0,0 +1 @@
+# backend/conftest.py: los tests importan `app` desde backend/
@@ -0,0 +1,102 @@
+# backend/ingestion/bench_ingest.py
+"""
+Benchmark offline del pipeline de ingesta (sin OpenAI ni servidor Qdrant).
+
+CSV sintético de n filas -> StubTranslator (latencia simulada por llamada)
+-> SentenceTransformer local -> Qdrant en memoria. Con --fake-openai usa
+OpenAITranslator contra ingestion/fake_openai.py (HTTP real, 5% de items
+perdidos para ejercitar el reenvío). Compara:
+  - secuencial: 1 fila y 1 traducción a la vez, un encode por fila
+  - paralelo:   INGEST_TRANSLATE_WORKERS filas, INGEST_TRANSLATE_CONCURRENCY
+                llamadas en vuelo, un texto por llamada, encode por lotes
+  - agrupado:   lo anterior + varios textos por llamada (INGEST_TRANSLATE_BATCH_*)
+  - delta:      re-ingesta del CSV con 10% de filas editadas y una borrada
+                (sólo se procesan los chunks nuevos/cambiados; ver Manifest)
+
+Uso (requiere el modelo de embeddings ya descargado):
+  python ingestion/bench_ingest.py [n_filas] [latencia_ms] [--fake-openai]   # por defecto 40 filas, 150 ms
+"""
+import os
+import csv
+import sys
+import asyncio
+import tempfile
+
+from qdrant_client import QdrantClient
+from sentence_transformers import SentenceTransformer
+
+import ingest_vademecum as iv
+from fake_openai import FakeOpenAI, serve
+from translate_cache import TranslationCache
+
+SENTENCE = ("This medicine is used to relieve mild to moderate pain and reduce fever in adults. "
+            "Do not exceed the recommended dose; consult a doctor if symptoms persist. ")
+
+
+def synthetic_csv(path: str, n: int, edited: int = 0, drop: int = 0):
+    cols = ["Drug ID", "Drug Name", "Generic Name", "Drug Class", "Manufacturer", "Price",
+            "Approval Date", "Availability", "Dosage Form", "Strength", "Route of Administration",
+            *iv.SECTION_MAP.keys()]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=cols)
+        w.writeheader()
+        for i in range(drop, n):
+            row = {
+                "Drug ID": str(i), "Drug Name": f"Drug{i}", "Generic Name": f"generic{i}",
+                "Drug Class": f"Class{i % 12}", "Manufacturer": "Acme", "Price": "10",
+                "Approval Date": "2020-01-01", "Availability": "Rx",
+                "Dosage Form": "Tablet", "Strength": f"{i % 9 + 1}00 mg", "Route of Administration": "Oral",
+            }
+            for k, col in enumerate(iv.SECTION_MAP):
+                row[col] = f"{col} of Drug{i}. " + SENTENCE * (1 + (i + k) % 3)
+            if i % 10 == 0 and edited:
+                row["Warnings and Precautions"] += f" Revised label v{edited}."
+            w.writerow(row)
+
+
+def run(label: str, path: str, embedder, translator, workers: int, embed_batch: int, client=None, manifest=None):
+    if client is None:
+        client = QdrantClient(":memory:")
+        iv.ensure_collection(client)
+        manifest = iv.Manifest(path + f".{label}.manifest.sqlite")
+    stats = asyncio.run(iv.run_pipeline(path, client, embedder, translator, manifest,
+                                        workers=workers, embed_batch=embed_batch))
+    count = client.count(iv.COLL).count
+    print(f"{label:>11}: {stats['seconds']:7.2f} s | {stats['chunks']} chunks upsert, {stats['deleted']} borrados "
+          f"({count} en Qdrant) | {stats['translate_calls']} pedidos de traducción | {stats['embed_batches']} encodes")
+    return stats["seconds"], client, manifest
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if args else 40
+    latency = float(args[1]) if len(args) > 1 else 150.0
+    embedder = SentenceTransformer(iv.EMBED_MODEL)
+    with tempfile.TemporaryDirectory() as tmp:
+        if "--fake-openai" in sys.argv:
+            srv = serve(FakeOpenAI(latency_ms=latency, drop=0.05))
+            iv.OPENAI_BASE_URL = f"http://127.0.0.1:{srv.server_port}/v1"
+            iv.OPENAI_API_KEY = iv.OPENAI_API_KEY or "fake"
+
+            def make(label, concurrency, batch):
+                cache = TranslationCache(os.path.join(tmp, f"{label}.sqlite"), legacy_json=None)
+                return iv.OpenAITranslator(concurrency=concurrency, batch=batch, cache=cache)
+        else:
+            def make(label, concurrency, batch):
+                return iv.StubTranslator(concurrency=concurrency, latency_ms=latency, batch=batch)
+
+        path = os.path.join(tmp, "bench.csv")
+        synthetic_csv(path, n)
+        print(f"{n} filas, latencia {latency:.0f} ms por pedido de traducción")
+        seq, _, _ = run("secuencial", path, embedder, make("secuencial", 1, False), workers=1, embed_batch=1)
+        par, _, _ = run("paralelo", path, embedder, make("paralelo", iv.TRANSLATE_CONCURRENCY, False),
+                        iv.TRANSLATE_WORKERS, iv.EMBED_BATCH)
+        translator = make("agrupado", iv.TRANSLATE_CONCURRENCY, True)
+        grp, client, manifest = run("agrupado", path, embedder, translator, iv.TRANSLATE_WORKERS, iv.EMBED_BATCH)
+        print(f"speedup: paralelo x{seq / max(par, 1e-9):.1f}, agrupado x{seq / max(grp, 1e-9):.1f}")
+        synthetic_csv(path, n, edited=1, drop=1)
+        run("delta", path, embedder, translator, iv.TRANSLATE_WORKERS, iv.EMBED_BATCH, client=client, manifest=manifest)
+
+
+if __name__ == "__main__":
+    main()
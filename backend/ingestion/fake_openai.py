@@ -0,0 +1,119 @@
+# backend/ingestion/fake_openai.py
+"""
+Servidor local compatible con /v1/chat/completions para probar la traducción
+de la ingesta sin OpenAI (sólo stdlib).
+
+"Traduce" anteponiendo "ES: " al texto. Los pedidos agrupados (JSON con
+`items`) se contestan en el mismo formato; se pueden inyectar fallas para
+ejercitar la verificación y el reenvío:
+  --drop 0.1     omite ~10% de los items
+  --garble 0.05  devuelve ~5% de los items con un texto de largo absurdo
+  --latency-ms   latencia por pedido
+
+Uso:
+  python ingestion/fake_openai.py --port 8099 --latency-ms 300 --drop 0.1
+  OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=x python ingestion/ingest_vademecum.py data.csv
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+
+class FakeOpenAI:
+    def __init__(self, latency_ms: float = 0.0, drop: float = 0.0, garble: float = 0.0, seed: int = 7):
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.drop = drop
+        self.garble = garble
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.items = 0
+
+    def _roll(self, p: float) -> bool:
+        with self.lock:
+            return self.rng.random() < p
+
+    def answer(self, prompt: str) -> str:
+        head, _, body = prompt.rpartition("\n\n")
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+            return "ES: " + body
+        items = []
+        for it in data["items"]:
+            if self._roll(self.drop):
+                continue
+            es = "ES: " + it.get("en", "")
+            if self._roll(self.garble):
+                es = "ES"
+            items.append({"i": it.get("i"), "es": es})
+        with self.lock:
+            self.items += len(data["items"])
+        return json.dumps({"items": items}, ensure_ascii=False)
+
+    def completion(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = next((m.get("content", "") for m in reversed(req.get("messages", [])) if m.get("role") == "user"), "")
+        content = self.answer(prompt)
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+
+def serve(fake: FakeOpenAI, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Levanta el servidor en un thread; la URL base es http://host:server.server_port/v1."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            out = json.dumps(fake.completion(json.loads(body or b"{}"))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--drop", type=float, default=0.0)
+    ap.add_argument("--garble", type=float, default=0.0)
+    args = ap.parse_args()
+    fake = FakeOpenAI(args.latency_ms, args.drop, args.garble)
+    srv = serve(fake, port=args.port)
+    print(f"[FAKE] OPENAI_BASE_URL=http://127.0.0.1:{srv.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"[FAKE] {fake.requests} pedidos, {fake.items} items agrupados")
+        sys.exit(0)
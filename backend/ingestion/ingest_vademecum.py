@@ -1,11 +1,19 @@
-import os, sys, csv, json, asyncio, math, hashlib
-from typing import Dict, Iterable, List, Tuple, Optional
+import os, sys, csv, json, uuid, asyncio, math, hashlib, time, sqlite3, threading
+from typing import Any, Dict, Iterable, List, Tuple, Optional, Set
 
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
 from sentence_transformers import SentenceTransformer
 
+from translate_cache import TranslationCache
+
+# prompt y etiquetas de las respuestas precalculadas: los mismos módulos que usa la API (backend/app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.answer_prompt import (  # noqa: E402
+    ANSWER_MAX_TOKENS, ANSWER_PROMPT, ANSWER_TEMPERATURE, SECTION_LABEL as ANSWER_LABEL, answer_key,
+)
+
 # ---------- Config ----------
 load_dotenv()
 
@@ -15,12 +23,32 @@ COLL = os.getenv("QDRANT_COLLECTION", "vademecum_es")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # p.ej. ingestion/fake_openai.py para pruebas locales
 
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 VEC_SIZE = 384
 BATCH = 256
 
-CACHE_PATH = os.getenv("TRANSLATE_CACHE", "translate_cache.json")
+SOURCE = "kaggle:comprehensive-drug-information-dataset"
+
+CACHE_PATH = os.getenv("TRANSLATE_CACHE", "translate_cache.sqlite")
+
+# pipeline: lector -> chunker -> traductores -> embedder -> upsert
+TRANSLATOR = os.getenv("INGEST_TRANSLATOR", "openai")  # "openai" | "stub" (offline, para benchmarks)
+TRANSLATE_CONCURRENCY = int(os.getenv("INGEST_TRANSLATE_CONCURRENCY", "8"))  # llamadas a OpenAI en vuelo
+TRANSLATE_WORKERS = int(os.getenv("INGEST_TRANSLATE_WORKERS", "4"))  # filas traduciéndose a la vez
+TRANSLATE_RETRIES = int(os.getenv("INGEST_TRANSLATE_RETRIES", "3"))
+TRANSLATE_BATCH = os.getenv("INGEST_TRANSLATE_BATCH", "1") not in ("0", "false", "no")  # varios textos por pedido
+TRANSLATE_BATCH_TOKENS = int(os.getenv("INGEST_TRANSLATE_BATCH_TOKENS", "2000"))  # tokens de entrada por pedido
+TRANSLATE_BATCH_ITEMS = int(os.getenv("INGEST_TRANSLATE_BATCH_ITEMS", "40"))
+STUB_LATENCY_MS = float(os.getenv("INGEST_STUB_LATENCY_MS", "150"))
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))  # chunks por encode()
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))  # filas por cola entre etapas (backpressure)
+ANSWERS = os.getenv("INGEST_ANSWERS", "1") not in ("0", "false", "no")  # respuesta humanizada por sección
+ANSWER_CONCURRENCY = int(os.getenv("INGEST_ANSWER_CONCURRENCY", "8"))
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST", f"ingest_manifest.{COLL}.sqlite")  # ids ya ingestados (ver Manifest)
+LEGACY_MANIFEST_JSON = f"ingest_manifest.{COLL}.json"  # formato anterior: se importa una vez
+REDIS_URL = os.getenv("REDIS_URL", "")
 
 SECTION_MAP = {
     "Indications": "indications",
@@ -69,17 +97,32 @@ def split_recursive(text: str, max_len: int = 420) -> List[str]:
         chunks.append(buf.strip())
     return chunks
 
-def ensure_collection(client: QdrantClient):
-    if not client.collection_exists(COLL):
-        client.create_collection(
-            collection_name=COLL,
-            vectors_config=qm.VectorParams(size=VEC_SIZE, distance=qm.Distance.COSINE),
-        )
-        client.update_collection(
-            collection_name=COLL,
-            hnsw_config=qm.HnswConfigDiff(m=16, ef_construct=256),
-            optimizers_config=qm.OptimizersConfigDiff(memmap_threshold=20000),
-        )
+def ensure_collection(client: QdrantClient) -> bool:
+    """True si la colección se acaba de crear."""
+    if client.collection_exists(COLL):
+        return False
+    client.create_collection(
+        collection_name=COLL,
+        vectors_config=qm.VectorParams(size=VEC_SIZE, distance=qm.Distance.COSINE),
+    )
+    client.update_collection(
+        collection_name=COLL,
+        hnsw_config=qm.HnswConfigDiff(m=16, ef_construct=256),
+        optimizers_config=qm.OptimizersConfigDiff(memmap_threshold=20000),
+    )
+    return True
+
+def publish_version():
+    """Avisa a la API que la colección cambió (invalida su caché por fármaco; ver app/services/drug_cache.py)."""
+    if not REDIS_URL:
+        print("[WARN] REDIS_URL no configurada: la API verá los cambios al expirar su caché")
+        return
+    try:
+        import redis
+        redis.from_url(REDIS_URL).set(f"vademecum:{COLL}:version", repr(time.time()))
+        print(f"[VERSION] vademecum:{COLL}:version publicada")
+    except Exception as e:
+        print(f"[WARN] no se pudo publicar la versión en Redis: {e}")
 
 def rows_from_csv(path: str) -> Iterable[Dict[str, str]]:
     with open(path, newline="", encoding="utf-8") as f:
@@ -91,64 +134,333 @@ def rows_from_csv(path: str) -> Iterable[Dict[str, str]]:
 def _cache_key(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def load_cache(path: str) -> Dict[str, str]:
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
-
-def save_cache(path: str, cache: Dict[str, str]):
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+_TRANSLATE_CACHE: Optional[TranslationCache] = None
+
+def get_translate_cache() -> TranslationCache:
+    """Caché compartido (SQLite, ver translate_cache.py); se abre en el primer uso."""
+    global _TRANSLATE_CACHE
+    if _TRANSLATE_CACHE is None:
+        _TRANSLATE_CACHE = TranslationCache(CACHE_PATH)
+    return _TRANSLATE_CACHE
+
+def split_batches(texts: List[str], token_budget: int = TRANSLATE_BATCH_TOKENS,
+                  max_items: int = TRANSLATE_BATCH_ITEMS) -> List[List[int]]:
+    """Índices de `texts` agrupados sin pasar ~token_budget tokens (≈ 3 chars/token) ni max_items."""
+    out: List[List[int]] = []
+    cur: List[int] = []
+    used = 0
+    for i, t in enumerate(texts):
+        cost = len(t) // 3 + 8  # + envoltorio JSON del item
+        if cur and (used + cost > token_budget or len(cur) >= max_items):
+            out.append(cur)
+            cur, used = [], 0
+        cur.append(i)
+        used += cost
+    if cur:
+        out.append(cur)
+    return out
 
-def translate_texts(texts: List[str]) -> List[str]:
+class Translator:
     """
-    Traduce una lista de textos EN->ES usando OpenAI.
-    Usa un cache local por hash para evitar costs.
+    EN->ES con caché por hash, a lo sumo `concurrency` llamadas en vuelo y
+    single-flight: un mismo texto pedido por dos filas a la vez se traduce una vez.
+    Las subclases implementan _call_many (todos los textos de una fila que faltan).
+    """
+
+    def __init__(self, concurrency: int = TRANSLATE_CONCURRENCY, cache=None):
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.cache = get_translate_cache() if cache is None else cache
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.hits = 0
+
+    async def _call_many(self, texts: List[str]) -> List[str]:
+        raise NotImplementedError
 
-    Nota: se invoca en lotes pequeños para evitar límites.
+    async def _resolve(self, todo: Dict[str, str]):
+        keys = list(todo)
+        try:
+            results = await self._call_many([todo[k] for k in keys])
+        except BaseException as e:
+            for k in keys:
+                fut = self._inflight.pop(k)
+                if isinstance(e, asyncio.CancelledError):
+                    fut.cancel()
+                else:
+                    fut.set_exception(e)
+                    fut.exception()  # la recupera quien llamó; evita el aviso de asyncio
+            raise
+        for k, es in zip(keys, results):
+            self.cache[k] = es
+            self._inflight.pop(k).set_result(es)
+
+    async def translate(self, texts: List[str]) -> List[str]:
+        out = [""] * len(texts)
+        waits: Dict[int, asyncio.Future] = {}
+        todo: Dict[str, str] = {}
+        for i, t in enumerate(texts):
+            if not t:
+                continue
+            key = _cache_key("EN2ES::" + t)
+            es = self.cache.get(key)
+            if es is not None:
+                self.hits += 1
+                out[i] = es
+                continue
+            fut = self._inflight.get(key)
+            if fut is None:
+                fut = asyncio.get_running_loop().create_future()
+                self._inflight[key] = fut
+                todo[key] = t
+            waits[i] = fut
+        if todo:
+            await self._resolve(todo)
+        for i, fut in waits.items():
+            out[i] = await fut
+        return out
+
+    def flush(self):
+        """Escribe las traducciones pendientes (en cada upsert; no por fila)."""
+        self.cache.flush()
+
+
+class OpenAITranslator(Translator):
+    """
+    Con batch=True empaqueta los textos en pedidos JSON ({"items": [{"i", "en"}]} ->
+    {"items": [{"i", "es"}]}) partidos por presupuesto de tokens. Se verifica que
+    vuelva cada índice una sola vez y con un largo plausible; lo que falta o no
+    calza se reenvía (en pedidos más chicos) y, en última instancia, de a uno.
     """
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
 
-    # Simple batching
-    outputs: List[str] = []
-    for t in texts:
-        if not t:
-            outputs.append("")
-            continue
-        key = _cache_key("EN2ES::" + t)
-        if key in _TRANSLATE_CACHE:
-            outputs.append(_TRANSLATE_CACHE[key])
-            continue
+    SYSTEM = "Eres un traductor médico EN->ES preciso y conciso."
+
+    def __init__(self, concurrency: int = TRANSLATE_CONCURRENCY, batch: bool = TRANSLATE_BATCH, cache=None):
+        super().__init__(concurrency, cache)
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None)
+        self.batch = batch
+        self.resent = 0
+        self.fallbacks = 0
+
+    async def _complete(self, prompt: str, json_mode: bool = False) -> str:
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        for attempt in range(TRANSLATE_RETRIES):
+            try:
+                async with self.sem:
+                    resp = await self.client.chat.completions.create(
+                        model=OPENAI_MODEL,
+                        messages=[
+                            {"role":"system","content":self.SYSTEM},
+                            {"role":"user","content":prompt},
+                        ],
+                        temperature=0.2,
+                        **kwargs,
+                    )
+                self.calls += 1
+                return (resp.choices[0].message.content or "").strip()
+            except Exception as e:
+                if attempt + 1 >= TRANSLATE_RETRIES:
+                    raise
+                wait = 2 ** attempt
+                print(f"[WARN] traducción falló ({type(e).__name__}: {e}); reintento en {wait}s")
+                await asyncio.sleep(wait)
+        return ""
 
+    async def _call(self, text: str) -> str:
         prompt = (
             "Traduce al español, mantén términos farmacológicos precisos y evita inventar información. "
             "Solo devuelve la traducción sin comentarios:\n\n"
-            f"{t}"
+            f"{text}"
         )
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role":"system","content":"Eres un traductor médico EN->ES preciso y conciso."},
-                {"role":"user","content":prompt},
-            ],
-            temperature=0.2,
+        return await self._complete(prompt)
+
+    @staticmethod
+    def _plausible(en: str, es: str) -> bool:
+        # una traducción desalineada suele delatarse por el largo
+        if len(en) < 40:
+            return bool(es)
+        return 0.5 <= len(es) / len(en) <= 2.5
+
+    async def _call_batch(self, texts: List[str]) -> List[Optional[str]]:
+        """Un pedido JSON; None en las posiciones que no volvieron bien."""
+        prompt = (
+            "Traduce al español el campo `en` de cada elemento de `items`, mantén términos farmacológicos "
+            "precisos y evita inventar información. Responde solo con JSON, sin comentarios: "
+            '{"items": [{"i": <el mismo i>, "es": "<traducción>"}]}, exactamente un elemento por cada i.\n\n'
+            + json.dumps({"items": [{"i": i, "en": t} for i, t in enumerate(texts)]}, ensure_ascii=False)
         )
-        es = resp.choices[0].message.content.strip()
-        _TRANSLATE_CACHE[key] = es
-        outputs.append(es)
+        out: List[Optional[str]] = [None] * len(texts)
+        try:
+            items = json.loads(await self._complete(prompt, json_mode=True)).get("items")
+        except (ValueError, AttributeError):
+            return out
+        seen: Set[int] = set()
+        for it in items if isinstance(items, list) else []:
+            i = it.get("i") if isinstance(it, dict) else None
+            es = it.get("es") if isinstance(it, dict) else None
+            if not isinstance(i, int) or not 0 <= i < len(texts) or not isinstance(es, str):
+                continue
+            if i in seen:  # índice repetido: no se sabe cuál es el bueno
+                out[i] = None
+                continue
+            seen.add(i)
+            es = es.strip()
+            out[i] = es if self._plausible(texts[i], es) else None
+        return out
+
+    async def _call_many(self, texts: List[str]) -> List[str]:
+        if not self.batch or len(texts) == 1:
+            return list(await asyncio.gather(*(self._call(t) for t in texts)))
+        results: List[Optional[str]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+        budget = TRANSLATE_BATCH_TOKENS
+        for attempt in range(TRANSLATE_RETRIES):
+            groups = [[pending[j] for j in g] for g in split_batches([texts[i] for i in pending], budget)]
+            got = await asyncio.gather(*(self._call_batch([texts[i] for i in g]) for g in groups))
+            for g, outs in zip(groups, got):
+                for i, es in zip(g, outs):
+                    results[i] = es
+            pending = [i for i in pending if results[i] is None]
+            if not pending:
+                break
+            self.resent += len(pending)
+            print(f"[WARN] {len(pending)} traducciones faltantes o desalineadas; se reenvían")
+            budget = max(64, budget // 2)
+        if pending:
+            self.fallbacks += len(pending)
+            singles = await asyncio.gather(*(self._call(texts[i]) for i in pending))
+            for i, es in zip(pending, singles):
+                results[i] = es
+        return [es or "" for es in results]
+
+
+class StubTranslator(Translator):
+    """
+    Sin red: devuelve el texto tal cual tras `latency_ms` por llamada, para medir
+    el pipeline offline. Con batch=True simula los pedidos agrupados (una latencia por lote).
+    """
+
+    def __init__(self, concurrency: int = TRANSLATE_CONCURRENCY, latency_ms: float = STUB_LATENCY_MS,
+                 batch: bool = TRANSLATE_BATCH):
+        super().__init__(concurrency, cache={})
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.batch = batch
+
+    async def _call_group(self, texts: List[str]) -> List[str]:
+        async with self.sem:
+            await asyncio.sleep(self.latency)
+        self.calls += 1
+        return list(texts)
+
+    async def _call_many(self, texts: List[str]) -> List[str]:
+        groups = split_batches(texts) if self.batch else [[i] for i in range(len(texts))]
+        got = await asyncio.gather(*(self._call_group([texts[i] for i in g]) for g in groups))
+        return [es for outs in got for es in outs]
+
+    def flush(self):
+        pass
+
+
+def make_translator(kind: str = TRANSLATOR) -> Translator:
+    if kind == "stub":
+        return StubTranslator()
+    return OpenAITranslator()
+
+# ---------- Respuestas humanizadas precalculadas ----------
+# ANSWER_PROMPT, ANSWER_LABEL y answer_key son los de app/services/answer_prompt.py:
+# la API sólo sirve answer_es si answer_key calza con su prompt y el texto del chunk.
+
+def answer_inputs(names_es: List[str], name_en: str, section: str, text_en: str, text_es: str) -> Tuple[str, str, str]:
+    """(drug, label, text) tal como los arma search_vademecum para este chunk."""
+    drug = next((n for n in (names_es[0], names_es[1], name_en) if n and n.strip()), "")
+    drug = normalize_space(drug)
+    drug = drug[:1].upper() + drug[1:]
+    section_es = SECTION_ES.get(section, section)
+    label = ANSWER_LABEL.get(section_es, section_es.capitalize())
+    return drug, label, (text_es or text_en or "").strip()
+
+class Humanizer:
+    """
+    Genera, para el primer chunk de cada sección (el que responde search_vademecum),
+    la respuesta que daría _humanize (mismo prompt, temperatura y tope de tokens),
+    para que la API no llame al LLM en la request.
+    Las respuestas se guardan en el caché SQLite de traducciones (clave ANSWER::),
+    así una corrida cortada no las vuelve a pedir.
+    """
 
-    # persist cache cada vez
-    save_cache(CACHE_PATH, _TRANSLATE_CACHE)
-    return outputs
+    def __init__(self, concurrency: int = ANSWER_CONCURRENCY, model: str = OPENAI_MODEL, cache=None):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None)
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.model = model
+        self.cache = get_translate_cache() if cache is None else cache
+        # se guarda en el manifiesto por punto: cambiar prompt o modelo regenera sólo las respuestas
+        self.tag = answer_key(model, ANSWER_PROMPT, "", "", "")
+        self.calls = 0
+        self.hits = 0
+        self.failed = 0
+
+    async def _call(self, drug: str, label: str, text: str) -> str:
+        prompt = ANSWER_PROMPT.format(drug=drug, label=label, text=text)
+        for attempt in range(TRANSLATE_RETRIES):
+            try:
+                async with self.sem:
+                    resp = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=ANSWER_TEMPERATURE,
+                        max_tokens=ANSWER_MAX_TOKENS,
+                    )
+                self.calls += 1
+                return (resp.choices[0].message.content or "").strip()
+            except Exception as e:
+                if attempt + 1 >= TRANSLATE_RETRIES:
+                    raise
+                wait = 2 ** attempt
+                print(f"[WARN] respuesta humanizada falló ({type(e).__name__}: {e}); reintento en {wait}s")
+                await asyncio.sleep(wait)
+        return ""
 
-_TRANSLATE_CACHE: Dict[str,str] = load_cache(CACHE_PATH)
+    async def answer(self, drug: str, label: str, text: str) -> Optional[Tuple[str, str]]:
+        """
+        (respuesta, answer_key); respuesta vacía si no hay nada que humanizar.
+        None si el LLM falló: el punto queda sin answer_es (la API usará el LLM)
+        y la próxima ingesta lo reintenta.
+        """
+        key = answer_key(self.model, ANSWER_PROMPT, drug, label, text)
+        if not drug or not text:
+            return "", key
+        cached = self.cache.get("ANSWER::" + key)
+        if cached is not None:
+            self.hits += 1
+            return cached, key
+        try:
+            out = await self._call(drug, label, text)
+        except Exception as e:
+            self.failed += 1
+            print(f"[WARN] sin respuesta precalculada para {drug} / {label}: {type(e).__name__}: {e}")
+            return None
+        if not out:
+            self.failed += 1
+            return None
+        self.cache["ANSWER::" + key] = out
+        return out, key
+
+def make_humanizer(kind: str = TRANSLATOR) -> Optional[Humanizer]:
+    # con el traductor stub los textos quedan en inglés: no tiene sentido humanizarlos
+    if not ANSWERS or kind == "stub":
+        return None
+    return Humanizer()
+
+SECTION_ES = {
+    "indications":"indicaciones",
+    "mechanism":"mecanismo",
+    "side_effects":"efectos_secundarios",
+    "contraindications":"contraindicaciones",
+    "interactions":"interacciones",
+    "warnings":"advertencias",
+    "dosage":"posologia",
+}
 
 def row_to_chunks(row: Dict[str, str]) -> List[Tuple[str, str]]:
     out: List[Tuple[str, str]] = []
@@ -163,90 +475,507 @@ def row_to_chunks(row: Dict[str, str]) -> List[Tuple[str, str]]:
         out.append(("dosage", chunk))
     return out
 
-def ingest_csv_with_translation(path: str):
+def row_names(row: Dict[str, str]) -> List[str]:
+    """Campos que se traducen además de los chunks: name, generic, class."""
+    return [normalize_space(row.get(k)) for k in ("Drug Name", "Generic Name", "Drug Class")]
+
+def build_payload(row: Dict[str, str], names_es: List[str], section: str, idx: int,
+                  text_en: str, text_es: str, answer: Optional[Tuple[str, str]] = None,
+                  answer_model: str = "") -> Dict[str, Any]:
+    drug_id = row.get("Drug ID") or row.get("ID") or ""
+    name_en, gname_en, dclass_en = row_names(row)
+    name_es, gname_es, dclass_es = names_es
+    payload = {
+        "doc_id": f"drug:{drug_id or name_en}",
+        # originales
+        "name": name_en,
+        "generic_name": gname_en,
+        "drug_class": dclass_en,
+        "section": section,
+        "chunk_index": idx,
+        "source": SOURCE,
+        "manufacturer": normalize_space(row.get("Manufacturer")),
+        "approval_date": normalize_space(row.get("Approval Date")),
+        "availability": normalize_space(row.get("Availability")),
+        "price": normalize_space(row.get("Price")),
+        "text": text_en,
+        "title": f"{name_en} ({gname_en}) - {section}",
+        # traducidos
+        "name_es": name_es,
+        "generic_name_es": gname_es,
+        "drug_class_es": dclass_es,
+        "text_es": text_es,
+        "title_es": f"{name_es} ({gname_es}) - {section}",
+        "section_es": SECTION_ES.get(section, section),
+    }
+    if answer and answer[0]:
+        # respuesta humanizada lista para servir (ver Humanizer)
+        payload["answer_es"], payload["answer_key"] = answer
+        payload["answer_model"] = answer_model
+    return payload
+
+def point_id(row: Dict[str, str], section: str, idx: int, text_en: str) -> str:
+    """
+    Id determinista (UUID) a partir del contenido que define el punto: doc_id,
+    sección, índice y texto del chunk, metadatos de la fila y modelo de embeddings.
+    Si algo cambia, el chunk obtiene otro id y el anterior se borra. La respuesta
+    precalculada no entra: se sigue en el manifiesto y se actualiza con set_payload.
+    """
+    drug_id = row.get("Drug ID") or row.get("ID") or ""
+    name_en = normalize_space(row.get("Drug Name"))
+    meta = [normalize_space(row.get(k)) for k in
+            ("Generic Name", "Drug Class", "Manufacturer", "Approval Date", "Availability", "Price")]
+    parts = [EMBED_MODEL, f"drug:{drug_id or name_en}", section, idx, text_en, name_en, *meta]
+    key = json.dumps(parts, ensure_ascii=False)
+    return str(uuid.UUID(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]))
+
+# ---------- Manifiesto ----------
+class Manifest:
+    """
+    Puntos que esta ingesta dejó en la colección: id -> doc_id, en SQLite (WAL).
+    Se guarda tras cada upsert, así que también hace de checkpoint: una corrida
+    cortada se relanza y sólo procesa los chunks que faltan.
+
+    `answers`: id -> Humanizer.tag (modelo + prompt) de la respuesta precalculada
+    que tiene el punto. Un primer chunk de sección sin tag (falló, o se ingestó
+    sin respuestas) o con otro tag sólo regenera la respuesta.
+
+    `points` vive en memoria (lo consulta el lector por cada chunk); save() escribe
+    sólo lo cambiado desde el anterior en una transacción, así que cada checkpoint
+    cuesta lo que el lote y no lo que el manifiesto entero. Es seguro llamarlo desde
+    un thread (el pipeline lo hace con asyncio.to_thread).
+    """
+
+    def __init__(self, path: str, fresh: bool = False):
+        self.path = path
+        self.points: Dict[Any, str] = {}
+        self.answers: Dict[Any, str] = {}
+        self._added: Dict[Any, Tuple[str, str]] = {}
+        self._removed: Set[Any] = set()
+        self._lock = threading.Lock()  # points y pendientes
+        self._db_lock = threading.Lock()  # la conexión
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # id sin tipo: conserva int (ingestas anteriores) o str (UUID) tal cual
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS points (id PRIMARY KEY, doc_id TEXT NOT NULL, answer TEXT NOT NULL DEFAULT '')"
+        )
+        if "answer" not in {r[1] for r in self._conn.execute("PRAGMA table_info(points)")}:
+            self._conn.execute("ALTER TABLE points ADD COLUMN answer TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID")
+        if fresh:
+            self._conn.execute("DELETE FROM points")
+            self._conn.execute("DELETE FROM meta")
+        self._conn.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                               [("collection", COLL), ("model", EMBED_MODEL)])
+        for pid, doc_id, answer in self._conn.execute("SELECT id, doc_id, answer FROM points"):
+            self.points[pid] = doc_id
+            if answer:
+                self.answers[pid] = answer
+
+    @classmethod
+    def load(cls, path: str, legacy_json: Optional[str] = LEGACY_MANIFEST_JSON) -> Optional["Manifest"]:
+        """None si no hay manifiesto (o es de otra colección)."""
+        if not os.path.exists(path) and not (legacy_json and os.path.exists(legacy_json)):
+            return None
+        try:
+            m = cls(path)
+        except sqlite3.Error as e:
+            print(f"[WARN] manifiesto ilegible ({e}); se reconstruye desde Qdrant")
+            return None
+        collection = m._conn.execute("SELECT value FROM meta WHERE key = 'collection'").fetchone()[0]
+        if collection != COLL:
+            print(f"[MANIFEST] {path} es de otra colección; se ignora")
+            m.close()
+            return None
+        if not m.points and legacy_json and os.path.exists(legacy_json):
+            m._import_json(legacy_json)
+        if not m.points:
+            m.close()
+            return None
+        return m
+
+    @classmethod
+    def from_collection(cls, path: str, client: QdrantClient) -> "Manifest":
+        """
+        Sin manifiesto: adopta los puntos de esta fuente que ya están en Qdrant (no los del admin).
+        Quedan sin tag de respuesta: la corrida las vuelve a asignar (desde el caché si ya se generaron).
+        """
+        m = cls(path, fresh=True)
+        flt = qm.Filter(must=[qm.FieldCondition(key="source", match=qm.MatchValue(value=SOURCE))])
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=COLL, scroll_filter=flt, limit=1024, offset=offset,
+                with_payload=["doc_id"], with_vectors=False,
+            )
+            m.add({p.id: (p.payload or {}).get("doc_id", "") for p in points})
+            if not offset:
+                break
+        m.save()
+        if m.points:
+            print(f"[MANIFEST] reconstruido desde Qdrant: {len(m.points)} puntos")
+        return m
+
+    def add(self, points: Dict[Any, str], answers: Optional[Dict[Any, str]] = None):
+        """`answers`: tag de la respuesta de cada punto; los que no están quedan sin respuesta."""
+        answers = answers or {}
+        with self._lock:
+            for pid, doc_id in points.items():
+                answer = answers.get(pid, "")
+                self.points[pid] = doc_id
+                if answer:
+                    self.answers[pid] = answer
+                else:
+                    self.answers.pop(pid, None)
+                self._added[pid] = (doc_id, answer)
+                self._removed.discard(pid)
+
+    def remove(self, ids: Iterable[Any]):
+        with self._lock:
+            for pid in ids:
+                self.points.pop(pid, None)
+                self.answers.pop(pid, None)
+                self._added.pop(pid, None)
+                self._removed.add(pid)
+
+    def save(self) -> int:
+        """Escribe los cambios pendientes en una sola transacción; devuelve cuántos."""
+        with self._lock:
+            added = [(pid, doc_id, answer) for pid, (doc_id, answer) in self._added.items()]
+            removed = [(pid,) for pid in self._removed]
+            self._added, self._removed = {}, set()
+        if not added and not removed:
+            return 0
+        # la escritura no toma _lock: add()/remove() (event loop) no esperan al disco
+        try:
+            with self._db_lock:
+                self._write(added, removed)
+        except Exception:
+            with self._lock:  # quedan pendientes para el próximo save()
+                for pid, doc_id, answer in added:
+                    if pid not in self._removed:
+                        self._added.setdefault(pid, (doc_id, answer))
+                self._removed.update(pid for (pid,) in removed if pid not in self._added)
+            raise
+        return len(added) + len(removed)
+
+    def _write(self, added: List[Tuple[Any, str, str]], removed: List[Tuple[Any]]):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany("DELETE FROM points WHERE id = ?", removed)
+            self._conn.executemany("INSERT OR REPLACE INTO points (id, doc_id, answer) VALUES (?, ?, ?)", added)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        self.save()
+        with self._db_lock:
+            self._conn.close()
+
+    def _import_json(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARN] no se pudo importar {path}: {e}")
+            return
+        if data.get("collection") != COLL:
+            return
+        # lista de pares: los ids pueden ser int (ingestas anteriores) o UUID
+        self.add({pid: doc_id for pid, doc_id in data.get("points", [])})
+        self.save()
+        print(f"[MANIFEST] importados {len(self.points)} puntos desde {path}")
+
+# ---------- Pipeline ----------
+class RowDoc:
+    """
+    Una fila del CSV en tránsito por el pipeline: `chunks` nuevos o cambiados (se
+    traducen, embeddean y upsertean) y `answer_only`, primeros chunks de sección ya
+    ingestados cuya respuesta falta o es de otro prompt/modelo (sólo set_payload).
+    """
+    __slots__ = ("row", "doc_id", "chunks", "answer_only", "names_es", "texts_es", "answers", "answer_model",
+                 "vectors")
+
+    def __init__(self, row: Dict[str, str], doc_id: str, chunks: List[Tuple[int, str, str, str, bool]],
+                 answer_only: Optional[List[Tuple[int, str, str, str, bool]]] = None):
+        self.row = row
+        self.doc_id = doc_id
+        self.chunks = chunks  # (chunk_index, section, text_en, point_id, primer chunk de su sección)
+        self.answer_only = answer_only or []
+        self.names_es: List[str] = ["", "", ""]
+        self.texts_es: List[str] = []
+        self.answers: Dict[Any, Optional[Tuple[str, str]]] = {}  # point_id -> (answer_es, answer_key) | None si falló
+        self.answer_model = ""
+        self.vectors: Any = []
+
+    def points(self) -> List[qm.PointStruct]:
+        return [
+            qm.PointStruct(
+                id=pid,
+                vector=vec.tolist(),
+                payload=build_payload(self.row, self.names_es, section, idx, text_en, text_es,
+                                      self.answers.get(pid), self.answer_model),
+            )
+            for (idx, section, text_en, pid, _), text_es, vec in zip(self.chunks, self.texts_es, self.vectors)
+        ]
+
+    def answer_updates(self) -> List[qm.SetPayloadOperation]:
+        """set_payload de las respuestas de `answer_only` que se generaron."""
+        ops = []
+        for c in self.answer_only:
+            answer = self.answers.get(c[3])
+            if answer and answer[0]:
+                payload = {"answer_es": answer[0], "answer_key": answer[1], "answer_model": self.answer_model}
+                ops.append(qm.SetPayloadOperation(set_payload=qm.SetPayload(payload=payload, points=[c[3]])))
+        return ops
+
+    def answer_tags(self, tag: str) -> Dict[Any, str]:
+        """point_id -> tag de los puntos que quedan con respuesta (para el manifiesto)."""
+        return {pid: tag for pid, answer in self.answers.items() if answer is not None}
+
+async def run_pipeline(
+    path: str,
+    client: QdrantClient,
+    embedder,
+    translator: Translator,
+    manifest: Manifest,
+    humanizer: Optional[Humanizer] = None,
+    workers: int = TRANSLATE_WORKERS,
+    embed_batch: int = EMBED_BATCH,
+    full: bool = False,
+    prune: bool = True,
+) -> Dict[str, Any]:
+    """
+    lector+chunker -> [q_rows] -> traductores (x workers) -> [q_translated]
+    -> embedder por lotes -> [q_embedded] -> upsert por lotes + manifiesto.
+    Con `humanizer`, cada traductor genera además la respuesta humanizada del
+    primer chunk de cada sección (el que responde la API; en paralelo) antes de
+    pasar la fila al embedder.
+
+    Sólo viajan los chunks cuyo id no está en el manifiesto (`full` re-procesa
+    todo) y los primeros chunks cuya respuesta falta o es de otro prompt/modelo:
+    éstos sólo actualizan answer_* con set_payload, sin re-embeddear. Al terminar,
+    con `prune`, se borran los puntos del manifiesto que ya no salen del CSV.
+
+    Colas acotadas: si una etapa se atrasa, las anteriores esperan (backpressure)
+    en vez de acumular filas en memoria. encode() y upsert() corren en threads.
+    """
+    workers = max(1, workers)
+    q_rows: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    q_translated: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    q_embedded: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+    stats = {"rows": 0, "unchanged": 0, "chunks": 0, "deleted": 0, "embed_batches": 0, "upserts": 0,
+             "answer_updates": 0}
+    answers_tag = humanizer.tag if humanizer is not None else ""
+    seen: Set[Any] = set()
+    t0 = time.perf_counter()
+
+    async def read():
+        for row in rows_from_csv(path):
+            drug_id = row.get("Drug ID") or row.get("ID") or ""
+            doc_id = f"drug:{drug_id or normalize_space(row.get('Drug Name'))}"
+            todo, answer_only = [], []
+            sections: Set[str] = set()
+            for idx, (section, text_en) in enumerate(row_to_chunks(row)):
+                pid = point_id(row, section, idx, text_en)
+                seen.add(pid)
+                # search_vademecum responde cada sección con su chunk de menor chunk_index
+                first = section not in sections
+                sections.add(section)
+                chunk = (idx, section, text_en, pid, first)
+                if full or pid not in manifest.points:
+                    todo.append(chunk)
+                elif first and answers_tag and manifest.answers.get(pid) != answers_tag:
+                    answer_only.append(chunk)
+            if not todo and not answer_only:
+                stats["unchanged"] += 1
+                continue
+            await q_rows.put(RowDoc(row, doc_id, todo, answer_only))
+        for _ in range(workers):
+            await q_rows.put(None)
+
+    async def translate():
+        while True:
+            doc = await q_rows.get()
+            if doc is None:
+                return
+            if doc.chunks:
+                out = await translator.translate(row_names(doc.row) + [c[2] for c in doc.chunks])
+                doc.names_es, doc.texts_es = out[:3], out[3:]
+            if humanizer is not None:
+                await answer(doc)
+            await q_translated.put(doc)
+
+    async def answer(doc: RowDoc):
+        jobs = [(c, doc.names_es, es) for c, es in zip(doc.chunks, doc.texts_es) if c[4]]
+        if doc.answer_only:
+            # ya ingestados: nombres y texto ES tal como quedaron en Qdrant (así calza su answer_key)
+            stored = await asyncio.to_thread(
+                client.retrieve, collection_name=COLL, ids=[c[3] for c in doc.answer_only],
+                with_payload=["name_es", "generic_name_es", "text_es"],
+            )
+            by_id = {str(p.id): p.payload or {} for p in stored}
+            for c in doc.answer_only:
+                p = by_id.get(str(c[3]))
+                if p is not None:
+                    jobs.append((c, [p.get("name_es") or "", p.get("generic_name_es") or "", ""], p.get("text_es") or ""))
+        name_en = row_names(doc.row)[0]
+        got = await asyncio.gather(*(
+            humanizer.answer(*answer_inputs(names_es, name_en, c[1], c[2], es)) for c, names_es, es in jobs
+        ))
+        doc.answers = {c[3]: a for (c, _, _), a in zip(jobs, got)}
+        doc.answer_model = humanizer.model
+
+    async def translate_all():
+        await asyncio.gather(*(translate() for _ in range(workers)))
+        await q_translated.put(None)
+
+    async def embed():
+        batch: List[RowDoc] = []
+        n = 0
+        while True:
+            doc = await q_translated.get()
+            if doc is not None:
+                batch.append(doc)
+                n += len(doc.chunks)
+                if n < embed_batch:
+                    continue
+            texts = [es or c[2] for d in batch for c, es in zip(d.chunks, d.texts_es)]
+            if texts:
+                # embeddeamos el texto ES si existe
+                vecs = await asyncio.to_thread(embedder.encode, texts, batch_size=max(1, embed_batch))
+                stats["embed_batches"] += 1
+                i = 0
+                for d in batch:
+                    d.vectors = vecs[i:i + len(d.chunks)]
+                    i += len(d.chunks)
+            for d in batch:
+                await q_embedded.put(d)
+            batch, n = [], 0
+            if doc is None:
+                await q_embedded.put(None)
+                return
+
+    def checkpoint():
+        # traducciones y manifiesto del lote ya confirmado (SQLite, fuera del event loop)
+        translator.flush()
+        manifest.save()
+
+    async def upsert():
+        points: List[qm.PointStruct] = []
+        updates: List[qm.SetPayloadOperation] = []
+        owners: Dict[Any, str] = {}
+        tags: Dict[Any, str] = {}
+        rows = 0
+        while True:
+            doc = await q_embedded.get()
+            if doc is not None:
+                rows += 1
+                points.extend(doc.points())
+                updates.extend(doc.answer_updates())
+                owners.update((c[3], doc.doc_id) for c in doc.chunks + doc.answer_only)
+                tags.update(doc.answer_tags(answers_tag))
+                if len(points) + len(updates) < BATCH:
+                    continue
+            if points:
+                await asyncio.to_thread(client.upsert, collection_name=COLL, points=points)
+                stats["chunks"] += len(points)
+                stats["upserts"] += 1
+            if updates:
+                # sólo answer_*: el vector y el resto del payload no cambian
+                await asyncio.to_thread(client.batch_update_points, collection_name=COLL, update_operations=updates)
+                stats["answer_updates"] += len(updates)
+            if owners:
+                stats["rows"] += rows
+                # una respuesta que falló queda sin tag: la próxima corrida la reintenta
+                manifest.add(owners, tags)
+                await asyncio.to_thread(checkpoint)
+                rate = stats["chunks"] / max(time.perf_counter() - t0, 1e-9)
+                print(f"[UPSERT] filas: {stats['rows']} | chunks: {stats['chunks']} | "
+                      f"respuestas: {stats['answer_updates']} | {rate:.1f} chunks/s")
+            points, updates, owners, tags, rows = [], [], {}, {}, 0
+            if doc is None:
+                return
+
+    tasks = [asyncio.ensure_future(c) for c in (read(), translate_all(), embed(), upsert())]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # el manifiesto queda en el último upsert confirmado; las traducciones hechas no se pierden
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        translator.flush()
+        raise
+
+    if prune:
+        # sólo con el CSV recorrido completo se sabe qué chunks desaparecieron
+        stale = [pid for pid in manifest.points if pid not in seen]
+        for i in range(0, len(stale), 1024):
+            part = stale[i:i + 1024]
+            await asyncio.to_thread(
+                client.delete, collection_name=COLL, points_selector=qm.PointIdsList(points=part),
+            )
+            manifest.remove(part)
+            await asyncio.to_thread(manifest.save)
+            stats["deleted"] += len(part)
+        if stale:
+            print(f"[DELETE] {len(stale)} chunks que ya no están en el CSV")
+
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    stats["translate_calls"] = translator.calls
+    stats["translate_cache_hits"] = translator.hits
+    if humanizer is not None:
+        stats["answer_calls"] = humanizer.calls
+        stats["answer_cache_hits"] = humanizer.hits
+        stats["answer_failed"] = humanizer.failed
+    return stats
+
+def ingest_csv_with_translation(path: str, full: bool = False, prune: bool = True):
     if not QDRANT_URL:
         print("ERROR: QDRANT_URL no configurada en .env")
         sys.exit(1)
-    if not OPENAI_API_KEY:
+    if TRANSLATOR == "stub":
+        print("[WARN] INGEST_TRANSLATOR=stub: los textos *_es quedan en inglés (sólo para benchmarks)")
+    elif not OPENAI_API_KEY:
         print("ERROR: OPENAI_API_KEY no configurada en .env (requerida para traducir)")
         sys.exit(1)
 
     client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-    ensure_collection(client)
+    created = ensure_collection(client)
 
     embedder = SentenceTransformer(EMBED_MODEL)
 
-    points: List[qm.PointStruct] = []
-    total_chunks = 0
-    local_id = 0
-
-    for row in rows_from_csv(path):
-        drug_id = row.get("Drug ID") or row.get("ID") or ""
-        name_en = normalize_space(row.get("Drug Name"))
-        gname_en = normalize_space(row.get("Generic Name"))
-        dclass_en = normalize_space(row.get("Drug Class"))
-        manufacturer = normalize_space(row.get("Manufacturer"))
-        price = normalize_space(row.get("Price"))
-        approval = normalize_space(row.get("Approval Date"))
-        availability = normalize_space(row.get("Availability"))
-
-        # translate a pequeños lotes: name, generic, class
-        name_es, gname_es, dclass_es = translate_texts([name_en, gname_en, dclass_en])
-
-        chunks = row_to_chunks(row)
-        # traducir contenido de los chunks por lote (para ahorrar llamadas)
-        texts_en = [t for _, t in chunks]
-        texts_es = translate_texts(texts_en)
-
-        for idx, ((section, text_en), text_es) in enumerate(zip(chunks, texts_es)):
-            vec = embedder.encode(text_es or text_en).tolist()  # embeddeamos el texto ES si existe
-            payload = {
-                "doc_id": f"drug:{drug_id or name_en}",
-                # originales
-                "name": name_en,
-                "generic_name": gname_en,
-                "drug_class": dclass_en,
-                "section": section,
-                "chunk_index": idx,
-                "source": "kaggle:comprehensive-drug-information-dataset",
-                "manufacturer": manufacturer,
-                "approval_date": approval,
-                "availability": availability,
-                "price": price,
-                "text": text_en,
-                "title": f"{name_en} ({gname_en}) - {section}",
-                # traducidos
-                "name_es": name_es,
-                "generic_name_es": gname_es,
-                "drug_class_es": dclass_es,
-                "text_es": text_es,
-                "title_es": f"{name_es} ({gname_es}) - {section}",
-                "section_es": {
-                    "indications":"indicaciones",
-                    "mechanism":"mecanismo",
-                    "side_effects":"efectos_secundarios",
-                    "contraindications":"contraindicaciones",
-                    "interactions":"interacciones",
-                    "warnings":"advertencias",
-                    "dosage":"posologia",
-                }.get(section, section)
-            }
-            points.append(qm.PointStruct(id=local_id, vector=vec, payload=payload))
-            local_id += 1
-            total_chunks += 1
-
-            if len(points) >= BATCH:
-                client.upsert(collection_name=COLL, points=points)
-                points = []
-                print(f"[UPSERT] chunks totales: {total_chunks}")
-
-    if points:
-        client.upsert(collection_name=COLL, points=points)
-
-    print(f"[DONE] Ingestados {total_chunks} chunks ES a '{COLL}'")
+    manifest = None if created else Manifest.load(MANIFEST_PATH)
+    if manifest is None:
+        manifest = Manifest(MANIFEST_PATH, fresh=True) if created else Manifest.from_collection(MANIFEST_PATH, client)
+    elif manifest.points:
+        print(f"[MANIFEST] {len(manifest.points)} chunks ya ingestados: sólo se procesan los nuevos o cambiados")
+
+    humanizer = make_humanizer()
+    stats = asyncio.run(run_pipeline(path, client, embedder, make_translator(), manifest, humanizer,
+                                     full=full, prune=prune))
+    manifest.close()
+
+    print(f"[DONE] {stats['chunks']} chunks ES nuevos/cambiados y {stats['deleted']} borrados en '{COLL}' "
+          f"en {stats['seconds']} s ({stats['rows']} filas con cambios, {stats['unchanged']} sin cambios, "
+          f"{stats['translate_calls']} pedidos de traducción)")
+    if humanizer is not None:
+        print(f"[ANSWERS] {stats['answer_calls']} respuestas generadas, {stats['answer_cache_hits']} desde caché, "
+              f"{stats['answer_updates']} actualizadas sin re-embeddear, {stats['answer_failed']} sin respuesta "
+              f"(la API usará el LLM; se reintentan en la próxima ingesta)")
+    if stats["chunks"] or stats["deleted"]:
+        publish_version()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python ingestion_kaggle_vademecum_es.py /ruta/DrugData.csv")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print("Uso: python ingest_vademecum.py /ruta/DrugData.csv [--full] [--keep]")
+        print("  --full  re-traduce/re-embebe todos los chunks (p.ej. tras cambiar el prompt)")
+        print("  --keep  no borra de la colección los chunks que ya no están en el CSV")
         sys.exit(1)
-    ingest_csv_with_translation(sys.argv[1])
+    ingest_csv_with_translation(args[0], full="--full" in sys.argv, prune="--keep" not in sys.argv)
@@ -0,0 +1,127 @@
+# backend/ingestion/translate_cache.py
+"""
+Caché de traducciones EN->ES sobre SQLite (stdlib), clave = _cache_key("EN2ES::" + texto).
+
+- get(): lookup por clave primaria (tabla WITHOUT ROWID), sin cargar el caché entero.
+- put(): se acumula en memoria y se escribe por lotes en una transacción
+  (flush() cada TRANSLATE_CACHE_FLUSH entradas o en cada checkpoint de la ingesta).
+- WAL + busy_timeout: varias ingestas/procesos pueden compartir el archivo.
+- compact(): checkpoint del WAL + VACUUM.
+- Si existe el translate_cache.json anterior y la base está vacía, se importa una vez.
+
+Uso:
+  python ingestion/translate_cache.py stats   [ruta]
+  python ingestion/translate_cache.py compact [ruta]
+"""
+import os
+import sys
+import json
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+TRANSLATE_CACHE_FLUSH = int(os.getenv("TRANSLATE_CACHE_FLUSH", "256"))
+LEGACY_JSON_PATH = "translate_cache.json"
+
+
+class TranslationCache:
+    def __init__(self, path: str, flush_every: int = TRANSLATE_CACHE_FLUSH, legacy_json: Optional[str] = LEGACY_JSON_PATH):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        if legacy_json and os.path.exists(legacy_json) and not len(self):
+            self._import_json(legacy_json)
+
+    def __len__(self) -> int:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return n + len(self._pending)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            value = self._pending.get(key)
+            if value is None:
+                row = self._conn.execute("SELECT value FROM translations WHERE key = ?", (key,)).fetchone()
+                value = row[0] if row else None
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._pending[key] = value
+            full = len(self._pending) >= self.flush_every
+        if full:
+            self.flush()
+
+    __setitem__ = put
+
+    def flush(self) -> int:
+        """Escribe lo pendiente en una sola transacción; devuelve cuántas entradas."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            items = list(self._pending.items())
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO translations (key, value) VALUES (?, ?)", items)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending.clear()
+            self.writes += len(items)
+            return len(items)
+
+    def compact(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self), "pending": len(self._pending), "hits": self.hits,
+                "misses": self.misses, "writes": self.writes,
+                "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+    def _import_json(self, path: str) -> None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARN] no se pudo importar {path}: {e}")
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("INSERT OR IGNORE INTO translations (key, value) VALUES (?, ?)",
+                                   [(k, v) for k, v in data.items() if isinstance(v, str)])
+            self._conn.execute("COMMIT")
+        print(f"[CACHE] importadas {len(data)} traducciones desde {path}")
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = TranslationCache(sys.argv[2] if len(sys.argv) > 2 else os.getenv("TRANSLATE_CACHE", "translate_cache.sqlite"))
+    if cmd == "compact":
+        before = cache.stats()["bytes"]
+        cache.compact()
+        print(f"[CACHE] compactado: {before} -> {cache.stats()['bytes']} bytes")
+    print(cache.stats())
+    cache.close()
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from app.services.query_embedder import QueryEmbedder
+
+
+class SlowModel:
+    """encode() espera a `release`: deja armar el lote y cancelar a mitad de camino."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=32):
+        self.started.set()
+        self.release.wait(5)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def test_cancelled_waiter_does_not_break_the_batch():
+    model = SlowModel()
+    emb = QueryEmbedder(model=model, max_batch=8, max_wait_ms=50)
+
+    async def main():
+        a = asyncio.create_task(emb.aembed(["paracetamol"]))
+        a_again = asyncio.create_task(emb.aembed(["paracetamol"]))  # mismo key: future compartido
+        b = asyncio.create_task(emb.aembed(["ibuprofeno"]))
+        await asyncio.to_thread(model.started.wait, 5)
+        a.cancel()
+        model.release.set()
+        vecs_again, vecs_b = await asyncio.wait_for(asyncio.gather(a_again, b), 5)
+        assert a.cancelled()
+        assert vecs_again.shape == (1, 4) and vecs_b.shape == (1, 4)
+        # el worker sigue vivo para lotes posteriores
+        later = await asyncio.wait_for(emb.aembed(["aspirina"]), 5)
+        assert later.shape == (1, 4)
+
+    asyncio.run(main())
+    assert emb._worker.is_alive()
+    assert not emb._pending
+
+
+def test_future_cancelled_before_encode_is_skipped():
+    model = SlowModel()
+    model.release.set()
+    emb = QueryEmbedder(model=model, max_batch=8, max_wait_ms=50)
+    fut = emb.submit("naproxeno")
+    fut.cancel()
+    other = emb.submit("loratadina")
+    assert other.result(5).shape == (4,)
+    assert emb._worker.is_alive()